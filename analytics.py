@@ -32,35 +32,6 @@ def detect_spike(now_kwh: Optional[float], prev_kwh: Optional[float],
 
     return False, None, "none"
 
-def pick_reasons(profile: Dict, ctx: Dict, basis: str) -> List[str]:
-    heating = (profile.get("heating") or "")
-    people = (profile.get("people") or "")
-
-    cold = ctx.get("cold")
-    boiler = ctx.get("boiler")
-    new_appliance = ctx.get("new_appliance")
-
-    reasons: List[str] = []
-
-    if heating == "electric" or cold is True:
-        reasons.append("Электроотопление/обогрев работали дольше (холоднее).")
-
-    if boiler is True:
-        reasons.append("Нагрев воды (бойлер/тэн) даёт заметную базовую нагрузку.")
-
-    if people in ("3-4", "5+") or ctx.get("more_time_home") is True:
-        reasons.append("Больше времени дома/людей → чаще свет, готовка, техника.")
-
-    if new_appliance is True:
-        reasons.append("Новый прибор или чаще используете энергоёмкие режимы (стирка/сушка/готовка).")
-
-    reasons.append("Часть расхода может уходить в «standby» и мелкие потребители (TV/приставка/зарядки).")
-
-    if basis == "money":
-        reasons.append("Если рост только в ₸ — возможно, сыграл тариф/перерасчёт, без изменения кВт*ч.")
-
-    return reasons[:3]
-
 # Каталог действий
 ACTIONS = [
     ("timer_heater",
@@ -101,43 +72,78 @@ ACTIONS = [
      "За 1 день: проверьте настройки, отодвиньте от стены, уберите наледь."),
 ]
 
-def pick_top3_actions(profile: Dict, ctx: Dict) -> List[Tuple[str, str, str]]:
-    heating = profile.get("heating")
-    boiler = ctx.get("boiler") is True
-    cold = ctx.get("cold") is True
-
-    scores: Dict[str, int] = {}
+# ---------- Правила причин и действий ----------
+# Всё, от чего зависят причины и Top-3, сводится к 7 битам; таблицы ниже компилируются
+# при импорте в поиск по ключу (128 вариантов), так что make_analysis не перебирает правила.
+F_ELECTRIC = 1        # profile.heating == "electric"
+F_COLD = 2            # ctx.cold is True
+F_BOILER = 4          # ctx.boiler is True
+F_MANY_PEOPLE = 8     # profile.people in ("3-4", "5+")
+F_MORE_HOME = 16      # ctx.more_time_home is True
+F_NEW_APPLIANCE = 32  # ctx.new_appliance is True
+F_BASIS_MONEY = 64    # сравнение только по ₸
+ALWAYS = 0
+
+# (любой из битов, текст); порядок = приоритет, в ответ идут первые 3 сработавших
+REASON_RULES = [
+    (F_ELECTRIC | F_COLD, "Электроотопление/обогрев работали дольше (холоднее)."),
+    (F_BOILER, "Нагрев воды (бойлер/тэн) даёт заметную базовую нагрузку."),
+    (F_MANY_PEOPLE | F_MORE_HOME, "Больше времени дома/людей → чаще свет, готовка, техника."),
+    (F_NEW_APPLIANCE, "Новый прибор или чаще используете энергоёмкие режимы (стирка/сушка/готовка)."),
+    (ALWAYS, "Часть расхода может уходить в «standby» и мелкие потребители (TV/приставка/зарядки)."),
+    (F_BASIS_MONEY, "Если рост только в ₸ — возможно, сыграл тариф/перерасчёт, без изменения кВт*ч."),
+]
 
-    def add(action_id: str, pts: int):
-        scores[action_id] = scores.get(action_id, 0) + pts
+# (любой из битов, [(action_id, очки)]); очки суммируются, берутся 3 лучших (при равенстве — по порядку)
+ACTION_RULES = [
+    (F_ELECTRIC | F_COLD, [("timer_heater", 6), ("lower_temp", 4), ("seal_windows", 4)]),
+    (F_BOILER, [("boiler_5560", 6)]),
+    (ALWAYS, [("standby_strip", 3), ("night_test", 3), ("wash_30_full", 2),
+              ("fridge_settings", 2), ("kettle_volume", 1)]),
+]
 
-    if heating == "electric" or cold:
-        add("timer_heater", 6)
-        add("lower_temp", 4)
-        add("seal_windows", 4)
+def _fires(mask: int, key: int) -> bool:
+    return mask == ALWAYS or bool(mask & key)
 
-    if boiler:
-        add("boiler_5560", 6)
+def _compile_reasons(key: int) -> Tuple[str, ...]:
+    return tuple(text for mask, text in REASON_RULES if _fires(mask, key))[:3]
 
-    add("standby_strip", 3)
-    add("night_test", 3)
-    add("wash_30_full", 2)
-    add("fridge_settings", 2)
-    add("kettle_volume", 1)
+def _compile_actions(key: int) -> Tuple[Tuple[str, str, str], ...]:
+    scores: Dict[str, int] = {}
+    for mask, items in ACTION_RULES:
+        if _fires(mask, key):
+            for action_id, pts in items:
+                scores[action_id] = scores.get(action_id, 0) + pts
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    catalog = {a[0]: a for a in ACTIONS}
+    return tuple(catalog[aid][1:] for aid, _ in ranked[:3] if aid in catalog)
+
+def rule_key(profile: Dict, ctx: Dict, basis: str = "none") -> int:
+    key = 0
+    if profile.get("heating") == "electric":
+        key |= F_ELECTRIC
+    if ctx.get("cold") is True:
+        key |= F_COLD
+    if ctx.get("boiler") is True:
+        key |= F_BOILER
+    if (profile.get("people") or "") in ("3-4", "5+"):
+        key |= F_MANY_PEOPLE
+    if ctx.get("more_time_home") is True:
+        key |= F_MORE_HOME
+    if ctx.get("new_appliance") is True:
+        key |= F_NEW_APPLIANCE
+    if basis == "money":
+        key |= F_BASIS_MONEY
+    return key
 
-    if not scores:
-        scores = {"standby_strip": 3, "night_test": 3, "wash_30_full": 2}
+REASONS_TABLE = [_compile_reasons(k) for k in range(128)]
+ACTIONS_TABLE = [_compile_actions(k) for k in range(128)]
 
-    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    chosen_ids = [aid for aid, _ in ranked[:3]]
+def pick_reasons(profile: Dict, ctx: Dict, basis: str) -> List[str]:
+    return list(REASONS_TABLE[rule_key(profile, ctx, basis)])
 
-    catalog = {a[0]: a for a in ACTIONS}
-    out: List[Tuple[str, str, str]] = []
-    for aid in chosen_ids:
-        a = catalog.get(aid)
-        if a:
-            out.append((a[1], a[2], a[3]))
-    return out
+def pick_top3_actions(profile: Dict, ctx: Dict) -> List[Tuple[str, str, str]]:
+    return list(ACTIONS_TABLE[rule_key(profile, ctx)])
 
 def make_analysis(profile: Dict, ctx: Dict,
                   now_kwh: Optional[float], prev_kwh: Optional[float],
@@ -150,8 +156,9 @@ def make_analysis(profile: Dict, ctx: Dict,
         sign = "+" if pct >= 0 else ""
         headline = f"Вижу изменение примерно {sign}{pct:.0f}% по {'кВт*ч' if basis=='kwh' else 'сумме'}."
 
-    reasons = pick_reasons(profile, ctx, basis)
-    actions = pick_top3_actions(profile, ctx)
+    key = rule_key(profile, ctx, basis)
+    reasons = list(REASONS_TABLE[key])
+    actions = list(ACTIONS_TABLE[key])
 
     meta = {"basis": basis, "pct": pct, "spike": spike}
     return AnalysisResult(spike=spike, headline=headline, reasons=reasons, actions=actions, meta=meta)
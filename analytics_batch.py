@@ -0,0 +1,114 @@
+"""
+Векторизованный анализ сразу по многим пользователям (ночной пересчёт, выгрузки KPI).
+Колонки — массивы NumPy одинаковой длины; отсутствующее значение = NaN.
+Построчно совпадает с analytics.detect_spike / rule_key / savings_calc.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from analytics import (
+    F_BASIS_MONEY, F_BOILER, F_COLD, F_ELECTRIC, F_MANY_PEOPLE, F_MORE_HOME, F_NEW_APPLIANCE
+)
+
+BASIS_NONE = 0
+BASIS_KWH = 1
+BASIS_MONEY = 2
+BASIS_NAMES = np.array(["none", "kwh", "money"])
+
+def _col(values) -> np.ndarray:
+    # None -> NaN, чтобы можно было передавать списки прямо из sqlite
+    return np.asarray(values, dtype=np.float64) if values is not None else None
+
+def encode_flags(electric=None, cold=None, boiler=None, many_people=None,
+                 more_home=None, new_appliance=None, n: Optional[int] = None) -> np.ndarray:
+    """
+    Булевы колонки профиля/контекста -> битовая маска analytics.rule_key (без бита basis).
+    """
+    cols = [(electric, F_ELECTRIC), (cold, F_COLD), (boiler, F_BOILER), (many_people, F_MANY_PEOPLE),
+            (more_home, F_MORE_HOME), (new_appliance, F_NEW_APPLIANCE)]
+    if n is None:
+        n = next(len(c) for c, _ in cols if c is not None)
+    key = np.zeros(n, dtype=np.uint8)
+    for col, bit in cols:
+        if col is not None:
+            key |= np.where(np.asarray(col, dtype=bool), bit, 0).astype(np.uint8)
+    return key
+
+def analyze_batch(now_kwh, prev_kwh, now_money=None, prev_money=None,
+                  flags: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Возвращает колонки:
+      pct   — изменение в %, NaN если сравнивать не с чем
+      spike — bool
+      basis — BASIS_NONE/KWH/MONEY (int8), имена в BASIS_NAMES
+      rule_key — (если передан flags) ключ для analytics.REASONS_TABLE / ACTIONS_TABLE
+    """
+    now_kwh, prev_kwh = _col(now_kwh), _col(prev_kwh)
+    n = len(now_kwh)
+    now_money = _col(now_money) if now_money is not None else np.full(n, np.nan)
+    prev_money = _col(prev_money) if prev_money is not None else np.full(n, np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # NaN в сравнениях даёт False — это и есть «значение не задано»
+        by_kwh = ~np.isnan(now_kwh) & (prev_kwh > 0)
+        by_money = ~by_kwh & ~np.isnan(now_money) & (prev_money > 0)
+
+        pct = np.full(n, np.nan)
+        pct[by_kwh] = (now_kwh[by_kwh] / prev_kwh[by_kwh] - 1.0) * 100.0
+        pct[by_money] = (now_money[by_money] / prev_money[by_money] - 1.0) * 100.0
+
+        spike_kwh = (now_kwh > prev_kwh * 1.15) | ((prev_kwh < 300) & (now_kwh - prev_kwh > 50))
+        spike = np.where(by_kwh, spike_kwh, by_money & (now_money > prev_money * 1.15))
+
+    basis = np.zeros(n, dtype=np.int8)
+    basis[by_kwh] = BASIS_KWH
+    basis[by_money] = BASIS_MONEY
+
+    out = {"pct": pct, "spike": spike, "basis": basis}
+    if flags is not None:
+        out["rule_key"] = np.asarray(flags, dtype=np.uint8) | np.where(by_money, F_BASIS_MONEY, 0).astype(np.uint8)
+    return out
+
+def savings_batch(before_kwh, before_days, after_kwh, after_days, tariff=None) -> Dict[str, np.ndarray]:
+    """
+    Векторная версия analytics.savings_calc. ok=False там, где savings_calc вернул бы ok=False;
+    delta_money = NaN, если тарифа нет.
+    """
+    before_kwh, after_kwh = _col(before_kwh), _col(after_kwh)
+    before_days, after_days = _col(before_days), _col(after_days)
+    n = len(before_kwh)
+    tariff = _col(tariff) if tariff is not None else np.full(n, np.nan)
+
+    ok = ~np.isnan(before_kwh) & ~np.isnan(after_kwh) & (before_days > 0) & (after_days > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        before_per_day = np.where(ok, before_kwh / before_days, np.nan)
+        after_per_day = np.where(ok, after_kwh / after_days, np.nan)
+        delta_kwh = (before_per_day - after_per_day) * after_days
+        pct = np.where(before_per_day == 0, 0.0, (1.0 - after_per_day / before_per_day) * 100.0)
+        pct[~ok] = np.nan
+        delta_money = delta_kwh * tariff
+    return {
+        "ok": ok,
+        "before_per_day": before_per_day,
+        "after_per_day": after_per_day,
+        "delta_kwh": delta_kwh,
+        "pct": pct,
+        "delta_money": delta_money,
+    }
+
+def pair_before_after(user_id, is_before, is_after) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Строки отсортированы по (user_id, id). Для каждой строки «после» (second) находит
+    последнюю строку «до» (current) того же пользователя выше по списку — как do_savings
+    берёт get_latest_bill(user_id, "current") на момент расчёта.
+    Возвращает (индексы after, индексы before).
+    """
+    user_id = np.asarray(user_id)
+    is_before = np.asarray(is_before, dtype=bool)
+    is_after = np.asarray(is_after, dtype=bool)
+    idx = np.arange(len(user_id))
+    last_before = np.maximum.accumulate(np.where(is_before, idx, -1))
+    valid = is_after & (last_before >= 0)
+    valid[valid] = user_id[last_before[valid]] == user_id[valid]
+    return idx[valid], last_before[valid]
@@ -0,0 +1,160 @@
+"""
+Ретенция events: события старше N дней переезжают из горячей data.db в помесячные
+архивные файлы <dir>/events_YYYY_MM.db и удаляются из горячей таблицы.
+
+    python archive.py [--db data.db] [--dir archive] [--days 90] [--chunk 200]
+
+Переносятся только события, уже учтённые в дневных роллапах (id <= kpi_state.events_hw),
+поэтому kpi --rollups после архивации не меняется. Перенос идёт пачками по --chunk строк:
+копия в архив и удаление из горячей таблицы — одна короткая транзакция, между пачками
+писатель бота успевает взять блокировку. Повторный запуск после падения безопасен
+(INSERT OR IGNORE по id).
+
+Чтение истории целиком:
+    c = connect_all("data.db", "archive", since="2025-01")  # TEMP VIEW events поверх всех файлов
+    kpi.compute(c, since="2025-01-01")
+    for row in query_events("data.db", "SELECT ... FROM events WHERE ...", (...)): ...
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from kpi import connect_ro
+
+EVENT_COLUMNS = (
+    "id, ts_utc, user_hash, session_id, state, event_name, command, payload_json, is_demo, app_version"
+)
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {s}.events (
+  id INTEGER PRIMARY KEY,
+  ts_utc TEXT NOT NULL,
+  user_hash TEXT NOT NULL,
+  session_id TEXT NOT NULL,
+  state TEXT NOT NULL,
+  event_name TEXT NOT NULL,
+  command TEXT,
+  payload_json TEXT,
+  is_demo INTEGER DEFAULT 0,
+  app_version TEXT
+);
+CREATE INDEX IF NOT EXISTS {s}.idx_events_name_user ON events(event_name, user_hash, ts_utc);
+CREATE INDEX IF NOT EXISTS {s}.idx_events_user_ts ON events(user_hash, ts_utc);
+"""
+
+def month_file(archive_dir: Path, month: str) -> Path:
+    # month = "YYYY-MM"
+    return archive_dir / f"events_{month.replace('-', '_')}.db"
+
+def archive_files(archive_dir, since: Optional[str] = None, until: Optional[str] = None) -> List[Path]:
+    """
+    Архивные файлы, чей месяц пересекается с [since, until) (ISO-строки, сравнение по YYYY-MM).
+    """
+    out = []
+    for f in sorted(Path(archive_dir).glob("events_????_??.db")):
+        month = f.stem[len("events_"):].replace("_", "-")
+        if since and month < since[:7]:
+            continue
+        if until and month > until[:7]:
+            continue
+        out.append(f)
+    return out
+
+def archive_events(db, days: int = 90, archive_dir="archive", chunk: int = 200, pause: float = 0.005) -> int:
+    """
+    Переносит события старше days дней в архив. db — db.DB, все вызовы из одного потока.
+    Роллапы не обновляет: переносится то, что уже учтено (бот — job_kpi_rollup, CLI — main).
+    Возвращает число перенесённых строк.
+    """
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat(timespec="seconds")
+    db.flush_events()
+    hw = db.events_hw()
+
+    moved = 0
+    attached = None
+    try:
+        while True:
+            rows = db.oldest_events(hw, chunk)
+            # префикс пачки: старше cutoff и в одном месяце (один архивный файл)
+            take = []
+            for rid, ts in rows:
+                if ts >= cutoff or (take and ts[:7] != take[0][1][:7]):
+                    break
+                take.append((rid, ts))
+            if not take:
+                return moved
+            month = take[0][1][:7]
+            if attached != month:
+                if attached is not None:
+                    db.detach_archive()
+                    attached = None
+                db.attach_archive(str(month_file(archive_dir, month)), ARCHIVE_SCHEMA)
+                attached = month
+            db.move_events(EVENT_COLUMNS, take[0][0], take[-1][0])
+            moved += len(take)
+            if pause:
+                time.sleep(pause)
+    finally:
+        if attached is not None:
+            db.detach_archive()
+
+def connect_all(db_path: str, archive_dir="archive", since: Optional[str] = None,
+                until: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Read-only соединение, в котором имя events — TEMP VIEW: горячая таблица + нужные
+    архивные месяцы (UNION ALL, фильтры проталкиваются в каждую часть и идут по индексам).
+    Запросы, написанные для events (kpi.compute и т.п.), работают без изменений.
+    """
+    c = connect_ro(db_path)
+    files = archive_files(archive_dir, since, until)
+    limit = c.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(files) > limit:
+        c.close()
+        raise ValueError(
+            f"{len(files)} архивных месяцев, а SQLite подключает не больше {limit}: "
+            "сузьте since/until или используйте query_events"
+        )
+    parts = [f"SELECT {EVENT_COLUMNS} FROM main.events"]
+    for i, f in enumerate(files):
+        c.execute(f"ATTACH DATABASE ? AS a{i}", (f"file:{f}?mode=ro",))
+        parts.append(f"SELECT {EVENT_COLUMNS} FROM a{i}.events")
+    c.execute(f"CREATE TEMP VIEW events AS {' UNION ALL '.join(parts)}")
+    return c
+
+def query_events(db_path: str, sql: str, params: Sequence = (), archive_dir="archive",
+                 since: Optional[str] = None, until: Optional[str] = None) -> Iterator[tuple]:
+    """
+    Выполняет один и тот же запрос к events по очереди в архивных месяцах и в горячей БД
+    (без лимита на число файлов), строки отдаются потоком. Агрегаты между источниками
+    складывает вызывающий.
+    """
+    for f in archive_files(archive_dir, since, until):
+        with connect_ro(str(f)) as c:
+            yield from c.execute(sql, params)
+    with connect_ro(db_path) as c:
+        yield from c.execute(sql, params)
+
+def main():
+    ap = argparse.ArgumentParser(description="Перенос старых событий в помесячные архивы")
+    ap.add_argument("--db", default="data.db")
+    ap.add_argument("--dir", default="archive")
+    ap.add_argument("--days", type=int, default=90)
+    ap.add_argument("--chunk", type=int, default=200)
+    args = ap.parse_args()
+
+    from db import DB
+    db = DB(args.db, buffer_events=False)
+    t0 = time.perf_counter()
+    db.refresh_rollups()  # переносится только учтённое в роллапах; рядом с ботом безопасно (BEGIN IMMEDIATE)
+    n = archive_events(db, args.days, args.dir, args.chunk)
+    db.close()
+    print(f"archived {n} events in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Ночной пересчёт экономии по всей истории счетов: каждая пара current -> second
+считается так же, как в do_savings (analytics.savings_calc), но пачками через NumPy.
+Результаты лежат в savings_results — бот отвечает на /saved одним чтением по индексу.
+
+    python backtest.py [--db data.db] [--chunk-users 5000]
+
+Из бота запускается ежедневной задачей JobQueue (см. main.job_savings_backtest).
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from analytics_batch import pair_before_after, savings_batch
+from db import DB
+
+MAX_USER_ID = 2**63 - 1
+
+def _chunk_results(rows) -> list:
+    bill_id = np.array([r[0] for r in rows], dtype=np.int64)
+    user_id = np.array([r[1] for r in rows], dtype=np.int64)
+    kind = np.array([r[2] for r in rows])
+    days = np.array([r[3] if r[3] is not None else np.nan for r in rows], dtype=np.float64)
+    kwh = np.array([r[4] if r[4] is not None else np.nan for r in rows], dtype=np.float64)
+    tariff = np.array([r[5] if r[5] is not None else np.nan for r in rows], dtype=np.float64)
+
+    after, before = pair_before_after(user_id, kind == "current", kind == "second")
+    out = savings_batch(kwh[before], days[before], kwh[after], days[after], tariff[after])
+    ok = out["ok"]
+
+    cols = zip(
+        bill_id[after][ok].tolist(), user_id[after][ok].tolist(), bill_id[before][ok].tolist(),
+        out["before_per_day"][ok].tolist(), out["after_per_day"][ok].tolist(),
+        out["delta_kwh"][ok].tolist(), out["pct"][ok].tolist(), out["delta_money"][ok].tolist(),
+    )
+    # NaN (нет тарифа) -> NULL, как delta_money=None у savings_calc
+    return [row[:7] + (None if math.isnan(row[7]) else row[7],) for row in cols]
+
+def run(db: DB, chunk_users: int = 5000) -> int:
+    """
+    Пересчитывает savings_results кусками по chunk_users пользователей (keyset по user_id);
+    каждый кусок заменяется одной транзакцией. Возвращает число записанных результатов.
+    """
+    after_user = 0
+    total = 0
+    while True:
+        rows = db.bill_history(after_user, chunk_users)
+        if not rows:
+            # дальше нет пользователей с current/second: их старые результаты (если были) убираем
+            db.replace_savings_results(after_user, MAX_USER_ID, [])
+            return total
+        upto_user = rows[-1][1]
+        # пользователи, сбросившие данные после bill_history, пропускаются внутри записи
+        total += db.replace_savings_results(after_user, upto_user, _chunk_results(rows))
+        after_user = upto_user
+
+def main():
+    ap = argparse.ArgumentParser(description="Пересчёт savings_results по истории счетов")
+    ap.add_argument("--db", default="data.db")
+    ap.add_argument("--chunk-users", type=int, default=5000)
+    args = ap.parse_args()
+
+    db = DB(args.db, buffer_events=False)
+    t0 = time.perf_counter()
+    n = run(db, args.chunk_users)
+    db.close()
+    print(f"savings_results: {n} rows in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
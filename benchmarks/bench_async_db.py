@@ -0,0 +1,94 @@
+"""
+Нагрузочный тест: сотни пользователей одновременно шлют апдейты. Чётные шаги — хендлер,
+похожий на analyze_entry (upsert_user -> get_user -> ответ -> log_event), нечётные — лёгкий
+хендлер без БД (как /help). Сравниваем синхронный DB в event loop с AsyncDB (поток-писатель).
+--fsync-ms имитирует медленный диск на каждом commit.
+
+    python benchmarks/bench_async_db.py [--users 300] [--steps 6] [--fsync-ms 1]
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT  # noqa: F401  (добавляет корень репозитория в sys.path)
+
+from db import DB, AsyncDB
+
+API_LATENCY = 0.02  # имитация reply_text
+
+class SlowDiskDB(DB):
+    fsync_s = 0.0
+
+    def upsert_user(self, *args, **kwargs):
+        time.sleep(self.fsync_s)
+        return super().upsert_user(*args, **kwargs)
+
+    def insert_events(self, rows):
+        time.sleep(self.fsync_s)  # один commit на пачку событий
+        return super().insert_events(rows)
+
+class BlockingDB:
+    # прежнее поведение: синхронные вызовы прямо в event loop
+    def __init__(self, db: DB) -> None:
+        self.db = db
+
+    def __getattr__(self, name):
+        fn = getattr(self.db, name)
+
+        async def call(*args, **kwargs):
+            return fn(*args, **kwargs)
+        return call
+
+async def db_handler(db, user_id: int) -> None:
+    await db.upsert_user(user_id, user_id)
+    await db.get_user(user_id)
+    await asyncio.sleep(API_LATENCY)
+    await db.log_event(user_id, "s", "0", "command_used", command="/analyze")
+
+async def light_handler(db, user_id: int) -> None:
+    await asyncio.sleep(API_LATENCY)
+
+async def simulate(db, users: int, steps: int):
+    latencies = {"db": [], "light": []}
+
+    async def user(uid: int):
+        for step in range(steps):
+            kind = "db" if step % 2 == 0 else "light"
+            handler = db_handler if kind == "db" else light_handler
+            t0 = time.perf_counter()
+            await handler(db, uid)
+            latencies[kind].append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(uid) for uid in range(users)))
+    return latencies, time.perf_counter() - t0
+
+def pct(values, p: float) -> float:
+    return statistics.quantiles(values, n=100)[int(p) - 1] * 1000
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--steps", type=int, default=6)
+    ap.add_argument("--fsync-ms", type=float, default=1.0)
+    args = ap.parse_args()
+    SlowDiskDB.fsync_s = args.fsync_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, make in (
+            ("blocking", lambda p: BlockingDB(SlowDiskDB(p))),
+            ("async", lambda p: AsyncDB(SlowDiskDB(p))),
+        ):
+            db = make(str(Path(tmp) / f"{name}.db"))
+            lat, total = await simulate(db, args.users, args.steps)
+            await db.close()
+            n = sum(len(v) for v in lat.values())
+            print(f"{name:<9} total={total:.2f} s  handlers/s={n / total:,.0f}")
+            for kind, values in lat.items():
+                print(f"  {kind:<6} p50={pct(values, 50):7.1f} ms  p99={pct(values, 99):7.1f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+analyze_batch против цикла по make_analysis. Построчная сверка со скалярной версией —
+tests/test_analytics_batch.py.
+
+    python benchmarks/bench_batch.py [--rows 1000000] [--loop-rows 100000]
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from common import ROOT  # noqa: F401
+
+from analytics import make_analysis
+from analytics_batch import analyze_batch, encode_flags
+
+def synth(rows: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+
+    def col(lo, hi, missing):
+        v = rng.uniform(lo, hi, rows).round(1)
+        v[rng.random(rows) < missing] = np.nan
+        return v
+
+    prev_kwh = col(0, 1500, 0.3)
+    prev_kwh[rng.random(rows) < 0.02] = 0.0  # prev = 0 -> сравнение недоступно
+    return {
+        "now_kwh": col(50, 1500, 0.2), "prev_kwh": prev_kwh,
+        "now_money": col(1000, 80000, 0.2), "prev_money": col(1000, 80000, 0.3),
+        "electric": rng.random(rows) < 0.3, "cold": rng.random(rows) < 0.5,
+        "boiler": rng.random(rows) < 0.4, "many_people": rng.random(rows) < 0.4,
+    }
+
+def _none(x):
+    return None if math.isnan(x) else float(x)
+
+def row_args(d, i):
+    return _none(d["now_kwh"][i]), _none(d["prev_kwh"][i]), _none(d["now_money"][i]), _none(d["prev_money"][i])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--loop-rows", type=int, default=100_000, help="строк для скалярного цикла")
+    args = ap.parse_args()
+
+    d = synth(args.rows)
+    flags = encode_flags(electric=d["electric"], cold=d["cold"], boiler=d["boiler"], many_people=d["many_people"])
+
+    t0 = time.perf_counter()
+    analyze_batch(d["now_kwh"], d["prev_kwh"], d["now_money"], d["prev_money"], flags=flags)
+    batch_dt = time.perf_counter() - t0
+
+    m = min(args.loop_rows, args.rows)
+    t0 = time.perf_counter()
+    for i in range(m):
+        profile = {"heating": "electric" if d["electric"][i] else "gas",
+                   "people": "3-4" if d["many_people"][i] else "1"}
+        ctx = {"cold": bool(d["cold"][i]), "boiler": bool(d["boiler"][i])}
+        make_analysis(profile, ctx, *row_args(d, i))
+    loop_dt = time.perf_counter() - t0
+
+    print(f"analyze_batch  {args.rows:,} rows: {batch_dt * 1000:8.1f} ms  ({args.rows / batch_dt:,.0f} rows/s)")
+    print(f"make_analysis  {m:,} rows: {loop_dt * 1000:8.1f} ms  ({m / loop_dt:,.0f} rows/s)")
+    print(f"speedup x{(args.rows / batch_dt) / (m / loop_dt):,.0f}")
+
+if __name__ == "__main__":
+    main()
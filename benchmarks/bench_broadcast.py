@@ -0,0 +1,101 @@
+"""
+Рассылка на фейковом Bot API: темп, «падение» посреди рассылки и продолжение с чекпоинта,
+задержка ответов пользователям во время рассылки. Код выхода 1, если кто-то не получил
+сообщение или повторов больше одной пачки.
+
+    python benchmarks/bench_broadcast.py [--users 1500] [--rate 30] [--crash-after 10]
+
+--rate — глобальный лимит OutboundRateLimiter (у Telegram 30/с); при больших значениях
+видно накладные расходы самого движка (БД, чекпоинты).
+"""
+import argparse
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import ROOT  # noqa: F401
+
+from telegram.ext import ExtBot
+
+from broadcast import Broadcaster
+from db import DB, AsyncDB
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI
+from outbound import OutboundRateLimiter
+
+def populate(path: str, users: int) -> None:
+    DB(path, buffer_events=False).close()
+    with sqlite3.connect(path) as c:
+        c.execute(
+            """
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < :n)
+            INSERT INTO users(user_id, user_hash, chat_id, created_at, updated_at)
+            SELECT i, printf('%016x', i), i, '2026-01-01', '2026-01-01' FROM seq
+            """,
+            {"n": users},
+        )
+
+async def interactive(bot, stop: asyncio.Event, latencies: list) -> None:
+    # пользователь пишет боту раз в 200 мс — ответ не должен ждать рассылку
+    i = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await bot.send_message(10_000_000 + i % 50, "reply")
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+        await asyncio.sleep(0.2)
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1500)
+    ap.add_argument("--rate", type=float, default=30.0)
+    ap.add_argument("--crash-after", type=float, default=10.0, help="через сколько секунд «уронить» рассылку")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "broadcast.db")
+        populate(path, args.users)
+        db = AsyncDB(DB(path, buffer_events=False))
+        api = FakeBotAPI().start()
+        bot = ExtBot(FAKE_TOKEN, base_url=api.base_url, rate_limiter=OutboundRateLimiter(global_rate=args.rate))
+        latencies = []
+        stop = asyncio.Event()
+        async with bot:
+            replier = asyncio.create_task(interactive(bot, stop, latencies))
+            t0 = time.perf_counter()
+            first = Broadcaster(db, owner="first")
+            broadcast_id, total = await first.create("Новый отопительный сезон: обновили тарифы")
+            t_snap = time.perf_counter() - t0
+
+            first.spawn(bot, broadcast_id)
+            await asyncio.sleep(args.crash_after)
+            await first.stop()
+            crashed = await db.get_broadcast(broadcast_id)
+
+            second = Broadcaster(db, owner="second")
+            job = await second.run(bot, broadcast_id)
+            dt = time.perf_counter() - t0
+            stop.set()
+            await replier
+        api.stop()
+        await db.close()
+
+    got = Counter(s["chat_id"] for s in api.sent if s["chat_id"] < 10_000_000)
+    missing = total - len(got)
+    duplicates = sum(n - 1 for n in got.values())
+    latencies.sort()
+    rate = sum(got.values()) / dt
+    print(f"snapshot: {total:,} recipients in {t_snap * 1000:.0f} ms")
+    print(f"crash after {args.crash_after:.0f}s at {crashed['sent']:,}/{total:,}, resumed -> {job['status']}")
+    print(f"delivered {len(got):,}/{total:,}, missing {missing}, duplicates {duplicates}")
+    print(f"{rate:,.1f} msg/s (limit {args.rate:.0f}/s) -> 100k users ≈ {100_000 / rate / 60:.0f} min")
+    print(f"interactive replies during broadcast: p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+          f"max {latencies[-1] * 1000:.0f} ms (n={len(latencies)})")
+    if missing or duplicates > second.batch_size or job["status"] != "done":
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Перемешанные апдейты от многих пользователей: проверяем, что внутри пользователя порядок
+сохраняется, и сравниваем пропускную способность последовательной обработки
+и PerUserUpdateProcessor. Код выхода 1, если порядок нарушен.
+
+    python benchmarks/bench_concurrency.py [--users 200] [--per-user 10] [--handler-ms 20]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+
+from common import ROOT  # noqa: F401
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from concurrency import PerUserUpdateProcessor
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI, message_update
+
+async def run(processor, updates, handler_s: float):
+    api = FakeBotAPI().start()
+    builder = Application.builder().token(FAKE_TOKEN).base_url(api.base_url)
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    app = builder.build()
+
+    seen = defaultdict(list)
+    done = asyncio.Event()
+    total = len(updates)
+    count = 0
+
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        nonlocal count
+        uid = update.effective_user.id
+        seq = int(update.message.text)
+        # случайная задержка: без блокировки по пользователю порядок бы перемешался
+        await asyncio.sleep(handler_s * random.uniform(0.2, 1.8))
+        seen[uid].append(seq)
+        count += 1
+        if count == total:
+            done.set()
+
+    app.add_handler(TypeHandler(Update, handler))
+    await app.initialize()
+    await app.start()
+    t0 = time.perf_counter()
+    for u in updates:
+        await app.update_queue.put(Update.de_json(u, app.bot))
+    await done.wait()
+    dt = time.perf_counter() - t0
+    await app.stop()
+    await app.shutdown()
+    api.stop()
+
+    ordered = all(seq == sorted(seq) for seq in seen.values())
+    return total / dt, ordered
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--per-user", type=int, default=10)
+    ap.add_argument("--handler-ms", type=float, default=20)
+    ap.add_argument("--workers", type=int, default=64)
+    args = ap.parse_args()
+
+    # случайно перемешиваем пользователей, внутри пользователя seq идёт по возрастанию
+    random.seed(1)
+    pending = {uid: list(range(args.per_user)) for uid in range(1, args.users + 1)}
+    interleaved = []
+    while pending:
+        uid = random.choice(list(pending))
+        interleaved.append(message_update(uid, str(pending[uid].pop(0))))
+        if not pending[uid]:
+            del pending[uid]
+
+    handler_s = args.handler_ms / 1000
+    seq_rate, seq_ok = await run(None, interleaved, handler_s)
+    par_rate, par_ok = await run(PerUserUpdateProcessor(args.workers), interleaved, handler_s)
+
+    print(f"sequential  {seq_rate:>8,.0f} updates/s  ordered={seq_ok}")
+    print(f"per-user    {par_rate:>8,.0f} updates/s  ordered={par_ok}  (workers={args.workers})")
+    if not (seq_ok and par_ok):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Сравнение пула соединений DB с прежним поведением (новое соединение на каждый вызов).
+
+    python benchmarks/bench_db.py [-n 5000] [--profile]
+
+--profile — ещё прогон с включённым QueryProfiler: цена профилирования и его отчёт.
+"""
+import argparse
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from common import ops_per_sec, report
+
+from db import DB, UserCache
+from sqlprofile import QueryProfiler
+
+class ConnectPerCallDB(DB):
+    # прежнее поведение: sqlite3.connect на каждый метод, без PRAGMA соединения, буфера событий и кэша
+    def __init__(self, path: str) -> None:
+        super().__init__(path, buffer_events=False)
+        self.users = UserCache(maxsize=0)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+def run(db: DB, n: int):
+    for uid in range(100):
+        db.upsert_user(uid, uid)
+        db.save_bill(uid, "current", "2026-01-01", "2026-01-31", 30, 250.0, 12000.0, None)
+
+    return [
+        ("upsert_user", ops_per_sec(lambda i: db.upsert_user(i % 100, i), n)),
+        ("get_user", ops_per_sec(lambda i: db.get_user(i % 100), n)),
+        ("get_latest_bill", ops_per_sec(lambda i: db.get_latest_bill(i % 100, "current"), n)),
+        ("log_event", ops_per_sec(lambda i: db.log_event(i % 100, "s", "0", "bench"), n)),
+    ]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("--profile", action="store_true", help="сравнить с включённым профайлером SQL")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old = ConnectPerCallDB(str(Path(tmp) / "old.db"))
+        new = DB(str(Path(tmp) / "new.db"))
+        old_rows = run(old, args.n)
+        new_rows = run(new, args.n)
+        stats = new.cache_stats()
+        new.close()
+        if args.profile:
+            profiled = DB(str(Path(tmp) / "prof.db"), profiler=QueryProfiler(slow_ms=1000))
+            prof_rows = run(profiled, args.n)
+            profile = profiled.profiler.report(n=8)
+            profiled.profiler = None  # отчёт уже есть, close() его не печатает
+            profiled.close()
+
+    report("connect-per-call", old_rows)
+    report("pooled", new_rows)
+    print("\nspeedup:")
+    for (name, a), (_, b) in zip(old_rows, new_rows):
+        print(f"  {name:<32} x{b / a:.1f}")
+    print(f"\nuser cache: {stats}")
+    if args.profile:
+        report("pooled + QueryProfiler", prof_rows)
+        print("\nprofiler cost:")
+        for (name, a), (_, b) in zip(new_rows, prof_rows):
+            print(f"  {name:<32} {(a - b) / a * 100:+.1f}%")
+        print(f"\n{profile}")
+
+if __name__ == "__main__":
+    main()
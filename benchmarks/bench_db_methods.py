@@ -0,0 +1,140 @@
+"""
+Каждый публичный метод db.DB на таблицах разного размера (по умолчанию 10k, 1M и 10M).
+
+    python benchmarks/bench_db_methods.py [--sizes 10000 1000000 10000000] [--keep DIR] [--json out.json]
+
+Размер N — строк в events и bills; users, результатов экономии, состояний диалогов и
+получателей рассылки — N/10 (по ~10 счетов на пользователя). БД заполняет
+tests/fixtures_db.populate (рекурсивный CTE, индексы — миграциями после вставки). С --keep
+файлы bench_db_<N>.db переиспользуются между запусками (методы пишут в БД, но только в
+«свои» новые ключи).
+
+Время — µs на вызов, лучший из 3 прогонов; тяжёлые методы (снимок рассылки, загрузка
+всех диалогов) — один вызов. Чтения user идут мимо кэша (invalidate перед вызовом).
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT, Results, us_per_op  # noqa: F401
+
+from db import DB
+from fixtures_db import populate
+from utils import user_hash
+
+def run_size(results: Results, path: str, n: int) -> None:
+    users = max(n // 10, 1)
+    db = DB(path, buffer_events=False)
+    # новые user_id для вставок: не пересекаются ни между вызовами, ни между запусками с --keep
+    fresh = itertools.count(users + 1 + int(time.time()) % 100_000 * 100_000)
+    now = "2026-01-04T00:00:00"
+    event = ("2026-02-01T00:00:00", user_hash(1), "s", "0", "command_used", "/start", None, 0, "mvp-0.1.0")
+    bill = ("2025-01-01", "2025-01-31", 30, 300.0, 15000.0)
+    out = {"ok": True, "before_per_day": 10.0, "after_per_day": 9.0, "delta_kwh": 30.0, "pct": 10.0,
+           "delta_money": 750.0}
+    u = lambda i: 1 + (i * 7919) % users  # существующие пользователи вразброс
+
+    def get_user(i):
+        db.users.invalidate(u(i))
+        db.get_user(u(i))
+
+    def upsert_user(i):
+        uid = next(fresh)
+        db.upsert_user(uid, uid)
+
+    bid = db.create_broadcast("bench")
+    db.snapshot_broadcast(bid)
+    db.claim_broadcast(bid, "bench", 60)
+
+    def reset_user_data(i):
+        # отдельный пользователь с парой счетов: сброс не опустошает данные остальных кейсов
+        uid = next(fresh)
+        db.save_bill(uid, "current", "2025-01-01", "2025-01-31", 30, 300.0, 15000.0, None)
+        db.reset_user_data(uid)
+
+    def import_bills(i):
+        db.import_bills(next(fresh), [bill, ("2025-02-01", "2025-02-28", 28, 280.0, None)])
+
+    def refresh_rollups(i):
+        db.insert_events([event] * 1000)
+        db.refresh_rollups()
+
+    def snapshot(i):
+        b = db.create_broadcast("bench")
+        db.snapshot_broadcast(b)
+        db.set_broadcast_status(b, "paused")
+
+    # (метод, fn(i), вызовов за прогон, прогонов)
+    cases = [
+        ("upsert_user", upsert_user, 500, 3),
+        ("set_user_profile", lambda i: db.set_user_profile(u(i), city="astana", people="3-4"), 500, 3),
+        ("get_user", get_user, 2000, 3),
+        ("save_bill", lambda i: db.save_bill(u(i), "prev", "2025-01-01", "2025-01-31", 30, 300.0, 1.0, None), 500, 3),
+        ("import_bills", import_bills, 200, 3),
+        ("get_latest_bill", lambda i: db.get_latest_bill(u(i), "current"), 2000, 3),
+        ("add_action_done", lambda i: db.add_action_done(u(i), "led"), 500, 3),
+        ("reset_user_data", reset_user_data, 200, 3),
+        ("due_reminders", lambda i: db.due_reminders(now, ("2026-01-01T00:00:00", i), 500), 200, 3),
+        ("reschedule_reminders",
+         lambda i: db.reschedule_reminders([("2026-01-08T00:00:00", u(i * 100 + k)) for k in range(100)]), 50, 3),
+        ("bill_history", lambda i: db.bill_history(u(i) - 1, 500), 50, 3),
+        ("replace_savings_results",
+         lambda i: db.replace_savings_results(u(i) - 1, u(i), [(10**12 + i, u(i), 1, 10.0, 9.0, 30.0, 10.0, 750.0)]),
+         500, 3),
+        ("save_savings_result", lambda i: db.save_savings_result(2 * 10**12 + i, u(i), 1, out), 500, 3),
+        ("get_savings_summary", lambda i: db.get_savings_summary(u(i)), 2000, 3),
+        ("create_broadcast", lambda i: db.create_broadcast("bench"), 200, 3),
+        ("snapshot_broadcast", snapshot, 1, 1),
+        ("claim_broadcast", lambda i: db.claim_broadcast(bid, "bench", 60), 500, 3),
+        ("broadcast_pending", lambda i: db.broadcast_pending(bid, (i * 997) % users, 500), 200, 3),
+        ("checkpoint_broadcast",
+         lambda i: db.checkpoint_broadcast(bid, "bench", 60, [("sent", None, u(i * 50 + k)) for k in range(50)], u(i)),
+         100, 3),
+        ("finish_broadcast", lambda i: db.finish_broadcast(10**9, "bench"), 500, 3),
+        ("release_broadcast", lambda i: db.release_broadcast(10**9, "bench"), 500, 3),
+        ("set_broadcast_status", lambda i: db.set_broadcast_status(bid, "running"), 500, 3),
+        ("get_broadcast", lambda i: db.get_broadcast(bid), 2000, 3),
+        ("list_broadcasts", lambda i: db.list_broadcasts(10, active_only=i % 2 == 0), 1000, 3),
+        ("log_event", lambda i: db.log_event(u(i), "s", "0", "command_used", "/start", {"i": i}), 500, 3),
+        ("insert_events[200]", lambda i: db.insert_events([event] * 200), 50, 3),
+        ("refresh_rollups[1000]", refresh_rollups, 3, 3),
+        ("load_user_data", lambda i: db.load_user_data(), 1, 1),
+        ("load_conv_states", lambda i: db.load_conv_states("main_conv"), 1, 1),
+        ("save_conv_data[100]",
+         lambda i: db.save_conv_data([(u(i * 100 + k), '{"x": 1}') for k in range(100)],
+                                     [("main_conv", f"[{u(i * 100 + k)}, {u(i * 100 + k)}]", 3) for k in range(100)]),
+         50, 3),
+    ]
+    print(f"\ndb.DB, N={n:,} (µs/op)")
+    for name, fn, calls, repeat in cases:
+        results.add(f"db.{n}.{name}", us_per_op(fn, calls, repeat=repeat, warmup=min(calls, 10) if repeat > 1 else 0))
+    db.close()
+
+def run(results: Results, sizes=(10_000, 1_000_000, 10_000_000), keep=None) -> None:
+    if keep:
+        Path(keep).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = str(Path(keep or tmp) / f"bench_db_{n}.db")
+            if not os.path.exists(path):
+                t0 = time.perf_counter()
+                populate(path, n)
+                print(f"populate N={n:,}: {time.perf_counter() - t0:.1f} s, {os.path.getsize(path) / 2**20:,.0f} MB")
+            run_size(results, path, n)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    ap.add_argument("--keep", help="каталог для файлов БД (переиспользуются)")
+    ap.add_argument("--json", help="сохранить результаты в файл")
+    args = ap.parse_args()
+    results = Results()
+    run(results, args.sizes, args.keep)
+    if args.json:
+        results.save(args.json)
+
+if __name__ == "__main__":
+    main()
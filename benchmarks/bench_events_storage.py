@@ -0,0 +1,159 @@
+"""
+Хранение events: широкая таблица (схема 7 — TEXT-колонки в каждой строке) против компактной
+events_packed со словарями (схема 8+, view events поверх). Один и тот же набор событий,
+похожий на то, что пишет бот (main.log_evt); упакованная БД получается миграцией копии широкой.
+
+    python benchmarks/bench_events_storage.py [--rows 1000000] [--users 50000] [--keep DIR]
+
+Размеры — по dbstat после VACUUM: таблица событий (со словарями) и её индексы.
+Сканы — лучшее из --repeat прогонов на свежем read-only соединении; "view:" — произвольный
+SQL через view events (у упакованной БД это join со словарями на каждую строку).
+"""
+import argparse
+import calendar
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT  # noqa: F401
+
+import kpi
+from config import APP_VERSION
+from db import DB, INSERT_EVENT_SQL, MIGRATIONS, SCHEMA
+from utils import json_dumps, user_hash
+
+WIDE_VERSION = 7  # последняя схема с широкой таблицей events
+
+COMMANDS = ("/help", "/privacy", "/saved", "/analyze", "/savings", "/demo", "/feedback")
+
+def _event(rnd: random.Random):
+    # (event_name, command, payload) примерно в пропорциях живого бота
+    r = rnd.random()
+    if r < 0.40:
+        command = rnd.choice(COMMANDS)
+        return "command_used", command, {"redirect": "onboarding"} if rnd.random() < 0.1 else None
+    if r < 0.55:
+        return "bot_start", "/start", None
+    if r < 0.63:
+        return "onboarding_done", None, None
+    if r < 0.78:
+        return "analysis_generated", None, {"basis": rnd.choice(("prev", "norm")),
+                                            "pct": round(rnd.uniform(-40, 60), 1), "spike": rnd.random() < 0.3}
+    if r < 0.88:
+        return "action_marked_done", None, {"idx": rnd.randint(1, 3), "title": "Выключать бойлер на ночь"}
+    if r < 0.95:
+        return "savings_calculated", None, {"pct": round(rnd.uniform(-20, 30), 1),
+                                            "delta_kwh": round(rnd.uniform(-50, 80), 1), "tariff_used": rnd.random() < 0.5}
+    return "feedback_submitted", None, {"star": rnd.randint(1, 5), "comment": ""}
+
+def make_rows(n: int, users: int, seed: int = 1):
+    rnd = random.Random(seed)
+    t0 = calendar.timegm((2026, 1, 1, 0, 0, 0))
+    sessions = {}
+    for i in range(n):
+        uid = 10**8 + rnd.randrange(users)
+        if uid not in sessions or rnd.random() < 0.05:
+            sessions[uid] = "%012x" % rnd.getrandbits(48)
+        name, command, payload = _event(rnd)
+        yield (
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t0 + i * 5)),
+            user_hash(uid),
+            sessions[uid],
+            str(rnd.randrange(27)),
+            name,
+            command,
+            json_dumps(payload) if payload is not None else None,
+            int(command == "/demo"),
+            APP_VERSION,
+        )
+
+def build_wide(path: str, rows: int, users: int) -> None:
+    with sqlite3.connect(path) as c:
+        c.executescript(SCHEMA)  # индексы строим после вставки
+        c.executemany(INSERT_EVENT_SQL, make_rows(rows, users))
+    c = sqlite3.connect(path)
+    for i, script in enumerate(MIGRATIONS[:WIDE_VERSION], start=1):
+        c.executescript(f"BEGIN;\n{script}\nPRAGMA user_version={i};\nCOMMIT;")
+    c.execute("VACUUM")
+    c.close()
+
+def events_size(path: str):
+    # (таблица + словари, индексы) в байтах
+    with sqlite3.connect(path) as c:
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        sizes = dict(c.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+    tables = sum(v for k, v in sizes.items() if k in ("events", "events_packed", "event_strings", "event_users"))
+    indexes = sum(v for k, v in sizes.items() if k.startswith(("idx_events", "sqlite_autoindex_event")))
+    return tables, indexes
+
+def best(fn, repeat: int) -> float:
+    out = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out = min(out, time.perf_counter() - t0)
+    return out
+
+def scans(path: str, repeat: int):
+    def compute(since=None):
+        with kpi.connect_ro(path) as c:
+            kpi.compute(c, since)
+
+    def full_scan():
+        # export.py и прочие читатели view: все колонки, все строки
+        with kpi.connect_ro(path) as c:
+            for _ in c.execute("SELECT * FROM events"):
+                pass
+
+    def by_user():
+        with kpi.connect_ro(path) as c:
+            c.execute("SELECT COUNT(*) FROM (SELECT user_hash FROM events GROUP BY user_hash)").fetchone()
+
+    return {
+        "kpi.compute": best(compute, repeat),
+        "kpi.compute(since)": best(lambda: compute("2026-01-20"), repeat),
+        "view: SELECT *": best(full_scan, repeat),
+        "view: GROUP BY user_hash": best(by_user, repeat),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--users", type=int, default=50_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--keep", help="каталог для wide.db/packed.db (переиспользуются)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        d = Path(args.keep or tmp)
+        d.mkdir(parents=True, exist_ok=True)
+        wide, packed = str(d / "wide.db"), str(d / "packed.db")
+        if not Path(wide).exists():
+            t0 = time.perf_counter()
+            build_wide(wide, args.rows, args.users)
+            print(f"populate {args.rows:,} rows: {time.perf_counter() - t0:.1f} s")
+        if not Path(packed).exists():
+            shutil.copy(wide, packed)
+            t0 = time.perf_counter()
+            DB(packed, buffer_events=False).close()
+            t1 = time.perf_counter()
+            with sqlite3.connect(packed) as c:
+                c.execute("VACUUM")
+            print(f"migration to packed: {t1 - t0:.1f} s, VACUUM {time.perf_counter() - t1:.1f} s")
+
+        (wt, wi), (pt, pi) = events_size(wide), events_size(packed)
+        print(f"\n{'':<24} {'wide':>10} {'packed':>10} {'ratio':>7}")
+        for title, w, p in (("table, MB", wt, pt), ("indexes, MB", wi, pi), ("total, MB", wt + wi, pt + pi)):
+            print(f"{title:<24} {w / 2**20:>10.1f} {p / 2**20:>10.1f} {w / p:>6.2f}x")
+        print(f"{'bytes/event':<24} {(wt + wi) / args.rows:>10.0f} {(pt + pi) / args.rows:>10.0f}")
+
+        sw, sp = scans(wide, args.repeat), scans(packed, args.repeat)
+        print(f"\n{'scan, ms':<24} {'wide':>10} {'packed':>10} {'speedup':>7}")
+        for name in sw:
+            print(f"{name:<24} {sw[name] * 1000:>10.1f} {sp[name] * 1000:>10.1f} {sw[name] / sp[name]:>6.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Сквозной сценарий через настоящий main.build_app(): ConversationHandler, хендлеры,
+SQLitePersistence, AsyncDB, метрики и лимитер — всё как в проде, кроме Bot API
+(OfflineRequest поверх FakeBotAPI, без сети) и лимитов Telegram (сняты).
+
+    python benchmarks/bench_flow.py [--users 200] [--json out.json]
+
+Каждый пользователь проходит /start → онбординг (6 кнопок) → /analyze → текущий и
+прошлый период → 3 вопроса контекста → результаты (18 апдейтов). Готово, когда каждому
+пришёл текст с «Top-3 действия». Все апдейты ставятся в очередь сразу, так что
+p50/p95 bot_update_seconds — задержка под пиковой нагрузкой, а не одиночного апдейта. main импортируется из временного каталога: его data.db
+создаётся там, а не в репозитории.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+from common import ROOT, Results  # noqa: F401
+
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI, OfflineRequest, callback_update, message_update
+
+FLOW = [
+    ("msg", "/start"),
+    ("cb", "onb:city:almaty"), ("cb", "onb:home:flat"), ("cb", "onb:heat:electric"),
+    ("cb", "onb:people:2"), ("cb", "onb:tariff:yes"), ("cb", "onb:remind:yes"),
+    ("msg", "/analyze"),
+    ("cb", "period:last30"), ("cb", "valmode:both"), ("msg", "900 45000"),
+    ("cb", "prev:yes"), ("cb", "period:prev30"), ("cb", "valmode:both"), ("msg", "720 38000"),
+    ("cb", "ctx:cold:yes"), ("cb", "ctx:boiler:yes"), ("cb", "ctx:new:no"),
+]
+DONE_MARK = "Top-3 действия"
+
+def updates_for(user_id: int):
+    for kind, value in FLOW:
+        yield message_update(user_id, value) if kind == "msg" else callback_update(user_id, value)
+
+async def run_flow(users: int, timeout: float = 300.0) -> dict:
+    import main  # после chdir: module-level DB("data.db") во временном каталоге
+    from metrics import _merge
+    from outbound import TokenBucket
+    from telegram import Update
+
+    api = FakeBotAPI()
+    warnings.filterwarnings("ignore", message="If 'per_message=False'")  # известно, см. build_app
+    app = main.build_app(OfflineRequest(api))
+    # лимитер остаётся в пути ответов, но без лимитов Telegram — иначе меряется 30 сообщений/с
+    limiter = app.bot.rate_limiter
+    limiter.global_bucket = TokenBucket(1e6, 1e6)
+    limiter.private = (1e6, 1e6)
+    # start_entry печатает каждого пользователя — в бенчмарке это шум
+    with contextlib.redirect_stdout(io.StringIO()):
+        await app.initialize()
+        await app.start()
+        updates = [u for uid in range(1, users + 1) for u in updates_for(uid)]
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        for u in updates:
+            await app.update_queue.put(Update.de_json(u, app.bot))
+        deadline = time.monotonic() + timeout
+        while sum(1 for m in api.sent if DONE_MARK in m["text"]) < users:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"сценарий не дошёл до результатов за {timeout:.0f} с "
+                                   f"(последний ответ: {api.sent[-1]['text'][:200] if api.sent else '-'})")
+            await asyncio.sleep(0.005)
+        dt, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+        await app.stop()
+        await app.shutdown()
+    api.stop()
+    h = _merge(main.metrics.series("bot_update_seconds"), None).get(None)
+    return {
+        "updates": len(updates),
+        "updates_per_sec": len(updates) / dt,
+        "cpu_us_per_update": cpu / len(updates) * 1e6,
+        "p50_ms": h.quantile(0.5) * 1000 if h else 0.0,
+        "p95_ms": h.quantile(0.95) * 1000 if h else 0.0,
+        "api_calls": sum(api.calls.values()),
+    }
+
+def run(results: Results, users: int = 200) -> None:
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", FAKE_TOKEN)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            r = asyncio.run(run_flow(users))
+        finally:
+            os.chdir(cwd)
+    print(f"\nflow: {users} users x {len(FLOW)} updates, {r['api_calls']} Bot API calls")
+    results.add("flow.updates_per_sec", r["updates_per_sec"], "updates/s", "higher")
+    results.add("flow.cpu_per_update", r["cpu_us_per_update"], "us/update")
+    results.add("flow.update_p50", r["p50_ms"], "ms")
+    results.add("flow.update_p95", r["p95_ms"], "ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--json", help="сохранить результаты в файл")
+    args = ap.parse_args()
+    if "main" in sys.modules:  # уже импортирован из другого каталога — data.db был бы не тот
+        raise SystemExit("bench_flow нужно запускать отдельным процессом")
+    results = Results()
+    run(results, args.users)
+    if args.json:
+        results.save(args.json)
+
+if __name__ == "__main__":
+    main()
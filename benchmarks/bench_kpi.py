@@ -0,0 +1,70 @@
+"""
+KPI на синтетической таблице events (по умолчанию 10M строк).
+
+    python benchmarks/bench_kpi.py [--rows 10000000] [--users 200000] [--keep bench_kpi.db]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT  # noqa: F401
+
+import kpi
+from db import DB, SCHEMA
+
+# (event_name, доля пользователей, дошедших до события) — чтобы воронка была похожа на правду
+EVENT_NAMES = (
+    ("command_used", 1.0), ("command_used", 1.0), ("command_used", 1.0),
+    ("bot_start", 1.0), ("onboarding_done", 0.7), ("analysis_generated", 0.5),
+    ("action_marked_done", 0.3), ("savings_calculated", 0.15), ("feedback_submitted", 0.1),
+)
+
+def populate(path: str, rows: int, users: int) -> None:
+    names = ", ".join(f"('{n}', {share})" for n, share in EVENT_NAMES)
+    with sqlite3.connect(path) as c:
+        c.executescript(SCHEMA)  # индексы строим после вставки — так в разы быстрее
+        c.execute("CREATE TEMP TABLE names(id INTEGER PRIMARY KEY, name TEXT, share REAL)")
+        c.execute(f"INSERT INTO names(name, share) VALUES {names}")
+        c.execute(
+            """
+            WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i + 1 < :rows)
+            INSERT INTO events(ts_utc, user_hash, session_id, state, event_name, payload_json, app_version)
+            SELECT
+              datetime('2026-01-01', '+' || (i / 1000) || ' minutes'),
+              printf('%016x', (i * 7919) % MAX(1, CAST(:users * names.share AS INTEGER))),
+              's', '0',
+              names.name,
+              CASE WHEN names.name = 'feedback_submitted' THEN '{"star":' || (1 + i % 5) || '}' END,
+              'mvp-0.1.0'
+            FROM seq JOIN names ON names.id = 1 + (i * 31) % :n
+            """,
+            {"rows": rows, "users": users, "n": len(EVENT_NAMES)},
+        )
+    DB(path, buffer_events=False).close()  # миграции: индексы
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--users", type=int, default=200_000)
+    ap.add_argument("--keep", help="сохранить/переиспользовать файл БД")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.keep or str(Path(tmp) / "kpi.db")
+        if not os.path.exists(path):
+            t0 = time.perf_counter()
+            populate(path, args.rows, args.users)
+            print(f"populate {args.rows:,} rows: {time.perf_counter() - t0:.1f} s")
+
+        with kpi.connect_ro(path) as c:
+            t0 = time.perf_counter()
+            k = kpi.compute(c)
+            dt = time.perf_counter() - t0
+        kpi.print_report(k)
+        print(f"\nkpi.compute: {dt:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Цена метрик (metrics.py): один и тот же поток апдейтов через Application с диалогом,
+БД (AsyncDB) и ответами в фейковый Bot API — без инструментирования и с ним.
+Bot API — OfflineRequest (без HTTP): иначе время уходит на сервер в том же процессе,
+а разброс между прогонами больше измеряемой разницы.
+Прогоны чередуются, сравниваются медианы CPU на апдейт. Код выхода 1, если метрики
+добавляют больше 2%.
+
+    python benchmarks/bench_metrics.py [--users 200] [--per-user 10] [--rounds 7]
+
+Отдельно — стоимость одной обёртки metrics.timed (µs на вызов) на пустой корутине.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT  # noqa: F401
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
+
+from concurrency import PerUserUpdateProcessor
+from db import DB, AsyncDB
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI, OfflineRequest, message_update
+from metrics import Metrics, TimedRequest, instrument_app, instrument_db
+from outbound import OutboundRateLimiter
+
+S_ASK, S_VALUE = range(2)
+
+def build(api: FakeBotAPI, db: AsyncDB, metrics, done: asyncio.Event, total: int) -> Application:
+    request = OfflineRequest(api)
+    app = (
+        Application.builder().token(FAKE_TOKEN)
+        .request(TimedRequest(metrics, request) if metrics is not None else request)
+        .concurrent_updates(PerUserUpdateProcessor(64))
+        .rate_limiter(OutboundRateLimiter(global_rate=1e6, global_burst=1e6, private_rate=1e6, private_burst=1e6))
+        .build()
+    )
+    count = 0
+
+    async def finish():
+        nonlocal count
+        count += 1
+        if count == total:
+            done.set()
+
+    async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await db.upsert_user(update.effective_user.id, update.effective_chat.id)
+        await update.message.reply_text("Сколько кВт*ч?")
+        await finish()
+        return S_VALUE
+
+    async def value(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await db.get_user(update.effective_user.id)
+        await update.message.reply_text("ok")
+        await finish()
+        return S_ASK
+
+    async def ask(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.message.reply_text("Ещё?")
+        await finish()
+        return S_VALUE
+
+    text = filters.TEXT & ~filters.COMMAND
+    app.add_handler(ConversationHandler(
+        entry_points=[CommandHandler("start", start)],
+        states={S_VALUE: [MessageHandler(text, value)], S_ASK: [MessageHandler(text, ask)]},
+        fallbacks=[],
+    ))
+    if metrics is not None:
+        instrument_app(app, metrics, {S_ASK: "S_ASK", S_VALUE: "S_VALUE"})
+    return app
+
+async def run_once(tmp: str, users: int, per_user: int, instrumented: bool):
+    db = AsyncDB(DB(str(Path(tmp) / f"m{time.perf_counter_ns()}.db"), buffer_events=False))
+    metrics = Metrics() if instrumented else None
+    if metrics is not None:
+        instrument_db(db, metrics)
+    api = FakeBotAPI()
+    done = asyncio.Event()
+    total = users * per_user
+    app = build(api, db, metrics, done, total)
+    updates = [message_update(u, "/start" if i == 0 else "310") for i in range(per_user) for u in range(1, users + 1)]
+    await app.initialize()
+    await app.start()
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    for u in updates:
+        await app.update_queue.put(Update.de_json(u, app.bot))
+    await done.wait()
+    dt, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    await app.stop()
+    await app.shutdown()
+    api.stop()
+    await db.close()
+    return total / dt, cpu / total, metrics
+
+async def wrapper_cost(n: int = 200_000) -> float:
+    # µs на вызов: пустая корутина через metrics.timed против прямого вызова
+    m = Metrics()
+
+    async def noop():
+        return None
+    timed = m.timed("bench_seconds")(noop)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await noop()
+    t1 = time.perf_counter()
+    for _ in range(n):
+        await timed()
+    t2 = time.perf_counter()
+    return ((t2 - t1) - (t1 - t0)) / n * 1e6
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--per-user", type=int, default=10)
+    ap.add_argument("--rounds", type=int, default=7)
+    args = ap.parse_args()
+
+    runs = {False: [], True: []}
+    with tempfile.TemporaryDirectory() as tmp:
+        await run_once(tmp, args.users, 2, False)  # прогрев
+        for _ in range(args.rounds):
+            for instrumented in (False, True):
+                rate, cpu, m = await run_once(tmp, args.users, args.per_user, instrumented)
+                runs[instrumented].append((rate, cpu))
+                if m is not None:
+                    metrics = m  # сводка последнего инструментированного прогона
+
+    for instrumented, title in ((False, "without metrics"), (True, "with metrics   ")):
+        rates = [r for r, _ in runs[instrumented]]
+        print(f"{title}: {statistics.median(rates):,.0f} updates/s, "
+              f"CPU {statistics.median(c for _, c in runs[instrumented]) * 1e6:,.0f} µs/update  "
+              f"(rounds {', '.join(f'{x:,.0f}' for x in rates)})")
+    # CPU на апдейт стабильнее пропускной способности: в ней ещё ожидание потока БД
+    cpu_plain = statistics.median(c for _, c in runs[False])
+    cpu_timed = statistics.median(c for _, c in runs[True])
+    overhead = (cpu_timed - cpu_plain) / cpu_plain * 100
+    per_call = await wrapper_cost()
+    print(f"overhead: {overhead:+.2f}% CPU per update; wrapper alone {per_call:.2f} µs/call "
+          f"(~5 calls per update = {per_call * 5 / (cpu_plain * 1e6) * 100:.2f}%)")
+    print()
+    print(metrics.summary())
+    if overhead > 2.0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
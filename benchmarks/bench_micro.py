@@ -0,0 +1,59 @@
+"""
+Микробенчмарки чистых функций: разбор ввода (utils), хеш и сериализация для events,
+анализ и расчёт экономии (analytics). µs на вызов, лучший из 5 прогонов.
+
+    python benchmarks/bench_micro.py [--n 20000] [--json out.json]
+
+Входные данные — циклический набор типичных строк/профилей, чтобы в цифре были и
+удачные, и неудачные ветки разбора.
+"""
+import argparse
+
+from common import ROOT, Results, us_per_op  # noqa: F401
+
+from analytics import make_analysis, savings_calc
+from utils import json_dumps, parse_custom_period, parse_one_or_two_numbers, user_hash
+
+NUMBERS = ["320", "900 45000", "1 250,5 кВт 38 000 тг", "12,5к", "abc", "  410   ", "100 200 300", ""]
+PERIODS = ["с 01.01.2026 по 31.01.2026", "С 01.02.2026 по 28.02.2026", "с 31.01.2026 по 01.01.2026",
+           "с 31.02.2026 по 01.03.2026", "01.01.2026-31.01.2026"]
+PAYLOADS = [
+    {"period": "last30", "days": 30},
+    {"kwh": 900.0, "money": 45000.0, "warn": None},
+    {"star": 5, "comment": "всё понятно, спасибо"},
+    {"basis": "kwh", "pct": 25.0, "spike": True, "reasons": ["Отопление", "Бойлер"]},
+]
+PROFILES = [
+    ({"heating": "electric", "people": "3-4"}, {"cold": True, "boiler": True, "new_appliance": False}),
+    ({"heating": "gas", "people": "1"}, {"cold": False, "boiler": None, "more_time_home": True}),
+    ({"heating": "central", "people": "5+"}, {}),
+]
+VALUES = [(900.0, 720.0, 45000.0, 38000.0), (310.0, None, None, None), (None, None, 45000.0, 30000.0)]
+SAVINGS = [(900.0, 30, 720.0, 30, 25.0), (600.0, 31, 640.0, 28, None), (None, 30, 500.0, 30, 25.0)]
+
+def run(results: Results, n: int = 20_000) -> None:
+    print("\nmicro (µs/op)")
+    cases = {
+        "parse_one_or_two_numbers": lambda i: parse_one_or_two_numbers(NUMBERS[i % len(NUMBERS)]),
+        "parse_custom_period": lambda i: parse_custom_period(PERIODS[i % len(PERIODS)]),
+        # разные id: иначе меряется только один и тот же хеш
+        "user_hash": lambda i: user_hash(100_000 + i),
+        "json_dumps": lambda i: json_dumps(PAYLOADS[i % len(PAYLOADS)]),
+        "make_analysis": lambda i: make_analysis(*PROFILES[i % len(PROFILES)], *VALUES[i % len(VALUES)]),
+        "savings_calc": lambda i: savings_calc(*SAVINGS[i % len(SAVINGS)]),
+    }
+    for name, fn in cases.items():
+        results.add(f"micro.{name}", us_per_op(fn, n))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20_000)
+    ap.add_argument("--json", help="сохранить результаты в файл")
+    args = ap.parse_args()
+    results = Results()
+    run(results, args.n)
+    if args.json:
+        results.save(args.json)
+
+if __name__ == "__main__":
+    main()
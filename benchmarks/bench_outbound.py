@@ -0,0 +1,110 @@
+"""
+OutboundRateLimiter на фейковом Bot API.
+
+    python benchmarks/bench_outbound.py [--bulk 300] [--interactive 20]
+
+1. Рассылка --bulk сообщений по разным чатам, на фоне — ответы пользователям раз в 250 мс:
+   без лимитера / лимитер с одной полосой / лимитер с полосами INTERACTIVE и BULK.
+   Печатает максимум отправок за любую секунду (лимит Telegram — 30) и задержку ответов.
+2. 10 одновременных сообщений в один чат: сколько вызовов sendMessage дошло до API.
+3. API отвечает 429 на первые запросы: всё доставлено, сколько было повторов.
+"""
+import argparse
+import asyncio
+import time
+
+from common import ROOT  # noqa: F401
+
+from telegram.ext import ExtBot
+
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI
+from outbound import BULK, OutboundRateLimiter
+
+def max_per_second(ts) -> int:
+    ts = sorted(ts)
+    best, lo = 0, 0
+    for hi, t in enumerate(ts):
+        while t - ts[lo] >= 1.0:
+            lo += 1
+        best = max(best, hi - lo + 1)
+    return best
+
+def pct(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+async def scenario_bulk(limiter, bulk_lane, n_bulk: int, n_inter: int) -> dict:
+    api = FakeBotAPI().start()
+    bot = ExtBot(FAKE_TOKEN, base_url=api.base_url, rate_limiter=limiter)
+    latencies = []
+
+    async def reply(i: int):
+        await asyncio.sleep(0.25 * i)
+        t0 = time.perf_counter()
+        await bot.send_message(1_000_000 + i, f"reply {i}")
+        latencies.append(time.perf_counter() - t0)
+
+    async with bot:
+        kw = {"rate_limit_args": bulk_lane} if limiter is not None else {}
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            *(bot.send_message(10 + i, f"bulk {i}", **kw) for i in range(n_bulk)),
+            *(reply(i) for i in range(n_inter)),
+        )
+        dt = time.perf_counter() - t0
+    api.stop()
+    return {
+        "seconds": dt,
+        "max_per_s": max_per_second([s["ts"] for s in api.sent]),
+        "reply_p50_ms": pct(latencies, 0.5) * 1000,
+        "reply_max_ms": max(latencies) * 1000,
+    }
+
+async def scenario_coalesce(limiter) -> int:
+    api = FakeBotAPI().start()
+    bot = ExtBot(FAKE_TOKEN, base_url=api.base_url, rate_limiter=limiter)
+    async with bot:
+        # как старый demo_entry: много коротких сообщений одному пользователю
+        await bot.send_message(7, "first")
+        await asyncio.gather(*(bot.send_message(7, f"line {i}") for i in range(10)))
+    api.stop()
+    return api.calls["sendMessage"]
+
+async def scenario_flood() -> dict:
+    api = FakeBotAPI().start()
+    limiter = OutboundRateLimiter()
+    bot = ExtBot(FAKE_TOKEN, base_url=api.base_url, rate_limiter=limiter)
+    async with bot:
+        api.flood(3, retry_after=1)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(bot.send_message(100 + i, "x") for i in range(10)))
+        dt = time.perf_counter() - t0
+    api.stop()
+    return {"delivered": len(api.sent), "flooded": api.flooded, "retries": limiter.retries, "seconds": dt}
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bulk", type=int, default=300)
+    ap.add_argument("--interactive", type=int, default=20)
+    args = ap.parse_args()
+
+    print(f"1) bulk={args.bulk} + interactive={args.interactive}")
+    for name, limiter, lane in (
+        ("no limiter", None, None),
+        ("limiter, one lane", OutboundRateLimiter(), None),
+        ("limiter, bulk lane", OutboundRateLimiter(), BULK),
+    ):
+        r = await scenario_bulk(limiter, lane, args.bulk, args.interactive)
+        print(f"   {name:<20} {r['seconds']:>6.1f} s  max {r['max_per_s']:>4}/s  "
+              f"reply p50 {r['reply_p50_ms']:>7.1f} ms  max {r['reply_max_ms']:>7.1f} ms")
+
+    print("2) 1 + 10 concurrent messages to one chat")
+    print(f"   no limiter  {await scenario_coalesce(None):>3} sendMessage calls")
+    lim = OutboundRateLimiter()
+    print(f"   limiter     {await scenario_coalesce(lim):>3} sendMessage calls (coalesced {lim.coalesced})")
+
+    r = await scenario_flood()
+    print(f"3) 429 on first 3 sends: delivered {r['delivered']}/10, retries {r['retries']}, {r['seconds']:.1f} s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
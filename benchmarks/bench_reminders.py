@@ -0,0 +1,114 @@
+"""
+Тик ReminderScheduler на фейковых часах и фейковом боте: стоимость тика при 10k и 100k+
+подписчиках должна зависеть от числа наступивших напоминаний, а не от размера users.
+Заодно проверяется, что за неделю виртуального времени каждый получил ровно одно напоминание
+(код выхода 1, если нет).
+
+    python benchmarks/bench_reminders.py [--users 10000 100000] [--tick-sec 60] [--hours 2]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from common import ROOT  # noqa: F401
+
+from db import DB, AsyncDB
+from reminders import ReminderScheduler
+
+START = datetime(2026, 1, 5, 0, 0, 0)
+WEEK = timedelta(days=7)
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent = Counter()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent[chat_id] += 1
+
+class FakeClock:
+    def __init__(self, now: datetime) -> None:
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+def populate(path: str, users: int) -> None:
+    # подписчики равномерно размазаны по неделе
+    DB(path, buffer_events=False).close()
+    step = WEEK.total_seconds() / users
+    with sqlite3.connect(path) as c:
+        c.execute(
+            """
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < :n)
+            INSERT INTO users(user_id, user_hash, chat_id, reminders, next_due_at, created_at, updated_at)
+            SELECT i, printf('%016x', i), i, 1,
+                   strftime('%Y-%m-%dT%H:%M:%S', :start, '+' || CAST(i * :step AS INTEGER) || ' seconds'),
+                   :start, :start
+            FROM seq
+            """,
+            {"n": users, "start": START.isoformat(), "step": step},
+        )
+
+async def simulate(path: str, tick: timedelta, hours: float, week: bool) -> dict:
+    db = AsyncDB(DB(path, buffer_events=False))
+    clock = FakeClock(START)
+    bot = FakeBot()
+    sched = ReminderScheduler(db, interval=WEEK, clock=clock, max_per_tick=100_000)
+    ticks = []
+    end = START + (WEEK if week else timedelta(hours=hours))
+    while clock.now < end:
+        clock.now += tick
+        t0 = time.perf_counter()
+        await sched.tick(bot)
+        ticks.append(time.perf_counter() - t0)
+    await db.close()
+    ticks.sort()
+    return {
+        "ticks": len(ticks),
+        "sent": sum(bot.sent.values()),
+        "max_per_user": max(bot.sent.values(), default=0),
+        "distinct": len(bot.sent),
+        "p50_ms": ticks[len(ticks) // 2] * 1000,
+        "p99_ms": ticks[int(len(ticks) * 0.99)] * 1000,
+    }
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--tick-sec", type=int, default=60)
+    ap.add_argument("--hours", type=float, default=2, help="сколько виртуального времени мерить тики")
+    args = ap.parse_args()
+
+    ok = True
+    tick = timedelta(seconds=args.tick_sec)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.users:
+            path = str(Path(tmp) / f"rem_{n}.db")
+            populate(path, n)
+            r = await simulate(path, tick, args.hours, week=False)
+            due_per_tick = n * tick.total_seconds() / WEEK.total_seconds()
+            print(f"users={n:>8,}  due/tick≈{due_per_tick:>6.0f}  "
+                  f"tick p50 {r['p50_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms  ({r['ticks']} ticks)")
+            os.remove(path)
+
+        # корректность: неделя виртуального времени -> каждый ровно один раз
+        n = min(args.users)
+        path = str(Path(tmp) / "rem_week.db")
+        populate(path, n)
+        r = await simulate(path, tick, 0, week=True)
+        week_ok = r["distinct"] == n and r["max_per_user"] == 1
+        ok &= week_ok
+        print(f"week: users={n:,} sent={r['sent']:,} distinct={r['distinct']:,} "
+              f"max_per_user={r['max_per_user']}  ok={week_ok}")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
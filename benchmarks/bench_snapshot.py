@@ -0,0 +1,108 @@
+"""
+Снимок для аналитики (snapshot.py) под нагрузкой: писатель в отдельном процессе коммитит
+по одному событию (DB.log_event без буфера) с заданной частотой, латентность каждого коммита
+пишется. Сначала --seconds без снимков (база), потом столько же со снимками через --gap —
+для каждого --pages; сравниваются коммиты, начатые во время снимков. Писатель не должен
+заметить бэкап: p99/max коммита как в базе. Снимки подряд без паузы на одном ядре меряют уже
+конкуренцию за CPU, а не блокировки.
+
+    python benchmarks/bench_snapshot.py [--rows 300000] [--rate 200] [--seconds 5] [--pages 64 256 1024]
+
+Код выхода 1, если p99 коммита во время снимков выше базы больше чем на --budget-ms.
+"""
+import argparse
+import multiprocessing as mp
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT  # noqa: F401
+
+from db import DB
+from fixtures_db import populate
+from snapshot import take_snapshot
+
+def writer(path: str, rate: float, stop, out) -> None:
+    db = DB(path, buffer_events=False)
+    lat = []  # (monotonic старта, секунды)
+    i = 0
+    nxt = time.monotonic()
+    while not stop.is_set():
+        t0 = time.monotonic()
+        db.log_event(10**9 + i % 1000, "bench", "0", "command_used", "/start", {"i": i})
+        lat.append((t0, time.monotonic() - t0))
+        i += 1
+        nxt += 1 / rate
+        time.sleep(max(0.0, nxt - time.monotonic()))
+    db.close()
+    out.send(lat)
+
+def pct(xs, q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))] if xs else 0.0
+
+def window(lat, spans):
+    return [d for t, d in lat if any(t0 <= t < t1 for t0, t1 in spans)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--rate", type=float, default=200, help="коммитов писателя в секунду")
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--pages", type=int, nargs="+", default=[64, 256, 1024])
+    ap.add_argument("--pause", type=float, default=0.002)
+    ap.add_argument("--gap", type=float, default=0.5, help="пауза между снимками, с")
+    ap.add_argument("--budget-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, out = str(Path(tmp) / "live.db"), str(Path(tmp) / "analytics.db")
+        t0 = time.perf_counter()
+        populate(path, args.rows)
+        print(f"populate N={args.rows:,}: {time.perf_counter() - t0:.1f} s, "
+              f"{Path(path).stat().st_size / 2**20:.0f} MB")
+
+        stop = mp.Event()
+        recv, send = mp.Pipe(duplex=False)
+        proc = mp.Process(target=writer, args=(path, args.rate, stop, send))
+        proc.start()
+        time.sleep(1)  # прогрев писателя
+        base = [(time.monotonic(), time.monotonic() + args.seconds)]
+        time.sleep(args.seconds)
+        runs = []
+        for pages in args.pages:
+            t_start = time.monotonic()
+            snaps, spans = [], []
+            while time.monotonic() - t_start < args.seconds:
+                t0 = time.monotonic()
+                snaps.append(take_snapshot(path, out, pages, args.pause))
+                spans.append((t0, time.monotonic()))
+                time.sleep(args.gap)
+            runs.append((pages, spans, snaps))
+        stop.set()
+        lat = recv.recv()
+        proc.join()
+
+    def row(title, xs, extra=""):
+        print(f"{title:<22} {len(xs):>7} {statistics.median(xs) * 1000:>8.2f} {pct(xs, 0.99) * 1000:>8.2f} "
+              f"{max(xs) * 1000:>8.2f}  {extra}")
+
+    print(f"\nwriter commit, ms        {'commits':>7} {'p50':>8} {'p99':>8} {'max':>8}")
+    b = window(lat, base)
+    row("no snapshot", b)
+    worst = 0.0
+    for pages, spans, snaps in runs:
+        w = window(lat, spans)
+        s = snaps[-1]
+        row(f"snapshot pages={pages}", w,
+            f"{len(snaps)} snapshots, {s['bytes'] / 2**20:.0f} MB in {statistics.median(x['seconds'] for x in snaps):.2f}s, "
+            f"{s['steps']} steps, max step {max(x['max_step_ms'] for x in snaps):.1f} ms")
+        worst = max(worst, pct(w, 0.99) - pct(b, 0.99))
+    if worst * 1000 > args.budget_ms:
+        print(f"\nwriter p99 +{worst * 1000:.1f} ms over budget {args.budget_ms} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Пропускная способность приёма апдейтов: polling против webhook, на фейковом Bot API.
+Хендлер только считает апдейты — меряем транспорт, а не логику бота.
+
+    python benchmarks/bench_transport.py [-n 5000] [--senders 8] [--rtt-ms 0]
+
+--rtt-ms добавляет задержку на каждый вызов Bot API (в т.ч. getUpdates) — так выглядит
+polling с реальным RTT до серверов Telegram. Отправители webhook живут в том же процессе,
+что и бот, поэтому цифра webhook — нижняя оценка.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import ROOT  # noqa: F401
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI, message_update
+
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]  # как в main.py
+
+SECRET = "bench-secret"
+WEBHOOK_PORT = 18443
+
+def build(api: FakeBotAPI, done: asyncio.Event, n: int) -> Application:
+    app = Application.builder().token(FAKE_TOKEN).base_url(api.base_url).build()
+    seen = 0
+
+    async def count(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        nonlocal seen
+        seen += 1
+        if seen >= n:
+            done.set()
+
+    app.add_handler(TypeHandler(Update, count))
+    return app
+
+async def bench_polling(n: int, rtt: float) -> float:
+    api = FakeBotAPI(api_latency=rtt).start()
+    done = asyncio.Event()
+    app = build(api, done, n)
+    for i in range(n):
+        api.push_update(message_update(i % 500 + 1, "hello"))
+
+    await app.initialize()
+    t0 = time.perf_counter()
+    await app.updater.start_polling(poll_interval=0, timeout=1, allowed_updates=ALLOWED_UPDATES)
+    await app.start()
+    await done.wait()
+    dt = time.perf_counter() - t0
+    await app.updater.stop()
+    await app.stop()
+    await app.shutdown()
+    api.stop()
+    return n / dt
+
+def _post_updates(updates) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", WEBHOOK_PORT)
+    headers = {"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": SECRET}
+    for u in updates:
+        conn.request("POST", "/telegram", body=json.dumps(u), headers=headers)
+        r = conn.getresponse()
+        r.read()
+        assert r.status == 200, r.status
+    conn.close()
+
+async def bench_webhook(n: int, senders: int, rtt: float) -> float:
+    api = FakeBotAPI(api_latency=rtt).start()
+    done = asyncio.Event()
+    app = build(api, done, n)
+    updates = [message_update(i % 500 + 1, "hello") for i in range(n)]
+    chunks = [updates[i::senders] for i in range(senders)]
+
+    await app.initialize()
+    await app.updater.start_webhook(
+        listen="127.0.0.1", port=WEBHOOK_PORT, url_path="telegram",
+        webhook_url="https://example.invalid/telegram", secret_token=SECRET,
+        allowed_updates=ALLOWED_UPDATES,
+    )
+    await app.start()
+
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(senders) as pool:
+        await asyncio.gather(*(loop.run_in_executor(pool, _post_updates, ch) for ch in chunks))
+    await done.wait()
+    dt = time.perf_counter() - t0
+
+    await app.updater.stop()
+    await app.stop()
+    await app.shutdown()
+    api.stop()
+    return n / dt
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("--senders", type=int, default=8, help="параллельных соединений Telegram -> webhook")
+    ap.add_argument("--rtt-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    polling = await bench_polling(args.n, args.rtt_ms / 1000)
+    webhook = await bench_webhook(args.n, args.senders, args.rtt_ms / 1000)
+    print(f"polling  {polling:>10,.0f} updates/s")
+    print(f"webhook  {webhook:>10,.0f} updates/s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# бенчмарки запускаются как скрипты: python benchmarks/bench_db.py
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+# общие с тестами генераторы данных (tests/fixtures_db.py)
+if str(ROOT / "tests") not in sys.path:
+    sys.path.append(str(ROOT / "tests"))
+
+def ops_per_sec(fn: Callable[[int], None], n: int, warmup: int = 100) -> float:
+    """
+    fn(i) вызывается n раз; возвращает операций в секунду.
+    """
+    for i in range(min(warmup, n)):
+        fn(i)
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    dt = time.perf_counter() - t0
+    return n / dt if dt > 0 else float("inf")
+
+def us_per_op(fn: Callable[[int], None], n: int, repeat: int = 5, warmup: int = 100) -> float:
+    """
+    Лучшее из repeat прогонов по n вызовов fn(i), µs на вызов. Минимум, а не среднее:
+    шум (GC, соседние процессы) только добавляет время.
+    """
+    for i in range(min(warmup, n)):
+        fn(i)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        best = min(best, time.perf_counter() - t0)
+    return best / n * 1e6
+
+def report(title: str, rows) -> None:
+    print(f"\n{title}")
+    for name, value in rows:
+        print(f"  {name:<32} {value:>12,.0f} ops/s")
+
+# ---------- JSON-результаты и сравнение с базой ----------
+class Results:
+    """
+    Машиночитаемые результаты прогона:
+        {"meta": {...}, "results": {"micro.user_hash": {"value": 0.41, "unit": "us/op", "better": "lower"}}}
+    Имена — "<группа>.<случай>", у каждого значения направление: lower (время) или higher (пропускная).
+    """
+    def __init__(self) -> None:
+        self.meta = {
+            "time_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "git": _git_rev(),
+        }
+        self.results: Dict[str, dict] = {}
+
+    def add(self, name: str, value: float, unit: str = "us/op", better: str = "lower") -> None:
+        self.results[name] = {"value": value, "unit": unit, "better": better}
+        print(f"  {name:<52} {value:>14,.2f} {unit}")
+
+    def merge(self, other: "Results") -> None:
+        self.results.update(other.results)
+
+    def save(self, path) -> None:
+        Path(path).write_text(json.dumps({"meta": self.meta, "results": self.results},
+                                         ensure_ascii=False, indent=1), encoding="utf-8")
+
+def load_results(path) -> Dict[str, dict]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))["results"]
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict],
+            threshold: float = 0.10) -> List[Tuple[str, float, float, float, bool]]:
+    """
+    (имя, база, сейчас, изменение в долях, регресс?) по общим случаям. Изменение со знаком
+    «+ = хуже» для обоих направлений; регресс — хуже больше чем на threshold.
+    """
+    out = []
+    for name in sorted(current.keys() & baseline.keys()):
+        old, new = baseline[name]["value"], current[name]["value"]
+        if not old:
+            continue
+        change = (new - old) / old
+        if current[name].get("better") == "higher":
+            change = -change
+        out.append((name, old, new, change, change > threshold))
+    return out
+
+def print_compare(rows, threshold: float) -> int:
+    # возвращает число регрессий
+    print(f"\nсравнение с базой (порог {threshold * 100:.0f}%, + = хуже):")
+    bad = 0
+    for name, old, new, change, regressed in rows:
+        bad += regressed
+        print(f"  {name:<52} {old:>12,.2f} -> {new:>12,.2f}  {change * 100:+7.1f}%{'  REGRESSION' if regressed else ''}")
+    print(f"регрессий: {bad}")
+    return bad
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
@@ -0,0 +1,229 @@
+"""
+Локальный фейковый Telegram Bot API для бенчмарков и нагрузочных прогонов.
+
+    api = FakeBotAPI().start()
+    app = Application.builder().token(FAKE_TOKEN).base_url(api.base_url).build()
+    api.push_update(message_update(user_id=1, text="/start"))
+
+Поддерживает getMe, getUpdates (long polling), sendMessage, editMessageText,
+answerCallbackQuery, set/deleteWebhook; остальные методы отвечают true.
+api.flood(n, retry_after) — следующие n вызовов отправки получат 429 (RetryAfter).
+
+Без сети (замеры, где HTTP-сервер в том же процессе сам стал бы узким местом):
+    app = Application.builder().token(FAKE_TOKEN).request(OfflineRequest(FakeBotAPI())).build()
+Апдейты тогда кладутся прямо в app.update_queue — getUpdates не поддерживается.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from telegram.request import BaseRequest
+
+FAKE_TOKEN = "123456:FAKE"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+def _user(user_id: int) -> Dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+def _chat(user_id: int) -> Dict:
+    return {"id": user_id, "type": "private"}
+
+def message_update(user_id: int, text: str) -> Dict:
+    msg = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": _chat(user_id),
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_update_ids), "message": msg}
+
+def callback_update(user_id: int, data: str, message_id: Optional[int] = None) -> Dict:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_message_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id or next(_message_ids),
+                "date": int(time.time()),
+                "chat": _chat(user_id),
+                "from": BOT_USER,
+                "text": "…",
+            },
+        },
+    }
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, api_latency: float = 0.0,
+                 keep_sent: bool = True) -> None:
+        self.api_latency = api_latency  # имитация RTT до Telegram на каждый вызов
+        self.calls: Counter = Counter()
+        self.sent: List[Dict] = []      # sendMessage / editMessageText (если keep_sent)
+        self.keep_sent = keep_sent      # на многочасовых прогонах список растёт без конца
+        # on_message(chat_id, text) — из потока сервера, на каждое sendMessage / editMessageText
+        self.on_message: Optional[Callable[[int, str], None]] = None
+        self.flooded = 0                # сколько раз ответили 429
+        self._flood_left = 0
+        self._flood_retry_after = 1
+        self._updates: List[Dict] = []
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "FakeBotAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:  # для OfflineRequest сервер не запускается
+            self._server.shutdown()
+        self._server.server_close()
+
+    def push_update(self, update: Dict) -> None:
+        with self._cond:
+            self._updates.append(update)
+            self._cond.notify_all()
+
+    def flood(self, n: int, retry_after: int = 1) -> None:
+        with self._cond:
+            self._flood_left = n
+            self._flood_retry_after = retry_after
+
+    def _take_flood(self) -> bool:
+        with self._cond:
+            if self._flood_left <= 0:
+                return False
+            self._flood_left -= 1
+            self.flooded += 1
+            return True
+
+    def pending_updates(self) -> int:
+        with self._cond:
+            return len(self._updates)
+
+    # ---------- методы API ----------
+    def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return self._updates[:limit]
+
+    def _message(self, params: Dict) -> Dict:
+        chat_id = int(params.get("chat_id") or 0)
+        msg = {
+            "message_id": int(params.get("message_id") or next(_message_ids)),
+            "date": int(time.time()),
+            "chat": _chat(chat_id),
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if self.keep_sent:
+            self.sent.append({"chat_id": chat_id, "text": msg["text"], "ts": time.monotonic()})
+        if self.on_message is not None:
+            self.on_message(chat_id, msg["text"])
+        return msg
+
+    def call(self, method: str, params: Dict):
+        self.calls[method] += 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+        if method == "getUpdates":
+            return self._get_updates(params)
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params)
+        return True
+
+    def respond(self, method: str, params: Dict) -> Tuple[int, bytes]:
+        if method in ("sendMessage", "editMessageText") and self._take_flood():
+            return 429, json.dumps({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self._flood_retry_after}",
+                "parameters": {"retry_after": self._flood_retry_after},
+            }).encode("utf-8")
+        return 200, json.dumps({"ok": True, "result": self.call(method, params)}).encode("utf-8")
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                params = _parse_params(self.headers.get("Content-Type", ""), body)
+                status, out = api.respond(method, params)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            do_GET = do_POST
+
+        return Handler
+
+def _parse_params(content_type: str, body: bytes) -> Dict:
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    params = {}
+    for k, v in parse_qs(body.decode("utf-8")).items():
+        # PTB кладёт вложенные объекты (reply_markup и т.п.) в поля формы как JSON
+        params[k] = json.loads(v[0]) if v[0][:1] in ("{", "[") else v[0]
+    return params
+
+class OfflineRequest(BaseRequest):
+    """
+    Запросы бота уходят прямо в FakeBotAPI.respond — тот же ответ, что и по HTTP,
+    но без сокетов и потоков сервера.
+    """
+    def __init__(self, api: FakeBotAPI) -> None:
+        self.api = api
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data=None, **timeouts) -> Tuple[int, bytes]:
+        params = request_data.parameters if request_data is not None else {}
+        return self.api.respond(url.rsplit("/", 1)[-1], params)
@@ -0,0 +1,444 @@
+"""
+Длительный прогон (soak) настоящего бота под нагрузкой: как ведут себя память
+(context.user_data), WAL и задержки через часы работы.
+
+    python benchmarks/soak.py [--users 2000] [--duration 3600] [--ramp 300] [--sample-every 15]
+                              [--think 0.5 3] [--gap 900] [--workdir DIR] [--out soak.json]
+
+Бот — отдельный процесс `python main.py` (polling) в рабочем каталоге (своя data.db),
+Bot API — локальный FakeBotAPI по HTTP (getUpdates / sendMessage / editMessageText /
+answerCallbackQuery), адрес передаётся через TELEGRAM_API_URL. Так RSS процесса бота не
+смешивается с памятью нагрузчика.
+
+Виртуальные пользователи появляются равномерно за --ramp секунд и ходят сессиями по
+реалистичным путям через все 27 состояний диалога: онбординг (в т.ч. город текстом),
+/analyze (свой период, неверный ввод, без прошлого периода, контекст, отметка действия),
+/savings (с тарифом и без), /feedback, /demo, /help, /saved, privacy (иногда со сбросом —
+тогда снова онбординг). Каждый шаг ждёт ответа бота (нужное число сообщений в чат),
+между шагами — «раздумье» --think, между сессиями — экспоненциальная пауза со средним --gap.
+Задержка шага — от появления апдейта в getUpdates до последнего ответа, т.е. вместе с polling.
+Ответы идут через OutboundRateLimiter с лимитами Telegram (30 сообщений/с на бота) — это
+потолок: 2000 пользователей с паузой 15 мин дают ~25 шагов/с; при большей нагрузке задержки
+растут за счёт очереди лимитера, а не бота (видно по p50 ≈ p99 и steps/s ≈ 30).
+
+Каждые --sample-every секунд снимаются: RSS бота (/proc, только Linux), размеры data.db и
+-wal, p50/p95/p99 задержек за окно, таймауты, а с /metrics бота — число пользователей и
+ключей в user_data, апдейты в работе, очередь БД. В конце — сводка: рост RSS (МБ/ч по
+наклону после разгона), максимум WAL, дрейф p95 (первая четверть против последней),
+какие состояния диалога так и не встретились. --out — всё это в JSON.
+"""
+import argparse
+import ast
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from common import ROOT, Results  # noqa: F401
+
+from fake_bot_api import FAKE_TOKEN, FakeBotAPI, callback_update, message_update
+
+# шаг: (вид, значение, сколько сообщений бот пришлёт в ответ)
+Step = Tuple[str, str, int]
+
+CITIES = ("almaty", "astana", "shymkent", "karaganda")
+VALUES = {"kwh": "320", "money": "15000", "both": "900 45000"}
+PREV_VALUES = {"kwh": "280", "money": "12500", "both": "720 38000"}
+
+# ---------- пути пользователей ----------
+class VirtualUser:
+    def __init__(self, user_id: int, rnd: random.Random) -> None:
+        self.user_id = user_id
+        self.rnd = rnd
+        self.onboarded = False
+        self.knows_tariff = False
+        self.idle = False  # диалог в S_IDLE: кнопки меню сработают
+
+    def _yes(self, p: float) -> str:
+        return "yes" if self.rnd.random() < p else "no"
+
+    def onboarding(self) -> List[Step]:
+        r = self.rnd
+        steps: List[Step] = [("msg", "/start", 2)]
+        if r.random() < 0.15:
+            steps += [("cb", "onb:city:other", 1), ("msg", r.choice(("Талдыкорган", "Актобе", "Павлодар")), 1)]
+        else:
+            steps.append(("cb", f"onb:city:{r.choice(CITIES)}", 1))
+        tariff = self._yes(0.5)
+        steps += [
+            ("cb", f"onb:home:{r.choice(('flat', 'house', 'unknown'))}", 1),
+            ("cb", f"onb:heat:{r.choice(('central', 'gas', 'electric', 'unknown'))}", 1),
+            ("cb", f"onb:people:{r.choice(('1', '2', '3-4', '5+'))}", 1),
+            ("cb", f"onb:tariff:{tariff}", 1),
+            ("cb", f"onb:remind:{self._yes(0.6)}", 1),
+        ]
+        self.onboarded, self.knows_tariff, self.idle = True, tariff == "yes", True
+        return steps
+
+    def _period(self, custom: str) -> List[Step]:
+        if self.rnd.random() < 0.2:
+            return [("cb", "period:custom", 1), ("msg", custom, 1)]
+        return [("cb", self.rnd.choice(("period:last30", "period:prev30")), 1)]
+
+    def _values(self, mode: str, table: Dict[str, str]) -> List[Step]:
+        steps: List[Step] = [("cb", f"valmode:{mode}", 1)]
+        if self.rnd.random() < 0.1:
+            steps.append(("msg", "много", 1))  # неверный ввод: бот переспрашивает
+        steps.append(("msg", table[mode], 1))
+        return steps
+
+    def analyze(self) -> List[Step]:
+        r = self.rnd
+        steps: List[Step] = [("cb", "menu:analyze", 1) if self.idle and r.random() < 0.3 else ("msg", "/analyze", 1)]
+        steps += self._period("с 01.01.2026 по 31.01.2026")
+        steps += self._values(r.choice(("kwh", "money", "both")), VALUES)
+        if r.random() < 0.6:
+            steps.append(("cb", "prev:yes", 1))
+            steps += self._period("с 01.12.2025 по 31.12.2025")
+            steps += self._values(r.choice(("kwh", "money", "both")), PREV_VALUES)
+        else:
+            steps.append(("cb", "prev:no", 1))
+        steps += [("cb", f"ctx:cold:{self._yes(0.5)}", 1), ("cb", f"ctx:boiler:{self._yes(0.5)}", 1),
+                  ("cb", f"ctx:new:{self._yes(0.3)}", 1)]  # последний — результаты
+        x = r.random()
+        if x < 0.5:
+            steps.append(("cb", f"actdone:{r.randint(1, 3)}", 1))
+            self.idle = True
+        elif x < 0.8:
+            steps.append(("cb", "nav:menu", 1))
+            self.idle = True
+        else:
+            self.idle = False  # ушёл с экрана результатов (S_SHOW_RESULTS)
+        return steps
+
+    def savings(self) -> List[Step]:
+        r = self.rnd
+        steps: List[Step] = [("cb", "menu:savings", 1) if self.idle and r.random() < 0.3 else ("msg", "/savings", 1)]
+        steps += self._period("с 01.02.2026 по 28.02.2026")
+        mode = r.choice(("kwh", "both", "both", "money"))
+        steps += self._values(mode, PREV_VALUES)
+        if self.knows_tariff and mode != "money":
+            steps.append(("msg", r.choice(("25", "22,5", "0")), 1))
+        self.idle = True
+        return steps
+
+    def feedback(self) -> List[Step]:
+        r = self.rnd
+        steps: List[Step] = [("cb", "menu:feedback", 1) if self.idle and r.random() < 0.3 else ("msg", "/feedback", 1)]
+        steps += [("cb", f"fb:{r.randint(1, 5)}", 1), ("msg", r.choice(("-", "Понятно, спасибо", "Хочу графики")), 1)]
+        self.idle = True
+        return steps
+
+    def misc(self) -> List[Step]:
+        r = self.rnd
+        x = r.random()
+        if x < 0.25:
+            self.idle = False  # /demo завершает диалог
+            return [("msg", "/demo", 1)]
+        if x < 0.5:
+            return [("msg", "/help", 1)]
+        if x < 0.75:
+            return [("msg", "/saved", 1)]
+        steps: List[Step] = [("cb", "menu:privacy", 1) if self.idle else ("msg", "/privacy", 1)]
+        if r.random() < 0.05:
+            steps.append(("cb", "privacy:reset", 1))
+            self.onboarded = False
+        return steps
+
+    def next_session(self) -> List[Step]:
+        if not self.onboarded:
+            return self.onboarding()
+        x = self.rnd.random()
+        if x < 0.5:
+            return self.analyze()
+        if x < 0.7:
+            return self.savings()
+        if x < 0.8:
+            return self.feedback()
+        return self.misc()
+
+# ---------- нагрузчик ----------
+class Soak:
+    def __init__(self, api: FakeBotAPI, args) -> None:
+        self.api = api
+        self.args = args
+        self.loop = asyncio.get_running_loop()
+        self.waiters: Dict[int, list] = {}  # chat_id -> [осталось ответов, future]
+        self.window: List[float] = []
+        self.all = array("d")
+        self.steps = 0
+        self.timeouts = 0
+        self.stray = 0  # ответы, которых никто не ждал (лишние сообщения или опоздавшие после таймаута)
+        self.active = 0
+        api.on_message = lambda chat_id, text: self.loop.call_soon_threadsafe(self._reply, chat_id)
+
+    def _reply(self, chat_id: int) -> None:
+        w = self.waiters.get(chat_id)
+        if w is None:
+            self.stray += 1
+            return
+        w[0] -= 1
+        if w[0] <= 0:
+            del self.waiters[chat_id]
+            if not w[1].done():
+                w[1].set_result(time.perf_counter())
+
+    async def step(self, uid: int, step: Step) -> None:
+        kind, value, replies = step
+        fut = self.loop.create_future()
+        self.waiters[uid] = [replies, fut]
+        t0 = time.perf_counter()
+        self.api.push_update(message_update(uid, value) if kind == "msg" else callback_update(uid, value))
+        try:
+            t1 = await asyncio.wait_for(fut, self.args.step_timeout)
+        except asyncio.TimeoutError:
+            self.waiters.pop(uid, None)
+            self.timeouts += 1
+            return
+        self.steps += 1
+        self.window.append(t1 - t0)
+        self.all.append(t1 - t0)
+
+    async def user(self, vu: VirtualUser, start_at: float, stop_at: float) -> None:
+        r = vu.rnd
+        think_lo, think_hi = self.args.think
+        await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+        while time.monotonic() < stop_at:
+            self.active += 1
+            try:
+                for st in vu.next_session():
+                    if time.monotonic() >= stop_at:
+                        return
+                    await self.step(vu.user_id, st)
+                    await asyncio.sleep(r.uniform(think_lo, think_hi))
+            finally:
+                self.active -= 1
+            await asyncio.sleep(r.expovariate(1 / self.args.gap) if self.args.gap > 0 else 0)
+
+    def take_window(self) -> List[float]:
+        w, self.window = self.window, []
+        return w
+
+# ---------- замеры ----------
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def file_mb(path: Path) -> float:
+    try:
+        return path.stat().st_size / 2**20
+    except OSError:
+        return 0.0
+
+_SAMPLE_RE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+def scrape(port: int) -> Tuple[Dict[str, float], set]:
+    """
+    /metrics бота: сумма по сериям для каждого имени и состояния диалога, в которых
+    отработал хоть один хендлер.
+    """
+    values: Dict[str, float] = {}
+    states = set()
+    try:
+        text = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+    except OSError:
+        return values, states
+    for line in text.splitlines():
+        m = _SAMPLE_RE.match(line)
+        if not m:
+            continue
+        name, labels, value = m.groups()
+        values[name] = values.get(name, 0.0) + float(value)
+        if name == "bot_handler_seconds_count" and labels and float(value) > 0:
+            st = re.search(r'state="([^"]*)"', labels)
+            if st:
+                states.add(st.group(1))
+    return values, states
+
+def pct(xs: List[float], q: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+def slope_per_hour(points: List[Tuple[float, float]]) -> float:
+    # наклон МНК, единиц в час
+    if len(points) < 2:
+        return 0.0
+    mx = statistics.fmean(t for t, _ in points)
+    my = statistics.fmean(v for _, v in points)
+    den = sum((t - mx) ** 2 for t, _ in points)
+    return sum((t - mx) * (v - my) for t, v in points) / den * 3600 if den else 0.0
+
+def fsm_states() -> List[str]:
+    # имена S_* из кортежа «(...) = range(27)» в main.py — без импорта main (он откроет data.db)
+    tree = ast.parse((ROOT / "main.py").read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Tuple) \
+                and isinstance(node.value, ast.Call) and getattr(node.value.func, "id", "") == "range":
+            return [t.id for t in node.targets[0].elts]
+    return []
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ---------- прогон ----------
+def start_bot(workdir: Path, api: FakeBotAPI, metrics_port: int) -> subprocess.Popen:
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN=FAKE_TOKEN, TELEGRAM_API_URL=api.base_url,
+               METRICS_PORT=str(metrics_port), PYTHONUNBUFFERED="1")
+    env.pop("WEBHOOK_URL", None)
+    log = open(workdir / "bot.log", "ab")
+    return subprocess.Popen([sys.executable, str(ROOT / "main.py")], cwd=workdir, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+def stop_bot(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    proc.send_signal(signal.SIGINT)  # run_polling: штатная остановка, persistence дописывается
+    try:
+        proc.wait(60)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+async def run(args, workdir: Path) -> Tuple[dict, List[dict]]:
+    api = FakeBotAPI(keep_sent=False).start()
+    metrics_port = free_port()
+    proc = start_bot(workdir, api, metrics_port)
+    db_path, wal_path = workdir / "data.db", workdir / "data.db-wal"
+    samples: List[dict] = []
+    states_seen: set = set()
+    try:
+        deadline = time.monotonic() + 60
+        while api.calls["getUpdates"] == 0:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"бот не запустился, см. {workdir / 'bot.log'}")
+            await asyncio.sleep(0.1)
+
+        soak = Soak(api, args)
+        rnd = random.Random(args.seed)
+        t_start = time.monotonic()
+        stop_at = t_start + args.duration
+        tasks = [
+            asyncio.create_task(soak.user(VirtualUser(1_000_000 + i, random.Random(rnd.random())),
+                                          t_start + args.ramp * i / max(args.users, 1), stop_at))
+            for i in range(args.users)
+        ]
+        print(f"{'t, s':>7} {'users':>6} {'steps/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'tmo':>5} "
+              f"{'rss MB':>8} {'db MB':>8} {'wal MB':>8} {'ud users':>9} {'ud keys':>8} {'db q':>5}")
+        last = t_start
+        while time.monotonic() < stop_at and proc.poll() is None:
+            await asyncio.sleep(min(args.sample_every, max(0.0, stop_at - time.monotonic())))
+            now = time.monotonic()
+            w = soak.take_window()
+            m, states = await asyncio.to_thread(scrape, metrics_port)
+            states_seen |= states
+            s = {
+                "t": round(now - t_start, 1), "active_users": soak.active,
+                "steps_per_sec": len(w) / (now - last) if now > last else 0.0,
+                "p50_ms": pct(w, 0.5) * 1000, "p95_ms": pct(w, 0.95) * 1000, "p99_ms": pct(w, 0.99) * 1000,
+                "timeouts": soak.timeouts, "rss_mb": rss_mb(proc.pid),
+                "db_mb": file_mb(db_path), "wal_mb": file_mb(wal_path),
+                "user_data_users": m.get("bot_user_data_users"), "user_data_keys": m.get("bot_user_data_keys"),
+                "updates_in_progress": m.get("bot_updates_in_progress"), "db_inflight": m.get("bot_db_inflight"),
+            }
+            last = now
+            samples.append(s)
+            print(f"{s['t']:>7.0f} {s['active_users']:>6} {s['steps_per_sec']:>8.1f} {s['p50_ms']:>8.1f} "
+                  f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['timeouts']:>5} {s['rss_mb'] or 0:>8.1f} "
+                  f"{s['db_mb']:>8.1f} {s['wal_mb']:>8.1f} {s['user_data_users'] or 0:>9.0f} "
+                  f"{s['user_data_keys'] or 0:>8.0f} {s['db_inflight'] or 0:>5.0f}")
+        if proc.poll() is not None:
+            print(f"бот завершился с кодом {proc.returncode}, см. {workdir / 'bot.log'}", file=sys.stderr)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await asyncio.to_thread(stop_bot, proc)
+        api.stop()
+
+    return summarize(args, samples, soak, states_seen, db_path, wal_path), samples
+
+def summarize(args, samples: List[dict], soak: Soak, states_seen: set, db_path: Path, wal_path: Path) -> dict:
+    steady = [s for s in samples if s["t"] >= args.ramp] or samples
+    quarter = max(1, len(steady) // 4)
+    first = [s["p95_ms"] for s in steady[:quarter] if s["steps_per_sec"]]
+    last = [s["p95_ms"] for s in steady[-quarter:] if s["steps_per_sec"]]
+    rss = [(s["t"], s["rss_mb"]) for s in steady if s["rss_mb"] is not None]
+    states = fsm_states()
+    return {
+        "steps": soak.steps,
+        "timeouts": soak.timeouts,
+        "stray_replies": soak.stray,
+        "latency_ms": {q: pct(list(soak.all), v) * 1000 for q, v in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "p95_first_quarter_ms": statistics.median(first) if first else None,
+        "p95_last_quarter_ms": statistics.median(last) if last else None,
+        "rss_mb_start": rss[0][1] if rss else None,
+        "rss_mb_max": max(v for _, v in rss) if rss else None,
+        "rss_growth_mb_per_hour": slope_per_hour(rss),
+        "user_data_keys_growth_per_hour": slope_per_hour(
+            [(s["t"], s["user_data_keys"]) for s in steady if s["user_data_keys"] is not None]),
+        "db_mb_end": file_mb(db_path),
+        "wal_mb_max": max((s["wal_mb"] for s in samples), default=0.0),
+        "wal_mb_after_stop": file_mb(wal_path),
+        "fsm_states_seen": len(states_seen & set(states)),
+        "fsm_states_total": len(states),
+        "fsm_states_missing": [s for s in states if s not in states_seen],
+    }
+
+def print_summary(s: dict) -> None:
+    lat = s["latency_ms"]
+    print(f"\nшагов {s['steps']:,}, таймаутов {s['timeouts']}, лишних ответов {s['stray_replies']}")
+    print(f"задержка шага: p50 {lat['p50']:.1f} / p95 {lat['p95']:.1f} / p99 {lat['p99']:.1f} мс; "
+          f"p95 в начале {s['p95_first_quarter_ms'] or 0:.1f} мс -> в конце {s['p95_last_quarter_ms'] or 0:.1f} мс")
+    print(f"RSS бота: {s['rss_mb_start'] or 0:.1f} -> max {s['rss_mb_max'] or 0:.1f} МБ, "
+          f"рост {s['rss_growth_mb_per_hour']:+.1f} МБ/ч; ключей user_data {s['user_data_keys_growth_per_hour']:+,.0f}/ч")
+    print(f"data.db {s['db_mb_end']:.1f} МБ, WAL max {s['wal_mb_max']:.1f} МБ (после остановки {s['wal_mb_after_stop']:.1f})")
+    print(f"состояния диалога: {s['fsm_states_seen']}/{s['fsm_states_total']}"
+          + (f", не встретились: {', '.join(s['fsm_states_missing'])}" if s["fsm_states_missing"] else ""))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--duration", type=float, default=3600, help="секунд нагрузки")
+    ap.add_argument("--ramp", type=float, default=300, help="за сколько секунд подключаются все пользователи")
+    ap.add_argument("--sample-every", type=float, default=15)
+    ap.add_argument("--think", type=float, nargs=2, default=[0.5, 3.0], metavar=("MIN", "MAX"))
+    ap.add_argument("--gap", type=float, default=900, help="средняя пауза между сессиями, с")
+    ap.add_argument("--step-timeout", type=float, default=30)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workdir", help="каталог бота (data.db, bot.log); по умолчанию временный")
+    ap.add_argument("--out", help="отчёт в JSON")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        summary, samples = asyncio.run(run(args, workdir))
+        print_summary(summary)
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "meta": Results().meta, "config": vars(args), "summary": summary, "samples": samples,
+        }, ensure_ascii=False, indent=1), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Весь набор бенчмарков одним запуском с JSON-результатами и сравнением с базой:
+
+    python benchmarks/suite.py --out bench.json                       # полный прогон (10k, 1M, 10M)
+    python benchmarks/suite.py --quick --out new.json --baseline bench.json [--threshold 0.10]
+    python benchmarks/suite.py --compare new.json bench.json          # только сравнить два файла
+
+Группы: micro (bench_micro), db (bench_db_methods), flow (bench_flow; в отдельном
+процессе — он импортирует main). --only micro db — часть групп. Код выхода 1, если
+какой-то случай хуже базы больше чем на --threshold (по умолчанию 10%).
+--quick — только таблицы 10k и 50 пользователей в flow, для проверки перед коммитом;
+сравнивать его с полным прогоном можно — совпадут только общие случаи.
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from common import ROOT, Results, compare, load_results, print_compare  # noqa: F401
+
+import bench_db_methods
+import bench_micro
+
+GROUPS = ("micro", "db", "flow")
+
+def run_flow(results: Results, users: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "flow.json"
+        subprocess.run([sys.executable, str(Path(__file__).with_name("bench_flow.py")),
+                        "--users", str(users), "--json", str(out)], check=True)
+        results.results.update(load_results(out))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", help="куда сохранить результаты (JSON)")
+    ap.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    ap.add_argument("--quick", action="store_true")
+    ap.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS))
+    ap.add_argument("--keep", help="каталог для файлов БД bench_db_methods (переиспользуются)")
+    ap.add_argument("--compare", nargs=2, metavar=("NEW", "BASE"), help="сравнить два файла без прогона")
+    args = ap.parse_args()
+
+    if args.compare:
+        new, base = (load_results(p) for p in args.compare)
+        sys.exit(1 if print_compare(compare(new, base, args.threshold), args.threshold) else 0)
+
+    results = Results()
+    if "micro" in args.only:
+        bench_micro.run(results, 5_000 if args.quick else 20_000)
+    if "db" in args.only:
+        sizes = (10_000,) if args.quick else (10_000, 1_000_000, 10_000_000)
+        bench_db_methods.run(results, sizes, args.keep)
+    if "flow" in args.only:
+        run_flow(results, 50 if args.quick else 200)
+    if args.out:
+        results.save(args.out)
+        print(f"\nрезультаты: {args.out}")
+    if args.baseline:
+        base = load_results(args.baseline)
+        rows = compare(results.results, base, args.threshold)
+        if print_compare(rows, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Импорт истории счетов из файла: CSV (или XLSX, если установлен openpyxl) со строками
+
+    начало;конец;кВт*ч;₸
+    01.01.2025;31.01.2025;310;15 500
+    01.02.2025;28.02.2025;295;14,7к
+
+Даты и числа разбираются так же, как при ручном вводе (utils.parse_custom_period,
+utils.parse_number_token), проверки — clamp_reasonable_kwh / clamp_reasonable_money.
+Одно из значений (кВт*ч или ₸) может быть пустым. Первая строка пропускается, только если
+похожа на заголовок (названия колонок или ни одной цифры) — иначе это ошибка в данных.
+Файл читается построчно; в БД всё пишется одной транзакцией (DB.import_bills).
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from utils import clamp_reasonable_kwh, clamp_reasonable_money, parse_custom_period, parse_number_token
+
+MAX_ROWS = 10_000
+MAX_ERRORS_SHOWN = 5
+# слова из названий колонок (в нижнем регистре, ищутся подстрокой)
+HEADER_WORDS = ("начало", "конец", "период", "дата", "квт", "сумма", "тенге", "₸",
+                "start", "end", "date", "kwh", "money", "amount", "sum")
+
+@dataclass
+class ImportResult:
+    # (start_ts, end_ts, days, kwh, money) — по возрастанию начала периода
+    bills: List[Tuple[str, str, int, Optional[float], Optional[float]]] = field(default_factory=list)
+    errors: List[Tuple[int, str]] = field(default_factory=list)  # (номер строки, причина)
+    rows: int = 0
+
+def _date_cell(v) -> str:
+    if isinstance(v, (datetime, date)):
+        return v.strftime("%d.%m.%Y")
+    return str(v or "").strip()
+
+def _number_cell(v) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    # "15 500 ₸", "310 кВт*ч" -> как ручной ввод
+    return parse_number_token(str(v).replace("₸", "").replace("кВт*ч", "").replace(" ", ""))
+
+def parse_row(cells: Sequence) -> Tuple[Optional[tuple], Optional[str]]:
+    if len(cells) < 3:
+        return None, "нужно минимум 3 колонки: начало, конец, кВт*ч (и/или ₸)"
+    p = parse_custom_period(f"с {_date_cell(cells[0])} по {_date_cell(cells[1])}")
+    if p is None:
+        return None, "даты в формате ДД.ММ.ГГГГ, конец не раньше начала"
+
+    kwh_raw = cells[2]
+    money_raw = cells[3] if len(cells) > 3 else None
+    kwh, money = _number_cell(kwh_raw), _number_cell(money_raw)
+    if (kwh is None and kwh_raw not in (None, "")) or (money is None and money_raw not in (None, "")):
+        return None, "не удалось разобрать число"
+    if kwh is None and money is None:
+        return None, "нужны кВт*ч или сумма"
+    for value, clamp in ((kwh, clamp_reasonable_kwh), (money, clamp_reasonable_money)):
+        if value is not None:
+            _, err = clamp(value)
+            if err:
+                return None, err
+    return (p.start.isoformat(), p.end.isoformat(), p.days, kwh, money), None
+
+def looks_like_header(cells: Sequence) -> bool:
+    texts = [str(c).strip().lower() for c in cells if c not in (None, "")]
+    if any(isinstance(c, (int, float, date, datetime)) for c in cells):
+        return False
+    words = [t for t in texts if not any(ch.isdigit() for ch in t)]  # "15 500 ₸" — не название
+    return len(words) == len(texts) or any(w in t for t in words for w in HEADER_WORDS)
+
+def parse_rows(rows: Iterable[Sequence]) -> ImportResult:
+    res = ImportResult()
+    for lineno, cells in enumerate(rows, 1):
+        if not any(str(c or "").strip() for c in cells):
+            continue
+        res.rows += 1
+        if res.rows > MAX_ROWS:
+            res.errors.append((lineno, f"больше {MAX_ROWS} строк — остальное пропущено"))
+            break
+        bill, err = parse_row(cells)
+        if bill is not None:
+            res.bills.append(bill)
+        elif res.rows == 1 and looks_like_header(cells):
+            res.rows = 0
+        else:
+            res.errors.append((lineno, err))
+    res.bills.sort(key=lambda b: b[0])
+    return res
+
+class _Semicolon(csv.excel):
+    delimiter = ";"
+
+def iter_csv(data: bytes) -> Iterator[List[str]]:
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace", newline="")
+    head = text.read(4096)
+    text.seek(0)
+    try:
+        # «;» чаще всего (Excel с русской локалью), «,» — если десятичные через точку
+        dialect = csv.Sniffer().sniff(head, delimiters=";,\t")
+    except csv.Error:
+        dialect = _Semicolon
+    return csv.reader(text, dialect)
+
+def iter_xlsx(data: bytes) -> Iterator[tuple]:
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("для XLSX на сервере нужен openpyxl — пришлите CSV")
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def parse_file(filename: str, data: bytes) -> ImportResult:
+    name = (filename or "").lower()
+    rows = iter_xlsx(data) if name.endswith(".xlsx") else iter_csv(data)
+    return parse_rows(rows)
+
+def summary_text(res: ImportResult, inserted: int, baseline: bool) -> str:
+    lines = [f"📥 Импорт: строк {res.rows}, добавлено периодов {inserted}"]
+    skipped_dupes = len(res.bills) - inserted
+    if skipped_dupes:
+        lines.append(f"Уже были в истории: {skipped_dupes}")
+    if res.bills:
+        # end_ts — начало следующего дня (как в parse_custom_period)
+        last_day = datetime.fromisoformat(max(b[1] for b in res.bills)) - timedelta(days=1)
+        lines.append(f"Период: {datetime.fromisoformat(res.bills[0][0]):%d.%m.%Y} — {last_day:%d.%m.%Y}")
+        kwh = [b[3] for b in res.bills if b[3] is not None]
+        if kwh:
+            lines.append(f"Всего {sum(kwh):.0f} кВт*ч, в среднем {sum(kwh) / len(kwh):.0f} за период")
+    if res.errors:
+        lines.append(f"\nПропущено строк: {len(res.errors)}")
+        for lineno, err in res.errors[:MAX_ERRORS_SHOWN]:
+            lines.append(f"• строка {lineno}: {err}")
+    if baseline:
+        lines.append("\nПоследний период стал базовым для расчёта экономии.")
+    return "\n".join(lines)
@@ -0,0 +1,177 @@
+"""
+Рассылки операторов всем пользователям с chat_id.
+
+Задание живёт в БД (broadcasts + broadcast_recipients):
+1. снимок получателей — keyset по users пачками, обрыв продолжается с последнего user_id;
+2. отправка пачками в полосе BULK (OutboundRateLimiter держит 30 сообщ./с и пропускает
+   ответы пользователям вперёд); после каждой пачки статусы получателей, счётчики и курсор
+   пишутся одной транзакцией — после падения рассылка продолжается с курсора.
+   Повторно может уйти максимум одна пачка, отправленная, но не записанная;
+3. аренда (lease_owner/lease_until) не даёт боту и CLI вести одну рассылку одновременно;
+   чекпоинт владельца, чью аренду уже забрали, не пишется, и он останавливается.
+
+    python broadcast.py create "Текст"     # снимок получателей, статус running
+    python broadcast.py run ID             # отправить из CLI (нужен TELEGRAM_BOT_TOKEN)
+    python broadcast.py status [ID]
+    python broadcast.py pause ID | resume ID
+
+Бот подхватывает running-рассылки задачей JobQueue (в т.ч. созданные из CLI и после рестарта).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+from typing import List, Optional, Set, Tuple
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+from outbound import BULK
+
+log = logging.getLogger(__name__)
+
+class Broadcaster:
+    def __init__(self, db, batch_size: int = 50, lease_sec: int = 120, owner: Optional[str] = None) -> None:
+        self.db = db                  # AsyncDB
+        self.batch_size = batch_size  # ~2 с отправки при 30 сообщ./с
+        self.lease_sec = lease_sec
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.active: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def create(self, text: str, created_by: Optional[int] = None) -> Tuple[int, int]:
+        broadcast_id = await self.db.create_broadcast(text, created_by)
+        total = await self.db.snapshot_broadcast(broadcast_id)
+        return broadcast_id, total
+
+    async def run(self, bot, broadcast_id: int) -> Optional[dict]:
+        """
+        Ведёт рассылку до конца, паузы или ошибки. None — рассылку уже ведёт кто-то другой
+        (или она не в running). Возвращает итоговую строку broadcasts.
+        """
+        if broadcast_id in self.active:
+            return None
+        job = await self.db.claim_broadcast(broadcast_id, self.owner, self.lease_sec)
+        if job is None:
+            return None
+        self.active.add(broadcast_id)
+        try:
+            if job["status"] == "snapshot":
+                await self.db.snapshot_broadcast(broadcast_id)
+            cursor = job["cursor"]
+            while True:
+                rows = await self.db.broadcast_pending(broadcast_id, cursor, self.batch_size)
+                if not rows:
+                    await self.db.finish_broadcast(broadcast_id, self.owner)
+                    log.info("broadcast #%s done", broadcast_id)
+                    break
+                results, flooded = await self._send(bot, job["text"], rows)
+                # после RetryAfter (лимитер уже исчерпал повторы) курсор встаёт перед первым
+                # неотправленным — он остался pending и уйдёт в следующий заход
+                cursor = flooded - 1 if flooded is not None else rows[-1][0]
+                status = await self.db.checkpoint_broadcast(
+                    broadcast_id, self.owner, self.lease_sec, results, cursor
+                )
+                if status == "lost":
+                    # аренду забрал другой процесс (наша истекла): он продолжит с курсора
+                    log.warning("broadcast #%s: lease lost, stopping", broadcast_id)
+                    break
+                if flooded is not None or status != "running":
+                    break
+        finally:
+            self.active.discard(broadcast_id)
+            await self.db.release_broadcast(broadcast_id, self.owner)
+        return await self.db.get_broadcast(broadcast_id)
+
+    async def _send(self, bot, text: str, rows) -> Tuple[List[Tuple[str, Optional[str], int]], Optional[int]]:
+        """
+        Отправляет пачку разом. Возвращает статусы (status, error, user_id) и наименьший
+        user_id, упёршийся в RetryAfter (None, если таких нет).
+        """
+        outcomes = await asyncio.gather(*(
+            bot.send_message(chat_id, text, rate_limit_args=BULK) for _, chat_id in rows
+        ), return_exceptions=True)
+        results = []
+        flooded = None
+        for (user_id, _), res in zip(rows, outcomes):
+            if isinstance(res, RetryAfter):
+                flooded = user_id if flooded is None else min(flooded, user_id)
+            elif isinstance(res, Forbidden):
+                results.append(("blocked", str(res)[:200], user_id))
+            elif isinstance(res, TelegramError):
+                results.append(("failed", str(res)[:200], user_id))
+            elif isinstance(res, BaseException):
+                raise res
+            else:
+                results.append(("sent", None, user_id))
+        return results, flooded
+
+    def spawn(self, bot, broadcast_id: int) -> None:
+        # своя задача, а не application.create_task: Application.stop ждал бы конца рассылки
+        task = asyncio.create_task(self.run(bot, broadcast_id), name=f"broadcast-{broadcast_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("broadcast task failed", exc_info=task.exception())
+
+    async def resume_all(self, bot) -> List[int]:
+        # все running-рассылки, которые сейчас никто не ведёт (созданные из CLI, после рестарта)
+        started = []
+        for job in await self.db.list_broadcasts(active_only=True):
+            if job["id"] not in self.active:
+                self.spawn(bot, job["id"])
+                started.append(job["id"])
+        return started
+
+    async def stop(self) -> None:
+        # остановка бота: рассылки продолжатся с чекпоинта после рестарта
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+def format_status(job: dict) -> str:
+    done = job["sent"] + job["failed"]
+    pct = 100.0 * done / job["total"] if job["total"] else 0.0
+    return (f"#{job['id']} {job['status']}: {done}/{job['total']} ({pct:.0f}%), "
+            f"доставлено {job['sent']}, ошибок {job['failed']}")
+
+async def _cli(args) -> None:
+    from db import DB, AsyncDB
+    db = AsyncDB(DB(args.db, buffer_events=False))
+    try:
+        if args.cmd == "create":
+            broadcast_id, total = await Broadcaster(db).create(args.text)
+            print(f"broadcast #{broadcast_id}: {total} recipients")
+        elif args.cmd == "run":
+            from telegram.ext import ExtBot
+            from config import get_token
+            from outbound import OutboundRateLimiter
+            bot = ExtBot(get_token(), rate_limiter=OutboundRateLimiter())
+            async with bot:
+                job = await Broadcaster(db).run(bot, args.id)
+            print(format_status(job) if job else f"broadcast #{args.id} is not running or owned by another process")
+        elif args.cmd in ("pause", "resume"):
+            ok = await db.set_broadcast_status(args.id, "paused" if args.cmd == "pause" else "running")
+            print("ok" if ok else "not found or already finished")
+        else:
+            jobs = [await db.get_broadcast(args.id)] if args.id else await db.list_broadcasts()
+            for job in filter(None, jobs):
+                print(format_status(job))
+    finally:
+        await db.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Рассылки операторов")
+    ap.add_argument("--db", default="data.db")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("create").add_argument("text")
+    for name in ("run", "pause", "resume"):
+        sub.add_parser(name).add_argument("id", type=int)
+    sub.add_parser("status").add_argument("id", type=int, nargs="?")
+    asyncio.run(_cli(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
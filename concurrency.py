@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка апдейтов разных пользователей при строгом порядке внутри одного
+    пользователя: ConversationHandler видит апдейты каждого user_id по очереди.
+
+    max_concurrent_updates — сколько хендлеров реально выполняется одновременно.
+    max_pending — сколько апдейтов может ждать своей очереди (лимит Application).
+    Слот выполнения берётся только после блокировки пользователя, поэтому поток
+    нажатий одного пользователя не занимает слоты остальных.
+    """
+    def __init__(self, max_concurrent_updates: int = 64, max_pending: int = 4096) -> None:
+        super().__init__(max(max_pending, max_concurrent_updates))
+        self._workers = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._queued: Dict[int, int] = {}  # апдейтов в работе/ожидании по ключу
+
+    @staticmethod
+    def _key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        # до захвата блокировки нет ни одного await — порядок задач = порядок апдейтов
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._queued[key] = self._queued.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._workers:
+                    await coroutine
+        finally:
+            self._queued[key] -= 1
+            if not self._queued[key]:
+                del self._queued[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
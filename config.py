@@ -1,7 +1,58 @@
 import os
+from dataclasses import dataclass
+from typing import Optional
 
 APP_VERSION = "mvp-0.1.0"
 
+# Как часто бот дописывает дневные KPI-роллапы (kpi_daily)
+KPI_ROLLUP_INTERVAL_SEC = 300
+
+# Как часто изменённые user_data и состояния диалогов пишутся в БД
+PERSISTENCE_INTERVAL_SEC = 10
+
+# Сколько апдейтов (разных пользователей) обрабатывается параллельно
+MAX_CONCURRENT_UPDATES = 64
+
+# Во сколько (час UTC) ночью пересчитывается savings_results (backtest.py)
+SAVINGS_BACKTEST_HOUR_UTC = 3
+
+# Напоминания: как часто напоминать подписчикам и как часто проверять очередь
+REMINDER_INTERVAL_DAYS = 7
+REMINDER_TICK_SEC = 60
+
+# Как часто бот подхватывает незавершённые рассылки (созданные из CLI, прерванные рестартом)
+BROADCAST_RESUME_SEC = 60
+
+# Ретенция events: старше скольких дней события уходят в помесячные архивы (archive.py), куда и когда
+EVENTS_RETENTION_DAYS = 90
+EVENTS_ARCHIVE_DIR = "archive"
+EVENTS_ARCHIVE_HOUR_UTC = 4
+
+# Снимок data.db для KPI, выгрузок и отчётов (snapshot.py): куда и как часто его обновляет бот
+SNAPSHOT_PATH = "analytics.db"
+SNAPSHOT_INTERVAL_SEC = 900
+
+def get_operator_ids() -> frozenset:
+    # OPERATOR_IDS=123,456 — кому доступны /broadcast, /broadcast_status, /stats и /sqlprof
+    raw = os.getenv("OPERATOR_IDS", "")
+    return frozenset(int(x) for x in raw.replace(" ", "").split(",") if x)
+
+def get_metrics_port() -> Optional[int]:
+    # METRICS_PORT=9108 — отдавать /metrics (Prometheus) на 127.0.0.1; без переменной сервер не поднимается
+    raw = os.getenv("METRICS_PORT", "").strip()
+    return int(raw) if raw else None
+
+def get_bot_api_url() -> Optional[str]:
+    # TELEGRAM_API_URL=http://127.0.0.1:8081/bot — свой Bot API сервер (локальный или фейковый
+    # из benchmarks/soak.py); без переменной — api.telegram.org
+    raw = os.getenv("TELEGRAM_API_URL", "").strip()
+    return raw or None
+
+def get_sql_profile_ms() -> Optional[float]:
+    # SQL_PROFILE_MS=50 — включить профайлер SQL с логом запросов дольше 50 мс (см. sqlprofile.py)
+    raw = os.getenv("SQL_PROFILE_MS", "").strip()
+    return float(raw) if raw else None
+
 def get_token() -> str:
     token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
     if not token:
@@ -10,3 +61,36 @@ def get_token() -> str:
             "Задайте переменную окружения TELEGRAM_BOT_TOKEN."
         )
     return token
+
+@dataclass(frozen=True)
+class WebhookConfig:
+    url: str          # публичный https-адрес, куда Telegram шлёт апдейты (без пути)
+    secret: str       # X-Telegram-Bot-Api-Secret-Token
+    listen: str = "0.0.0.0"
+    port: int = 8443
+    path: str = "telegram"
+
+    @property
+    def webhook_url(self) -> str:
+        return f"{self.url.rstrip('/')}/{self.path}"
+
+def get_webhook_config() -> Optional[WebhookConfig]:
+    """
+    Webhook-режим включается переменной WEBHOOK_URL; без неё бот работает через polling.
+    """
+    url = os.getenv("WEBHOOK_URL", "").strip()
+    if not url:
+        return None
+    secret = os.getenv("WEBHOOK_SECRET", "").strip()
+    if not secret:
+        raise RuntimeError(
+            "Для webhook-режима нужен WEBHOOK_SECRET "
+            "(1–256 символов: A-Z, a-z, 0-9, _ и -)."
+        )
+    return WebhookConfig(
+        url=url,
+        secret=secret,
+        listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8443")),
+        path=os.getenv("WEBHOOK_PATH", "telegram").strip("/"),
+    )
@@ -1,9 +1,20 @@
+import asyncio
+import functools
+import logging
+import re
 import sqlite3
-from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlprofile import ProfiledConnection, QueryProfiler
 from utils import json_dumps, user_hash
 
+log = logging.getLogger(__name__)
+
 SCHEMA = """
 PRAGMA journal_mode=WAL;
 
@@ -55,28 +66,376 @@ CREATE TABLE IF NOT EXISTS events (
 );
 """
 
+_HEX12_RE = re.compile("[0-9a-f]{12}")
+
+def _pack_session(session_id: str):
+    # uuid4().hex[:12] из main._session_id помещается в INTEGER (48 бит); прочее — как есть
+    return int(session_id, 16) if _HEX12_RE.fullmatch(session_id) else session_id
+
+def _pack_session_sql(col: str) -> str:
+    # то же в SQL для миграции и триггера (unhex() в SQLite только с 3.41)
+    digits = " + ".join(
+        f"((instr('0123456789abcdef', substr({col}, {i}, 1)) - 1) << {4 * (12 - i)})" for i in range(1, 13)
+    )
+    return f"(CASE WHEN length({col}) = 12 AND {col} NOT GLOB '*[^0-9a-f]*' THEN {digits} ELSE {col} END)"
+
+# Версионированные миграции поверх SCHEMA: номер = PRAGMA user_version после применения.
+# Новые шаги только добавлять в конец, старые не менять.
+MIGRATIONS = [
+    # 1: индексы под get_latest_bill, reset_user_data и KPI-запросы
+    """
+    CREATE INDEX IF NOT EXISTS idx_bills_user_kind ON bills(user_id, kind, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_actions_done_user ON actions_done(user_id);
+    CREATE INDEX IF NOT EXISTS idx_events_name_ts ON events(event_name, ts_utc);
+    CREATE INDEX IF NOT EXISTS idx_events_user_ts ON events(user_hash, ts_utc);
+    """,
+    # 2: покрывающий индекс для KPI (COUNT(DISTINCT user_hash) по event_name без чтения таблицы)
+    """
+    CREATE INDEX IF NOT EXISTS idx_events_name_user ON events(event_name, user_hash, ts_utc);
+    """,
+    # 3: дневные KPI-роллапы, обновляются инкрементально (DB.refresh_rollups)
+    """
+    CREATE TABLE IF NOT EXISTS kpi_daily (
+      day TEXT NOT NULL,
+      event_name TEXT NOT NULL,
+      app_version TEXT NOT NULL,
+      events INTEGER NOT NULL DEFAULT 0,
+      users INTEGER NOT NULL DEFAULT 0,       -- distinct user_hash за день
+      new_users INTEGER NOT NULL DEFAULT 0,   -- впервые за всё время (сумма = distinct за всё время)
+      star_sum REAL NOT NULL DEFAULT 0,       -- payload.star (feedback 1–5)
+      star_n INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (day, event_name, app_version)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS kpi_daily_users (
+      day TEXT NOT NULL,
+      event_name TEXT NOT NULL,
+      app_version TEXT NOT NULL,
+      user_hash TEXT NOT NULL,
+      PRIMARY KEY (day, event_name, app_version, user_hash)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS kpi_first_seen (
+      event_name TEXT NOT NULL,
+      user_hash TEXT NOT NULL,
+      PRIMARY KEY (event_name, user_hash)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS kpi_state (
+      key TEXT PRIMARY KEY,
+      value INTEGER NOT NULL
+    );
+    """,
+    # 4: состояние диалогов (context.user_data и ConversationHandler) — см. persistence.py
+    """
+    CREATE TABLE IF NOT EXISTS conv_user_data (
+      user_id INTEGER PRIMARY KEY,
+      data_json TEXT NOT NULL,
+      updated_at TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS conv_states (
+      name TEXT NOT NULL,
+      key_json TEXT NOT NULL,
+      state INTEGER NOT NULL,
+      PRIMARY KEY (name, key_json)
+    ) WITHOUT ROWID;
+    """,
+    # 5: результаты расчёта экономии (current -> second), см. backtest.py
+    """
+    CREATE TABLE IF NOT EXISTS savings_results (
+      second_bill_id INTEGER PRIMARY KEY,
+      user_id INTEGER NOT NULL,
+      current_bill_id INTEGER NOT NULL,
+      before_per_day REAL NOT NULL,
+      after_per_day REAL NOT NULL,
+      delta_kwh REAL NOT NULL,
+      pct REAL NOT NULL,
+      delta_money REAL,
+      computed_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_savings_user ON savings_results(user_id, second_bill_id);
+    """,
+    # 6: очередь напоминаний — только подписанные, по времени следующего напоминания (см. reminders.py)
+    """
+    ALTER TABLE users ADD COLUMN next_due_at TEXT;
+    UPDATE users SET next_due_at = strftime('%Y-%m-%dT%H:%M:%S', 'now', '+7 days') WHERE reminders = 1;
+    CREATE INDEX IF NOT EXISTS idx_users_next_due ON users(next_due_at) WHERE next_due_at IS NOT NULL;
+    """,
+    # 7: рассылки операторов (см. broadcast.py): задание + снимок получателей со статусами
+    """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      text TEXT NOT NULL,
+      status TEXT NOT NULL,              -- snapshot / running / paused / done
+      total INTEGER NOT NULL DEFAULT 0,
+      sent INTEGER NOT NULL DEFAULT 0,
+      failed INTEGER NOT NULL DEFAULT 0,
+      cursor INTEGER NOT NULL DEFAULT 0, -- последний обработанный user_id (чекпоинт)
+      lease_owner TEXT,
+      lease_until TEXT,
+      created_by INTEGER,
+      created_at TEXT NOT NULL,
+      updated_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS broadcast_recipients (
+      broadcast_id INTEGER NOT NULL,
+      user_id INTEGER NOT NULL,
+      chat_id INTEGER NOT NULL,
+      status TEXT NOT NULL DEFAULT 'pending',  -- pending / sent / failed / blocked
+      error TEXT,
+      PRIMARY KEY (broadcast_id, user_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_broadcast_pending
+      ON broadcast_recipients(broadcast_id, user_id) WHERE status = 'pending';
+    """,
+    # 8: компактное хранение событий — строки низкой кардинальности и user_hash в словарях,
+    # время — unix-секунды, session (12 hex) — INTEGER. events — view с прежними колонками,
+    # запись через неё идёт триггером; бот пишет прямо в events_packed (DB.insert_events).
+    # Место освобождается после VACUUM.
+    f"""
+    CREATE TABLE event_strings (id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE);
+    CREATE TABLE event_users (id INTEGER PRIMARY KEY, user_hash TEXT NOT NULL UNIQUE);
+    CREATE TABLE events_packed (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      ts INTEGER NOT NULL,             -- unix-время UTC, секунды
+      user_ref INTEGER NOT NULL,       -- event_users.id
+      session,                         -- 12 hex-символов -> INTEGER, иначе TEXT как есть
+      state_id INTEGER NOT NULL,       -- event_strings.id
+      name_id INTEGER NOT NULL,
+      command_id INTEGER,
+      payload TEXT,                    -- компактный JSON (utils.json_dumps)
+      is_demo INTEGER NOT NULL DEFAULT 0,
+      version_id INTEGER
+    );
+
+    INSERT OR IGNORE INTO event_users(user_hash) SELECT DISTINCT user_hash FROM events;
+    INSERT OR IGNORE INTO event_strings(value)
+      WITH d AS (SELECT DISTINCT state, event_name, command, app_version FROM events)
+      SELECT state FROM d UNION SELECT event_name FROM d UNION SELECT command FROM d UNION SELECT app_version FROM d;
+    -- id сохраняются: на них завязаны kpi_state.events_hw и курсоры export.py
+    INSERT INTO events_packed(id, ts, user_ref, session, state_id, name_id, command_id, payload, is_demo, version_id)
+      SELECT e.id, CAST(strftime('%s', e.ts_utc) AS INTEGER), u.id, {_pack_session_sql("e.session_id")},
+             s.id, n.id, c.id, e.payload_json, COALESCE(e.is_demo, 0), v.id
+      FROM events e
+      JOIN event_users u ON u.user_hash = e.user_hash
+      JOIN event_strings s ON s.value = e.state
+      JOIN event_strings n ON n.value = e.event_name
+      LEFT JOIN event_strings c ON c.value = e.command
+      LEFT JOIN event_strings v ON v.value = e.app_version
+      ORDER BY e.id;
+    -- счётчик AUTOINCREMENT не должен откатиться ниже удалённых (архивированных) id
+    INSERT INTO sqlite_sequence(name, seq)
+      SELECT 'events_packed', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'events_packed');
+    UPDATE sqlite_sequence
+      SET seq = max(seq, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'events'), 0))
+      WHERE name = 'events_packed';
+    DROP TABLE events;
+
+    -- отдельный (name_id, ts) не нужен: префикс name_id есть в покрывающем индексе
+    CREATE INDEX idx_events_packed_name_user ON events_packed(name_id, user_ref, ts);
+    CREATE INDEX idx_events_packed_user_ts ON events_packed(user_ref, ts);
+
+    CREATE VIEW events AS
+      SELECT e.id AS id,
+             strftime('%Y-%m-%dT%H:%M:%S', e.ts, 'unixepoch') AS ts_utc,
+             u.user_hash AS user_hash,
+             CASE typeof(e.session) WHEN 'integer' THEN printf('%012x', e.session) ELSE e.session END AS session_id,
+             s.value AS state,
+             n.value AS event_name,
+             c.value AS command,
+             e.payload AS payload_json,
+             e.is_demo AS is_demo,
+             v.value AS app_version
+      -- LEFT JOIN везде: ссылки всегда есть, а неиспользуемые LEFT JOIN планировщик может пропустить
+      FROM events_packed e
+      LEFT JOIN event_users u ON u.id = e.user_ref
+      LEFT JOIN event_strings s ON s.id = e.state_id
+      LEFT JOIN event_strings n ON n.id = e.name_id
+      LEFT JOIN event_strings c ON c.id = e.command_id
+      LEFT JOIN event_strings v ON v.id = e.version_id;
+
+    -- старый код пишет INSERT INTO events(...) и удаляет DELETE FROM events — как раньше
+    CREATE TRIGGER events_insert INSTEAD OF INSERT ON events BEGIN
+      INSERT OR IGNORE INTO event_users(user_hash) VALUES (NEW.user_hash);
+      INSERT OR IGNORE INTO event_strings(value) VALUES (NEW.state), (NEW.event_name), (NEW.command), (NEW.app_version);
+      INSERT INTO events_packed(id, ts, user_ref, session, state_id, name_id, command_id, payload, is_demo, version_id)
+      VALUES (
+        NEW.id, CAST(strftime('%s', NEW.ts_utc) AS INTEGER),
+        (SELECT id FROM event_users WHERE user_hash = NEW.user_hash),
+        {_pack_session_sql("NEW.session_id")},
+        (SELECT id FROM event_strings WHERE value = NEW.state),
+        (SELECT id FROM event_strings WHERE value = NEW.event_name),
+        (SELECT id FROM event_strings WHERE value = NEW.command),
+        NEW.payload_json, COALESCE(NEW.is_demo, 0),
+        (SELECT id FROM event_strings WHERE value = NEW.app_version)
+      );
+    END;
+    CREATE TRIGGER events_delete INSTEAD OF DELETE ON events BEGIN
+      DELETE FROM events_packed WHERE id = OLD.id;
+    END;
+    """,
+    # 9: курсор выгрузки users в export.py — (updated_at, user_hash), без user_id
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_updated ON users(updated_at, user_hash);
+    """,
+]
+
+# Через view events (триггер events_insert) — для старого кода и внешних скриптов
+INSERT_EVENT_SQL = (
+    "INSERT INTO events(ts_utc,user_hash,session_id,state,event_name,command,payload_json,is_demo,app_version)"
+    " VALUES(?,?,?,?,?,?,?,?,?)"
+)
+
+INSERT_PACKED_SQL = (
+    "INSERT INTO events_packed(ts,user_ref,session,state_id,name_id,command_id,payload,is_demo,version_id)"
+    " VALUES(CAST(strftime('%s', ?) AS INTEGER),?,?,?,?,?,?,?,?)"
+)
+
+EVENT_USERS_CACHE = 100_000  # user_hash -> event_users.id в памяти; строк-словарей единицы сотен
+
+# Применяются один раз на каждое соединение (не сохраняются в файле БД)
+CONN_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",      # в WAL безопасно и без fsync на каждый commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",       # ~16 МБ страничного кэша
+    "PRAGMA mmap_size=268435456",     # 256 МБ
+)
+
+class UserCache:
+    """
+    LRU + TTL кэш строк users по user_id. TTL страхует от записей в обход DB (другой процесс).
+    """
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._rows: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            item = self._rows.get(user_id)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._rows[user_id]
+                self.misses += 1
+                return None
+            self._rows.move_to_end(user_id)
+            self.hits += 1
+            return dict(item[1])
+
+    def put(self, user_id: int, row: dict) -> None:
+        with self._lock:
+            self._rows[user_id] = (time.monotonic() + self.ttl, dict(row))
+            self._rows.move_to_end(user_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._rows)}
+
 class DB:
-    def __init__(self, path: str = "data.db") -> None:
+    def __init__(self, path: str = "data.db", cached_statements: int = 128,
+                 buffer_events: bool = True, profiler: Optional[QueryProfiler] = None) -> None:
         self.path = path
+        self.cached_statements = cached_statements
+        self.profiler = profiler
+        self._generation = 0  # меняется в set_profiler: потоки переоткрывают соединения
+        # одно долгоживущее соединение на поток (sqlite3 не любит делить соединение между потоками)
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
         self._init()
+        self.users = UserCache()
+        # id из словарей событий (event_strings / event_users): только закоммиченные, не удаляются
+        self._event_strings: Dict[str, int] = {}
+        self._event_users: Dict[str, int] = {}
+        self.events: Optional[EventBuffer] = EventBuffer(self) if buffer_events else None
 
-    def _conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.path)
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,  # закрываем все соединения из close()
+            factory=ProfiledConnection if self.profiler is not None else sqlite3.Connection,
+        )
+        if self.profiler is not None:
+            conn.attach_profiler(self.profiler)
         conn.row_factory = sqlite3.Row
+        for pragma in CONN_PRAGMAS:
+            conn.execute(pragma)
         return conn
 
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != self._generation and not conn.in_transaction:
+            # профайлер включили/выключили: соединение этого потока открываем заново
+            with self._conns_lock:
+                self._conns.remove(conn)
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.generation = self._generation
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def set_profiler(self, profiler: Optional[QueryProfiler]) -> None:
+        """
+        Включает (или выключает, None) профилирование SQL на живом экземпляре: каждый поток
+        переходит на новое соединение при следующем обращении к БД вне транзакции.
+        """
+        self.profiler = profiler
+        self._generation += 1
+
+    def close(self) -> None:
+        if self.events is not None:
+            self.events.close()
+        if self.profiler is not None and self.profiler.stats:
+            log.warning("%s", self.profiler.report())
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
     def _init(self) -> None:
         with self._conn() as c:
             c.executescript(SCHEMA)
+            self._migrate(c)
+
+    @staticmethod
+    def _migrate(c: sqlite3.Connection) -> None:
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            c.executescript(f"BEGIN;\n{script}\nPRAGMA user_version={i};\nCOMMIT;")
 
     @staticmethod
     def _now() -> str:
         return datetime.utcnow().isoformat(timespec="seconds")
 
     def upsert_user(self, user_id: int, chat_id: int) -> None:
+        # chat_id не менялся — писать нечего
+        cached = self.users.get(user_id)
+        if cached is not None and cached["chat_id"] == chat_id:
+            return
         now = self._now()
         with self._conn() as c:
-            row = c.execute("SELECT user_id FROM users WHERE user_id=?", (user_id,)).fetchone()
+            row = c.execute("SELECT * FROM users WHERE user_id=?", (user_id,)).fetchone()
+            if row and row["chat_id"] == chat_id:
+                self.users.put(user_id, dict(row))
+                return
+            self.users.invalidate(user_id)
             if row:
                 c.execute(
                     "UPDATE users SET chat_id=?, updated_at=? WHERE user_id=?",
@@ -94,23 +453,65 @@ class DB:
         now = self._now()
         cols = ", ".join([f"{k}=?" for k in kwargs.keys()])
         vals = list(kwargs.values()) + [now, user_id]
+        self.users.invalidate(user_id)
         with self._conn() as c:
             c.execute(f"UPDATE users SET {cols}, updated_at=? WHERE user_id=?", vals)
 
     def get_user(self, user_id: int) -> Optional[dict]:
+        cached = self.users.get(user_id)
+        if cached is not None:
+            return cached
         with self._conn() as c:
             r = c.execute("SELECT * FROM users WHERE user_id=?", (user_id,)).fetchone()
-            return dict(r) if r else None
+        if not r:
+            return None
+        row = dict(r)
+        self.users.put(user_id, row)
+        return row
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.users.stats()
 
     def save_bill(self, user_id: int, kind: str, start_ts: str, end_ts: str, days: int,
-                  kwh: Optional[float], money: Optional[float], tariff: Optional[float]) -> None:
+                  kwh: Optional[float], money: Optional[float], tariff: Optional[float]) -> int:
         now = self._now()
         with self._conn() as c:
-            c.execute(
+            cur = c.execute(
                 "INSERT INTO bills(user_id,kind,start_ts,end_ts,days,kwh,money,tariff,created_at)"
                 " VALUES(?,?,?,?,?,?,?,?,?)",
                 (user_id, kind, start_ts, end_ts, days, kwh, money, tariff, now)
             )
+            return cur.lastrowid
+
+    def import_bills(self, user_id: int, bills: List[tuple]) -> Tuple[int, bool]:
+        """
+        Импорт истории: bills — (start_ts, end_ts, days, kwh, money) по возрастанию start_ts.
+        Одна транзакция, периоды, которые уже есть у пользователя, пропускаются.
+        Самый поздний период с кВт*ч становится current (базой для savings), если он новее
+        текущего current; остальные пишутся как prev. Возвращает (добавлено, стал ли current).
+        """
+        now = self._now()
+        with self._conn() as c:
+            have = set(c.execute(
+                "SELECT start_ts, end_ts FROM bills WHERE user_id=?", (user_id,)
+            ).fetchall())
+            new = []
+            for b in bills:
+                if (b[0], b[1]) not in have:
+                    have.add((b[0], b[1]))
+                    new.append(b)
+            cur = c.execute(
+                "SELECT end_ts FROM bills WHERE user_id=? AND kind='current' ORDER BY id DESC LIMIT 1",
+                (user_id,)
+            ).fetchone()
+            with_kwh = [i for i, b in enumerate(new) if b[3] is not None]
+            base = with_kwh[-1] if with_kwh and (cur is None or new[with_kwh[-1]][1] > cur[0]) else None
+            c.executemany(
+                "INSERT INTO bills(user_id,kind,start_ts,end_ts,days,kwh,money,tariff,created_at)"
+                " VALUES(?,?,?,?,?,?,?,NULL,?)",
+                [(user_id, "current" if i == base else "prev", *b, now) for i, b in enumerate(new)]
+            )
+        return len(new), base is not None
 
     def get_latest_bill(self, user_id: int, kind: str) -> Optional[dict]:
         with self._conn() as c:
@@ -129,39 +530,616 @@ class DB:
             )
 
     def reset_user_data(self, user_id: int) -> None:
+        self.users.invalidate(user_id)
+        now = self._now()
         with self._conn() as c:
             c.execute("DELETE FROM bills WHERE user_id=?", (user_id,))
             c.execute("DELETE FROM actions_done WHERE user_id=?", (user_id,))
-            c.execute("UPDATE users SET city=NULL,home_type=NULL,heating=NULL,people=NULL,knows_tariff=0,reminders=0 WHERE user_id=?", (user_id,))
+            c.execute("DELETE FROM savings_results WHERE user_id=?", (user_id,))
+            c.execute("UPDATE users SET city=NULL,home_type=NULL,heating=NULL,people=NULL,knows_tariff=0,reminders=0,next_due_at=NULL,updated_at=? WHERE user_id=?", (now, user_id))
+
+    # ---------- reminders ----------
+    def due_reminders(self, now: str, after: Tuple[str, int], limit: int) -> List[tuple]:
+        """
+        Следующая пачка (next_due_at, user_id, chat_id) с next_due_at <= now,
+        строго после курсора after = (next_due_at, user_id). Читается только частичный индекс.
+        """
+        with self._conn() as c:
+            return c.execute(
+                "SELECT next_due_at, user_id, chat_id FROM users"
+                " WHERE next_due_at IS NOT NULL AND next_due_at <= ? AND (next_due_at, user_id) > (?, ?)"
+                " ORDER BY next_due_at, user_id LIMIT ?",
+                (now, after[0], after[1], limit)
+            ).fetchall()
+
+    def reschedule_reminders(self, rows: List[Tuple[Optional[str], int]]) -> None:
+        # rows: (next_due_at, user_id); None — больше не напоминать (например, бот заблокирован)
+        for _, user_id in rows:
+            self.users.invalidate(user_id)
+        now = self._now()
+        with self._conn() as c:
+            # updated_at — только если сменился флаг reminders (по нему export.py перевыгружает профиль)
+            c.executemany(
+                "UPDATE users SET next_due_at=?, reminders=(? IS NOT NULL),"
+                " updated_at=CASE WHEN reminders = (? IS NOT NULL) THEN updated_at ELSE ? END WHERE user_id=?",
+                [(due, due, due, now, user_id) for due, user_id in rows]
+            )
+
+    # ---------- savings_results ----------
+    def bill_history(self, after_user_id: int, max_users: int) -> List[tuple]:
+        """
+        Счета current/second следующих max_users пользователей (user_id > after_user_id),
+        по порядку (user_id, id) — для пакетного пересчёта экономии. Окно берётся только из
+        пользователей с такими счетами: у кого одни prev (импорт только в ₸), окно не занимают,
+        и пустой ответ значит «дальше никого».
+        """
+        with self._conn() as c:
+            return c.execute(
+                "SELECT id, user_id, kind, days, kwh, tariff FROM bills"
+                " WHERE user_id > :after AND user_id <= ("
+                "  SELECT MAX(user_id) FROM ("
+                "   SELECT DISTINCT user_id FROM bills WHERE user_id > :after AND kind IN ('current', 'second')"
+                "   ORDER BY user_id LIMIT :n))"
+                " AND kind IN ('current', 'second')"
+                " ORDER BY user_id, id",
+                {"after": after_user_id, "n": max_users}
+            ).fetchall()
+
+    def replace_savings_results(self, after_user_id: int, upto_user_id: int, rows: List[tuple]) -> int:
+        """
+        Перезаписывает результаты пользователей (after_user_id, upto_user_id] одной транзакцией.
+        rows: (second_bill_id, user_id, current_bill_id, before_per_day, after_per_day,
+               delta_kwh, pct, delta_money)
+        rows посчитаны по прочитанному раньше bill_history: строка пишется, только если оба её
+        счёта ещё на месте (между чтением и записью мог пройти сброс данных пользователя).
+        Возвращает число записанных строк.
+        """
+        now = self._now()
+        c = self._conn()
+        with c:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute(
+                "DELETE FROM savings_results WHERE user_id > ? AND user_id <= ?",
+                (after_user_id, upto_user_id)
+            )
+            cur = c.executemany(
+                "INSERT INTO savings_results(second_bill_id,user_id,current_bill_id,before_per_day,"
+                "after_per_day,delta_kwh,pct,delta_money,computed_at) SELECT ?,?,?,?,?,?,?,?,?"
+                " WHERE EXISTS (SELECT 1 FROM bills WHERE id=?1 AND user_id=?2)"
+                " AND EXISTS (SELECT 1 FROM bills WHERE id=?3 AND user_id=?2)",
+                [row + (now,) for row in rows]
+            )
+            return max(cur.rowcount, 0)
+
+    def save_savings_result(self, second_bill_id: int, user_id: int, current_bill_id: int, out: Dict) -> None:
+        # out — результат analytics.savings_calc с ok=True
+        with self._conn() as c:
+            c.execute(
+                "INSERT OR REPLACE INTO savings_results(second_bill_id,user_id,current_bill_id,before_per_day,"
+                "after_per_day,delta_kwh,pct,delta_money,computed_at) VALUES(?,?,?,?,?,?,?,?,?)",
+                (second_bill_id, user_id, current_bill_id, out["before_per_day"], out["after_per_day"],
+                 out["delta_kwh"], out["pct"], out["delta_money"], self._now())
+            )
+
+    def get_savings_summary(self, user_id: int) -> Optional[dict]:
+        with self._conn() as c:
+            r = c.execute(
+                "SELECT COUNT(*) AS n, SUM(delta_kwh) AS delta_kwh, SUM(delta_money) AS delta_money,"
+                " MAX(second_bill_id) AS last_id FROM savings_results WHERE user_id=?",
+                (user_id,)
+            ).fetchone()
+            if not r or not r["n"]:
+                return None
+            last = c.execute(
+                "SELECT pct, before_per_day, after_per_day FROM savings_results WHERE second_bill_id=?",
+                (r["last_id"],)
+            ).fetchone()
+            return {**dict(r), "last_pct": last["pct"], "last_before_per_day": last["before_per_day"],
+                    "last_after_per_day": last["after_per_day"]}
+
+    # ---------- broadcasts ----------
+    def create_broadcast(self, text: str, created_by: Optional[int] = None) -> int:
+        now = self._now()
+        with self._conn() as c:
+            cur = c.execute(
+                "INSERT INTO broadcasts(text,status,created_by,created_at,updated_at) VALUES(?,'snapshot',?,?,?)",
+                (text, created_by, now, now)
+            )
+            return cur.lastrowid
+
+    def snapshot_broadcast(self, broadcast_id: int, chunk: int = 5000) -> int:
+        """
+        Копирует получателей (users с chat_id) в broadcast_recipients keyset-пачками,
+        каждая пачка — своя короткая транзакция. Продолжает с места обрыва.
+        Переводит рассылку в running, возвращает total.
+        """
+        c = self._conn()
+        with c:
+            after = c.execute(
+                "SELECT COALESCE(MAX(user_id), 0) FROM broadcast_recipients WHERE broadcast_id=?",
+                (broadcast_id,)
+            ).fetchone()[0]
+        while True:
+            with c:
+                cur = c.execute(
+                    "INSERT INTO broadcast_recipients(broadcast_id,user_id,chat_id)"
+                    " SELECT ?, user_id, chat_id FROM users"
+                    " WHERE user_id > ? AND chat_id IS NOT NULL ORDER BY user_id LIMIT ?",
+                    (broadcast_id, after, chunk)
+                )
+                if cur.rowcount <= 0:
+                    break
+                after = c.execute(
+                    "SELECT MAX(user_id) FROM broadcast_recipients WHERE broadcast_id=?", (broadcast_id,)
+                ).fetchone()[0]
+        with c:
+            total = c.execute(
+                "SELECT COUNT(*) FROM broadcast_recipients WHERE broadcast_id=?", (broadcast_id,)
+            ).fetchone()[0]
+            c.execute(
+                "UPDATE broadcasts SET status='running', total=?, updated_at=? WHERE id=? AND status='snapshot'",
+                (total, self._now(), broadcast_id)
+            )
+        return total
+
+    def claim_broadcast(self, broadcast_id: int, owner: str, lease_sec: int) -> Optional[dict]:
+        # забираем рассылку, если её никто не ведёт (или аренда истекла) — защита от двойной отправки
+        now = self._now()
+        until = (datetime.utcnow() + timedelta(seconds=lease_sec)).isoformat(timespec="seconds")
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE broadcasts SET lease_owner=?, lease_until=?, updated_at=?"
+                " WHERE id=? AND status IN ('snapshot', 'running')"
+                " AND (lease_until IS NULL OR lease_until < ? OR lease_owner=?)",
+                (owner, until, now, broadcast_id, now, owner)
+            )
+            if cur.rowcount != 1:
+                return None
+            return dict(c.execute("SELECT * FROM broadcasts WHERE id=?", (broadcast_id,)).fetchone())
+
+    def broadcast_pending(self, broadcast_id: int, after_user_id: int, limit: int) -> List[tuple]:
+        with self._conn() as c:
+            return c.execute(
+                "SELECT user_id, chat_id FROM broadcast_recipients"
+                " WHERE broadcast_id=? AND status='pending' AND user_id > ? ORDER BY user_id LIMIT ?",
+                (broadcast_id, after_user_id, limit)
+            ).fetchall()
+
+    def checkpoint_broadcast(self, broadcast_id: int, owner: str, lease_sec: int,
+                             results: List[Tuple[str, Optional[str], int]], cursor: int) -> str:
+        """
+        results: (status, error, user_id). Статусы получателей, счётчики, курсор и продление
+        аренды пишутся одной транзакцией. Возвращает текущий статус рассылки
+        (paused — сигнал остановиться) или "lost", если аренду уже забрал другой владелец:
+        тогда ничего не пишется и отправку надо прекратить.
+        """
+        sent = sum(1 for st, _, _ in results if st == "sent")
+        until = (datetime.utcnow() + timedelta(seconds=lease_sec)).isoformat(timespec="seconds")
+        c = self._conn()
+        with c:
+            c.execute("BEGIN IMMEDIATE")
+            cur = c.execute(
+                "UPDATE broadcasts SET sent=sent+?, failed=failed+?, cursor=?, lease_until=?, updated_at=?"
+                " WHERE id=? AND lease_owner=?",
+                (sent, len(results) - sent, cursor, until, self._now(), broadcast_id, owner)
+            )
+            if cur.rowcount != 1:
+                c.rollback()
+                return "lost"
+            c.executemany(
+                "UPDATE broadcast_recipients SET status=?, error=? WHERE broadcast_id=? AND user_id=?",
+                [(st, err, broadcast_id, uid) for st, err, uid in results]
+            )
+            return c.execute("SELECT status FROM broadcasts WHERE id=?", (broadcast_id,)).fetchone()[0]
+
+    def finish_broadcast(self, broadcast_id: int, owner: str) -> None:
+        with self._conn() as c:
+            c.execute(
+                "UPDATE broadcasts SET status='done', lease_owner=NULL, lease_until=NULL, updated_at=?"
+                " WHERE id=? AND lease_owner=? AND status='running'",
+                (self._now(), broadcast_id, owner)
+            )
+
+    def release_broadcast(self, broadcast_id: int, owner: str) -> None:
+        with self._conn() as c:
+            c.execute(
+                "UPDATE broadcasts SET lease_owner=NULL, lease_until=NULL WHERE id=? AND lease_owner=?",
+                (broadcast_id, owner)
+            )
+
+    def set_broadcast_status(self, broadcast_id: int, status: str) -> bool:
+        # running <-> paused; завершённые не трогаем
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE broadcasts SET status=?, updated_at=? WHERE id=? AND status IN ('running', 'paused')",
+                (status, self._now(), broadcast_id)
+            )
+            return cur.rowcount == 1
+
+    def get_broadcast(self, broadcast_id: int) -> Optional[dict]:
+        with self._conn() as c:
+            r = c.execute("SELECT * FROM broadcasts WHERE id=?", (broadcast_id,)).fetchone()
+        return dict(r) if r else None
+
+    def list_broadcasts(self, limit: int = 10, active_only: bool = False) -> List[dict]:
+        where = " WHERE status IN ('snapshot', 'running')" if active_only else ""
+        with self._conn() as c:
+            return [dict(r) for r in c.execute(
+                f"SELECT * FROM broadcasts{where} ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()]
 
     def log_event(self, user_id: int, session_id: str, state: str, event_name: str,
                   command: Optional[str] = None, payload: Optional[Dict[str, Any]] = None,
                   is_demo: int = 0, app_version: Optional[str] = None) -> None:
-        now = self._now()
+        row = (
+            self._now(),
+            user_hash(user_id),
+            session_id,
+            state,
+            event_name,
+            command,
+            json_dumps(payload) if payload is not None else None,
+            is_demo,
+            app_version
+        )
+        if self.events is not None:
+            self.events.add(row)
+        else:
+            self.insert_events([row])
+
+    def insert_events(self, rows: List[Tuple]) -> None:
+        """
+        rows — строки в колонках view events (как собирает log_event); пишутся в events_packed
+        с id из словарей, без триггера.
+        """
+        c = self._conn()
+        strings, users = self._event_refs(c, rows)
+        packed = [
+            (r[0], users[r[1]], _pack_session(r[2]), strings[r[3]], strings[r[4]],
+             strings.get(r[5]), r[6], r[7] or 0, strings.get(r[8]))
+            for r in rows
+        ]
+        with c:
+            c.executemany(INSERT_PACKED_SQL, packed)
+
+    def _event_refs(self, c: sqlite3.Connection, rows: List[Tuple]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        # новые значения заводим отдельной короткой транзакцией: в кэш попадают только закоммиченные id
+        strings = self._event_strings
+        users = {h: self._event_users.get(h) for h in {r[1] for r in rows}}
+        new_s = {v for r in rows for v in (r[3], r[4], r[5], r[8]) if v is not None and v not in strings}
+        new_u = [h for h, ref in users.items() if ref is None]
+        if new_s or new_u:
+            with c:
+                c.executemany("INSERT OR IGNORE INTO event_strings(value) VALUES(?)", [(v,) for v in new_s])
+                c.executemany("INSERT OR IGNORE INTO event_users(user_hash) VALUES(?)", [(h,) for h in new_u])
+                found_s = {v: c.execute("SELECT id FROM event_strings WHERE value=?", (v,)).fetchone()[0]
+                           for v in new_s}
+                for h in new_u:
+                    users[h] = c.execute("SELECT id FROM event_users WHERE user_hash=?", (h,)).fetchone()[0]
+            strings.update(found_s)
+            if len(self._event_users) + len(new_u) > EVENT_USERS_CACHE:
+                self._event_users = {}
+            self._event_users.update((h, users[h]) for h in new_u)
+        return strings, users
+
+    def refresh_rollups(self, batch_size: int = 50_000) -> int:
+        """
+        Доносит в kpi_daily события с id выше сохранённой отметки (kpi_state.events_hw),
+        пачками по batch_size, одна транзакция на пачку. Возвращает число обработанных событий.
+        Безопасно при одновременных вызовах (джоб бота, archive.py, kpi.py --refresh из другого
+        процесса): отметка читается уже под блокировкой записи, пачку учитывает только один.
+        """
+        c = self._conn()
+        done = 0
+        while True:
+            with c:
+                # sqlite3 сам открывает транзакцию только перед первым INSERT — поздно:
+                # отметку и пачку надо читать внутри той же транзакции, что их пишет
+                c.execute("BEGIN IMMEDIATE")
+                r = c.execute("SELECT value FROM kpi_state WHERE key='events_hw'").fetchone()
+                hw = r[0] if r else 0
+                upto = c.execute(
+                    "SELECT MAX(id) FROM (SELECT id FROM events_packed WHERE id > ? ORDER BY id LIMIT ?)",
+                    (hw, batch_size)
+                ).fetchone()[0]
+                if upto is None:
+                    return done
+                c.execute("DROP TABLE IF EXISTS temp.kpi_batch")
+                c.execute("DROP TABLE IF EXISTS temp.kpi_new")
+                c.execute(
+                    "CREATE TEMP TABLE kpi_batch AS"
+                    " SELECT date(e.ts, 'unixepoch') AS day, n.value AS event_name,"
+                    "  COALESCE(v.value, '') AS app_version, u.user_hash,"
+                    "  CAST(json_extract(e.payload, '$.star') AS REAL) AS star"
+                    " FROM events_packed e JOIN event_strings n ON n.id = e.name_id"
+                    " JOIN event_users u ON u.id = e.user_ref LEFT JOIN event_strings v ON v.id = e.version_id"
+                    " WHERE e.id > ? AND e.id <= ?",
+                    (hw, upto)
+                )
+                # новые (day, event, version, user) и впервые увиденные (event, user)
+                c.execute(
+                    "CREATE TEMP TABLE kpi_new AS"
+                    " SELECT DISTINCT day, event_name, app_version, user_hash FROM kpi_batch b"
+                    " WHERE NOT EXISTS (SELECT 1 FROM kpi_daily_users k WHERE k.day=b.day"
+                    "  AND k.event_name=b.event_name AND k.app_version=b.app_version AND k.user_hash=b.user_hash)"
+                )
+                c.execute("INSERT INTO kpi_daily_users SELECT * FROM kpi_new")
+                c.execute(
+                    "INSERT INTO kpi_daily(day, event_name, app_version, events, star_sum, star_n)"
+                    " SELECT day, event_name, app_version, COUNT(*),"
+                    "  COALESCE(SUM(CASE WHEN star BETWEEN 1 AND 5 THEN star END), 0),"
+                    "  COUNT(CASE WHEN star BETWEEN 1 AND 5 THEN 1 END)"
+                    " FROM kpi_batch WHERE 1 GROUP BY day, event_name, app_version"
+                    " ON CONFLICT DO UPDATE SET events = events + excluded.events,"
+                    "  star_sum = star_sum + excluded.star_sum, star_n = star_n + excluded.star_n"
+                )
+                c.execute(
+                    "INSERT INTO kpi_daily(day, event_name, app_version, users)"
+                    " SELECT day, event_name, app_version, COUNT(*) FROM kpi_new WHERE 1"
+                    " GROUP BY day, event_name, app_version"
+                    " ON CONFLICT DO UPDATE SET users = users + excluded.users"
+                )
+                # первое появление пользователя в событии засчитываем дню, где он встретился раньше всего
+                c.execute(
+                    "INSERT INTO kpi_daily(day, event_name, app_version, new_users)"
+                    " SELECT day, event_name, app_version, COUNT(*) FROM ("
+                    "  SELECT MIN(day) AS day, event_name, app_version, user_hash FROM kpi_new n"
+                    "  WHERE NOT EXISTS (SELECT 1 FROM kpi_first_seen f"
+                    "   WHERE f.event_name=n.event_name AND f.user_hash=n.user_hash)"
+                    "  GROUP BY event_name, user_hash"
+                    " ) WHERE 1 GROUP BY day, event_name, app_version"
+                    " ON CONFLICT DO UPDATE SET new_users = new_users + excluded.new_users"
+                )
+                c.execute("INSERT OR IGNORE INTO kpi_first_seen SELECT DISTINCT event_name, user_hash FROM kpi_new")
+                c.execute(
+                    "INSERT INTO kpi_state(key, value) VALUES('events_hw', ?)"
+                    " ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                    (upto,)
+                )
+                done += c.execute("SELECT COUNT(*) FROM kpi_batch").fetchone()[0]
+
+    # ---------- архив событий (archive.py) ----------
+    def events_hw(self) -> int:
+        # id последнего события, учтённого в kpi_daily
+        with self._conn() as c:
+            r = c.execute("SELECT value FROM kpi_state WHERE key='events_hw'").fetchone()
+        return r[0] if r else 0
+
+    def oldest_events(self, upto_id: int, limit: int) -> List[tuple]:
+        # (id, ts_utc) первых limit событий с id <= upto_id
         with self._conn() as c:
+            return c.execute(
+                "SELECT id, ts_utc FROM events WHERE id <= ? ORDER BY id LIMIT ?", (upto_id, limit)
+            ).fetchall()
+
+    def attach_archive(self, path: str, schema: str) -> None:
+        """
+        Подключает архивный файл как arch к соединению этого потока; schema — DDL таблицы
+        архива с {s} вместо имени схемы. move_events и detach_archive — из того же потока.
+        """
+        c = self._conn()
+        c.execute("ATTACH DATABASE ? AS arch", (path,))
+        # как у горячей БД: WAL + NORMAL, иначе каждая пачка ждёт fsync архива
+        c.execute("PRAGMA arch.journal_mode=WAL")
+        c.execute("PRAGMA arch.synchronous=NORMAL")
+        c.executescript(schema.format(s="arch"))
+
+    def move_events(self, columns: str, lo: int, hi: int) -> None:
+        # копия событий lo..hi в arch.events и удаление из горячей таблицы — одна транзакция
+        c = self._conn()
+        with c:
+            # сразу блокировка записи: иначе чтение main в INSERT ... SELECT даст устаревший
+            # снимок, и DELETE упадёт с SQLITE_BUSY, если бот успел записать между ними
+            c.execute("BEGIN IMMEDIATE")
             c.execute(
-                "INSERT INTO events(ts_utc,user_hash,session_id,state,event_name,command,payload_json,is_demo,app_version)"
-                " VALUES(?,?,?,?,?,?,?,?,?)",
-                (
-                    now,
-                    user_hash(user_id),
-                    session_id,
-                    state,
-                    event_name,
-                    command,
-                    json_dumps(payload) if payload is not None else None,
-                    is_demo,
-                    app_version
-                )
+                f"INSERT OR IGNORE INTO arch.events({columns})"
+                f" SELECT {columns} FROM main.events WHERE id BETWEEN ? AND ?", (lo, hi)
+            )
+            # events — view (схема 8+): удаляем из таблицы под ней, без построчного триггера
+            c.execute("DELETE FROM main.events_packed WHERE id BETWEEN ? AND ?", (lo, hi))
+
+    def detach_archive(self) -> None:
+        # архив дописан: переносим WAL в основной файл (с fsync) и убираем -wal
+        c = self._conn()
+        c.execute("PRAGMA arch.wal_checkpoint(TRUNCATE)")
+        c.execute("PRAGMA arch.journal_mode=DELETE")
+        c.execute("DETACH DATABASE arch")
+
+    def load_user_data(self) -> Dict[int, str]:
+        with self._conn() as c:
+            return {r[0]: r[1] for r in c.execute("SELECT user_id, data_json FROM conv_user_data")}
+
+    def load_conv_states(self, name: str) -> Dict[str, int]:
+        with self._conn() as c:
+            return {
+                r[0]: r[1]
+                for r in c.execute("SELECT key_json, state FROM conv_states WHERE name=?", (name,))
+            }
+
+    def save_conv_data(self, user_data: List[Tuple[int, Optional[str]]],
+                       states: List[Tuple[str, str, Optional[int]]]) -> None:
+        """
+        Одна транзакция на пачку изменений. data_json=None / state=None — удалить запись.
+        """
+        now = self._now()
+        with self._conn() as c:
+            c.executemany(
+                "INSERT INTO conv_user_data(user_id, data_json, updated_at) VALUES(?,?,?)"
+                " ON CONFLICT(user_id) DO UPDATE SET data_json=excluded.data_json, updated_at=excluded.updated_at",
+                [(uid, data, now) for uid, data in user_data if data is not None]
+            )
+            c.executemany(
+                "DELETE FROM conv_user_data WHERE user_id=?",
+                [(uid,) for uid, data in user_data if data is None]
             )
+            c.executemany(
+                "INSERT INTO conv_states(name, key_json, state) VALUES(?,?,?)"
+                " ON CONFLICT(name, key_json) DO UPDATE SET state=excluded.state",
+                [row for row in states if row[2] is not None]
+            )
+            c.executemany(
+                "DELETE FROM conv_states WHERE name=? AND key_json=?",
+                [(name, key) for name, key, state in states if state is None]
+            )
+
+    def flush_events(self) -> None:
+        if self.events is not None:
+            self.events.flush()
+
+def _is_busy(e: Exception) -> bool:
+    # SQLITE_BUSY — "database is locked", SQLITE_LOCKED — "database table is locked"
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e))
+
+class EventBuffer:
+    """
+    Буфер событий: строки копятся в памяти и пишутся пачкой (executemany, одна транзакция)
+    при batch_size строк или через flush_interval секунд после первой строки в пачке.
+    Если диск не успевает и в буфере max_pending строк — add() ждёт (backpressure).
+    Занятую БД (SQLITE_BUSY/LOCKED) пачка ждёт до retries попыток; прочие ошибки повтором
+    не лечатся — такие строки пишутся в лог и отбрасываются (счётчик dropped), поток живёт дальше.
+    """
+    def __init__(self, db: DB, batch_size: int = 200, flush_interval: float = 0.5,
+                 max_pending: int = 10_000, retries: int = 5) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retries = retries
+        self.dropped = 0
+        self._rows: List[Tuple] = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="events-flusher", daemon=True)
+        self._thread.start()
+
+    def add(self, row: Tuple) -> None:
+        with self._cond:
+            while len(self._rows) >= self.max_pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                # после close пишем сразу, чтобы не потерять событие
+                self._write_retrying([row])
+                return
+            self._rows.append(row)
+            if len(self._rows) == 1 or len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _take(self) -> List[Tuple]:
+        rows, self._rows = self._rows, []
+        self._cond.notify_all()  # будим тех, кто ждёт в add()
+        return rows
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = None
+                while not self._closed and len(self._rows) < self.batch_size:
+                    if not self._rows:
+                        deadline = None
+                        self._cond.wait()
+                        continue
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                rows = self._take()
+            try:
+                self._write_retrying(rows)
+            except Exception:
+                # поток не должен умереть: иначе add() навсегда встанет на max_pending
+                log.exception("events flusher: unexpected error, %d rows lost", len(rows))
+                self.dropped += len(rows)
+
+    def _write(self, rows: List[Tuple]) -> None:
+        if rows:
+            with self._write_lock:
+                self.db.insert_events(rows)
+
+    def _write_retrying(self, rows: List[Tuple]) -> None:
+        attempt = 0
+        while True:
+            try:
+                self._write(rows)
+                return
+            except Exception as e:
+                attempt += 1
+                busy = _is_busy(e)
+                if busy and attempt < self.retries:
+                    log.warning("events flush: %s, retry %d/%d (%d rows)", e, attempt, self.retries, len(rows))
+                    time.sleep(self.flush_interval)
+                    continue
+                if busy or len(rows) == 1:
+                    log.error("events dropped (%d rows): %r; first row: %r", len(rows), e, rows[0])
+                    self.dropped += len(rows)
+                    return
+                # ошибка в данных: ищем битую строку, остальные пишем
+                log.warning("events flush failed (%r), writing %d rows one by one", e, len(rows))
+                for row in rows:
+                    self._write_retrying([row])
+                return
+
+    def flush(self) -> None:
+        with self._cond:
+            rows = self._take()
+        self._write_retrying(rows)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+
+class AsyncDB:
+    """
+    Асинхронный фасад над DB для хендлеров: все вызовы уходят в один поток-писатель,
+    поэтому commit/fsync не блокирует event loop, а порядок операций сохраняется.
+    """
+    def __init__(self, db: DB) -> None:
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+        return call
+
+    async def close(self) -> None:
+        await self.run(self.db.close)
+        self._executor.shutdown(wait=True)
+
 import sqlite3
 from datetime import datetime
 
 DB_PATH = "data.db"
 
 def log_event(user_id: int, event_type: str, meta: str | None = None) -> None:
+    # старый API: пишем в реальную схему events, meta кладём в payload_json
     with sqlite3.connect(DB_PATH) as con:
         con.execute(
-            "INSERT INTO events(user_id, event_type, ts, meta) VALUES(?,?,?,?)",
-            (user_id, event_type, datetime.now().isoformat(timespec="seconds"), meta),
+            INSERT_EVENT_SQL,
+            (
+                datetime.utcnow().isoformat(timespec="seconds"),
+                user_hash(user_id),
+                "",
+                "",
+                event_type,
+                None,
+                json_dumps({"meta": meta}) if meta is not None else None,
+                0,
+                None
+            ),
         )
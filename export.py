@@ -0,0 +1,238 @@
+"""
+Выгрузка events / bills / users для аналитики — вместо открытия живой data.db в DB Browser.
+
+    python export.py [--db analytics.db] [--out export] [--format jsonl|csv|parquet]
+                     [--tables events bills users] [--chunk 50000] [--full]
+
+По умолчанию читается снимок analytics.db (snapshot.py), id в нём те же, что в data.db,
+так что инкрементальная выгрузка продолжается с любого из них.
+Таблицы читаются read-only соединением кусками по --chunk строк (keyset), каждый кусок
+сразу пишется в файл — память не зависит от размера таблицы, а WAL-читатель не держит
+долгую транзакцию и не мешает боту писать.
+
+По умолчанию выгрузка инкрементальная: в <out>/export_state.json хранится курсор каждой
+таблицы, новый запуск пишет только строки после него в новый файл
+<out>/<table>/<table>_<first>_<last>.<ext>. --full выгружает всё заново с начала
+(лучше в пустой --out, иначе старые файлы задублируют строки).
+events и bills идут по id. users — по (updated_at, user_hash): профиль, изменённый после
+прошлой выгрузки, выгружается ещё раз (актуальная строка — с последним updated_at).
+Профили, изменённые меньше чем за SETTLE_SEC до снимка (или запуска, для data.db), ждут
+следующего запуска: updated_at бот ставит до коммита, и такие строки могли ещё не попасть в снимок.
+
+Наружу не уходят user_id и chat_id — ни в данных, ни в именах файлов, ни в курсорах:
+события и счета связаны через user_hash.
+Parquet — если установлен pyarrow (каждый кусок = row group).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import snapshot
+from config import SNAPSHOT_PATH
+from kpi import connect_ro
+from utils import json_dumps
+
+@dataclass(frozen=True)
+class Export:
+    name: str
+    columns: Tuple[Tuple[str, str], ...]  # (имя, тип для parquet: int/float/str) — без ключа
+    sql: str                              # первые keys колонок — ключ keyset; параметры :a0.., :limit, :upto
+    keys: int = 1
+    start: tuple = (0,)                   # курсор до первой строки
+
+EXPORTS = {
+    "events": Export(
+        "events",
+        (("id", "int"), ("ts_utc", "str"), ("user_hash", "str"), ("session_id", "str"), ("state", "str"),
+         ("event_name", "str"), ("command", "str"), ("payload_json", "str"), ("is_demo", "int"),
+         ("app_version", "str")),
+        "SELECT id, id, ts_utc, user_hash, session_id, state, event_name, command, payload_json, is_demo,"
+        " app_version FROM events WHERE id > :a0 ORDER BY id LIMIT :limit",
+    ),
+    "bills": Export(
+        "bills",
+        (("id", "int"), ("user_hash", "str"), ("kind", "str"), ("start_ts", "str"), ("end_ts", "str"),
+         ("days", "int"), ("kwh", "float"), ("money", "float"), ("tariff", "float"), ("created_at", "str")),
+        "SELECT b.id, b.id, u.user_hash, b.kind, b.start_ts, b.end_ts, b.days, b.kwh, b.money, b.tariff,"
+        " b.created_at FROM bills b LEFT JOIN users u ON u.user_id = b.user_id"
+        " WHERE b.id > :a0 ORDER BY b.id LIMIT :limit",
+    ),
+    "users": Export(
+        "users",
+        (("user_hash", "str"), ("city", "str"), ("home_type", "str"), ("heating", "str"), ("people", "str"),
+         ("knows_tariff", "int"), ("reminders", "int"), ("created_at", "str"), ("updated_at", "str")),
+        "SELECT updated_at, user_hash, user_hash, city, home_type, heating, people, knows_tariff, reminders,"
+        " created_at, updated_at FROM users WHERE (updated_at, user_hash) > (:a0, :a1) AND updated_at < :upto"
+        " ORDER BY updated_at, user_hash LIMIT :limit",
+        keys=2,
+        start=("", ""),
+    ),
+}
+
+STATE_FILE = "export_state.json"
+SETTLE_SEC = 60
+FORMATS = ("jsonl", "csv", "parquet")
+
+def iter_chunks(c, spec: Export, after: tuple, chunk: int, upto: str = "") -> Iterator[List[tuple]]:
+    # каждый кусок — отдельный короткий SELECT: между кусками чтение не держит снимок БД
+    while True:
+        params = {f"a{i}": v for i, v in enumerate(after)}
+        rows = c.execute(spec.sql, {**params, "limit": chunk, "upto": upto}).fetchall()
+        if not rows:
+            return
+        yield rows
+        after = tuple(rows[-1][:spec.keys])
+
+# ---------- форматы ----------
+class JsonlWriter:
+    def __init__(self, path: Path, spec: Export) -> None:
+        self.f = open(path, "w", encoding="utf-8")
+        self.names = [n for n, _ in spec.columns]
+        self.keys = spec.keys
+
+    def write(self, rows: Sequence[tuple]) -> None:
+        self.f.writelines(json_dumps(dict(zip(self.names, r[self.keys:]))) + "\n" for r in rows)
+
+    def close(self) -> None:
+        self.f.close()
+
+class CsvWriter:
+    def __init__(self, path: Path, spec: Export) -> None:
+        self.f = open(path, "w", encoding="utf-8", newline="")
+        self.w = csv.writer(self.f)
+        self.w.writerow([n for n, _ in spec.columns])
+        self.keys = spec.keys
+
+    def write(self, rows: Sequence[tuple]) -> None:
+        self.w.writerows(r[self.keys:] for r in rows)
+
+    def close(self) -> None:
+        self.f.close()
+
+class ParquetWriter:
+    def __init__(self, path: Path, spec: Export) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("parquet: нужен pyarrow (pip install pyarrow)")
+        types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+        self.pa = pa
+        self.keys = spec.keys
+        self.schema = pa.schema([(n, types[t]) for n, t in spec.columns])
+        self.w = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+
+    def write(self, rows: Sequence[tuple]) -> None:
+        cols = list(zip(*(r[self.keys:] for r in rows)))
+        self.w.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(col, type=f.type) for col, f in zip(cols, self.schema)], schema=self.schema
+        ))
+
+    def close(self) -> None:
+        self.w.close()
+
+WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+# ---------- выгрузка ----------
+def _stamp(key: tuple) -> str:
+    # часть имени файла: id или updated_at без разделителей (20260101T120000)
+    v = key[0]
+    return str(v) if isinstance(v, int) else v.replace("-", "").replace(":", "")
+
+def export_table(c, spec: Export, out: Path, fmt: str, after: Optional[tuple] = None,
+                 chunk: int = 50_000, upto: str = "") -> Tuple[int, tuple, Optional[Path]]:
+    """
+    Пишет строки с ключом > after (и updated_at < upto, где он есть) в новый файл.
+    Возвращает (строк, последний ключ, путь); если новых строк нет, файл не создаётся.
+    """
+    after = spec.start if after is None else after
+    table_dir = out / spec.name
+    table_dir.mkdir(parents=True, exist_ok=True)
+    tmp = table_dir / f".{spec.name}.partial.{fmt}"
+    writer = None
+    n, first, last = 0, None, after
+    try:
+        for rows in iter_chunks(c, spec, after, chunk, upto):
+            if writer is None:
+                writer = WRITERS[fmt](tmp, spec)
+                first = tuple(rows[0][:spec.keys])
+            writer.write(rows)
+            n += len(rows)
+            last = tuple(rows[-1][:spec.keys])
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        return 0, after, None
+    base = f"{spec.name}_{_stamp(first)}_{_stamp(last)}"
+    path = table_dir / f"{base}.{fmt}"
+    i = 1
+    while path.exists():  # users: та же секунда у двух запусков
+        i += 1
+        path = table_dir / f"{base}_{i}.{fmt}"
+    os.replace(tmp, path)  # файл появляется целиком — читатели не видят недописанный
+    return n, last, path
+
+def load_state(out: Path) -> Dict:
+    try:
+        return json.loads((out / STATE_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+def save_state(out: Path, state: Dict) -> None:
+    tmp = out / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp, out / STATE_FILE)
+
+def _cursor(spec: Export, saved) -> tuple:
+    # в state: id (число) для keyset по id, список для составного ключа. Курсор users старого
+    # формата (user_id) не подходит — такая таблица выгружается заново
+    if spec.keys == 1 and isinstance(saved, int):
+        return (saved,)
+    if spec.keys > 1 and isinstance(saved, list) and len(saved) == spec.keys:
+        return tuple(saved)
+    return spec.start
+
+def run(db_path: str, out: Path, tables: Sequence[str], fmt: str = "jsonl",
+        chunk: int = 50_000, incremental: bool = True) -> Dict[str, Tuple[int, Optional[Path]]]:
+    out.mkdir(parents=True, exist_ok=True)
+    state = load_state(out) if incremental else {}
+    done = {}
+    with connect_ro(db_path) as c:
+        taken = snapshot.taken_at(c)
+        upto = (datetime.fromisoformat(taken) if taken else datetime.utcnow()) - timedelta(seconds=SETTLE_SEC)
+        upto = upto.isoformat(timespec="seconds")
+        for name in tables:
+            spec = EXPORTS[name]
+            n, last, path = export_table(c, spec, out, fmt, _cursor(spec, state.get(name)), chunk, upto)
+            state[name] = last[0] if spec.keys == 1 else list(last)
+            save_state(out, state)  # после каждой таблицы: упавший запуск не повторит готовое
+            done[name] = (n, path)
+    return done
+
+def main():
+    ap = argparse.ArgumentParser(description="Выгрузка events/bills/users в JSONL/CSV/Parquet")
+    ap.add_argument("--db", default=SNAPSHOT_PATH, help="снимок (snapshot.py) или data.db")
+    ap.add_argument("--out", default="export")
+    ap.add_argument("--format", choices=FORMATS, default="jsonl")
+    ap.add_argument("--tables", nargs="+", choices=list(EXPORTS), default=list(EXPORTS))
+    ap.add_argument("--chunk", type=int, default=50_000)
+    ap.add_argument("--full", action="store_true", help="выгрузить всё с начала, а не только новое")
+    args = ap.parse_args()
+    snapshot.ensure_exists(args.db)
+
+    t0 = time.perf_counter()
+    done = run(args.db, Path(args.out), args.tables, args.format, args.chunk, incremental=not args.full)
+    for name, (n, path) in done.items():
+        print(f"{name:<8} {n:>10,} rows  {path or '-'}", file=sys.stderr)
+    print(f"done in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
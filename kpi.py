@@ -0,0 +1,222 @@
+"""
+KPI пилота по реальной таблице events (user_hash, event_name, ts_utc, payload_json).
+
+    python kpi.py [--db analytics.db] [--since 2026-01-01] [--json]
+    python kpi.py --rollups [--refresh] [--daily 14]
+    python kpi.py --archive archive --since 2025-01-01   # вместе с архивными месяцами
+
+Все метрики считаются агрегатами по индексам (event_name, user_hash) — без чтения строк таблицы.
+В схеме 8+ events — view над компактной events_packed (см. db.MIGRATIONS): агрегаты идут прямо
+по events_packed и целым id, имена событий подставляются в конце.
+С --rollups читаются дневные роллапы kpi_daily (их дописывает бот, см. DB.refresh_rollups):
+стоимость O(дней), а не O(событий).
+По умолчанию читается снимок analytics.db (snapshot.py, бот обновляет его сам), а не живая
+data.db; --refresh дописывает роллапы в живой БД (--live) и сразу снимает свежий снимок.
+"""
+import argparse
+import calendar
+import json
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import snapshot
+from config import SNAPSHOT_PATH
+
+# Воронка: /start -> онбординг -> анализ
+FUNNEL = ("bot_start", "onboarding_done", "analysis_generated")
+COMPLETED = "analysis_generated"
+RETURNED = "savings_calculated"
+FEEDBACK = "feedback_submitted"
+
+def _rate(num: int, den: int) -> Optional[float]:
+    return round(100.0 * num / den, 2) if den else None
+
+def _where_since(since: Optional[str]) -> str:
+    return " AND ts_utc >= :since" if since else ""
+
+def _packed(c: sqlite3.Connection) -> bool:
+    # events_packed есть, и events не подменён TEMP VIEW с архивами (archive.connect_all)
+    return (c.execute("SELECT 1 FROM sqlite_temp_master WHERE name='events'").fetchone() is None
+            and c.execute("SELECT 1 FROM sqlite_master WHERE name='events_packed'").fetchone() is not None)
+
+def _since_ts(since: str) -> int:
+    # ISO-префикс ('2026-01', '2026-01-01', ...) -> unix-секунды; как сравнение строк ts_utc >= since
+    full = since + "0000-01-01T00:00:00"[len(since):]
+    return calendar.timegm(datetime.fromisoformat(full[:19]).timetuple())
+
+def event_counts(c: sqlite3.Connection, since: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """
+    {event_name: {"events": n, "users": distinct user_hash}} за один проход по индексу.
+    """
+    if _packed(c):
+        sql = (
+            "SELECT n.value, COUNT(*), COUNT(DISTINCT e.user_ref) FROM events_packed e"
+            " JOIN event_strings n ON n.id = e.name_id"
+            " WHERE 1=1" + (" AND e.ts >= :since" if since else "") + " GROUP BY e.name_id"
+        )
+        params = {"since": _since_ts(since) if since else None}
+    else:
+        sql = (
+            "SELECT event_name, COUNT(*), COUNT(DISTINCT user_hash) FROM events"
+            " WHERE 1=1" + _where_since(since) + " GROUP BY event_name"
+        )
+        params = {"since": since}
+    return {
+        name: {"events": n, "users": users}
+        for name, n, users in c.execute(sql, params)
+    }
+
+def usefulness(c: sqlite3.Connection, since: Optional[str] = None) -> Dict:
+    if _packed(c):
+        sql = (
+            "SELECT ROUND(AVG(star), 2), COUNT(*) FROM ("
+            " SELECT CAST(json_extract(payload, '$.star') AS REAL) AS star FROM events_packed"
+            " WHERE name_id=(SELECT id FROM event_strings WHERE value=:name)"
+            + (" AND ts >= :since" if since else "") +
+            ") WHERE star BETWEEN 1 AND 5"
+        )
+        params = {"name": FEEDBACK, "since": _since_ts(since) if since else None}
+    else:
+        sql = (
+            "SELECT ROUND(AVG(star), 2), COUNT(*) FROM ("
+            " SELECT CAST(json_extract(payload_json, '$.star') AS REAL) AS star FROM events"
+            " WHERE event_name=:name" + _where_since(since) +
+            ") WHERE star BETWEEN 1 AND 5"
+        )
+        params = {"name": FEEDBACK, "since": since}
+    avg, n = c.execute(sql, params).fetchone()
+    return {"avg": avg, "n": n}
+
+def rollup_counts(c: sqlite3.Connection, since: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    # без since: сумма new_users = distinct за всё время; с since — сумма дневных distinct (верхняя оценка)
+    users_col = "users" if since else "new_users"
+    sql = (
+        f"SELECT event_name, SUM(events), SUM({users_col}) FROM kpi_daily"
+        " WHERE 1=1" + (" AND day >= :since" if since else "") + " GROUP BY event_name"
+    )
+    return {
+        name: {"events": n, "users": users}
+        for name, n, users in c.execute(sql, {"since": since})
+    }
+
+def rollup_usefulness(c: sqlite3.Connection, since: Optional[str] = None) -> Dict:
+    sql = (
+        "SELECT SUM(star_sum), SUM(star_n) FROM kpi_daily WHERE event_name=:name"
+        + (" AND day >= :since" if since else "")
+    )
+    total, n = c.execute(sql, {"name": FEEDBACK, "since": since}).fetchone()
+    return {"avg": round(total / n, 2) if n else None, "n": n or 0}
+
+def daily(c: sqlite3.Connection, days: int) -> List[Dict]:
+    sql = (
+        "SELECT day, event_name, SUM(events), SUM(users) FROM kpi_daily"
+        " WHERE day >= (SELECT date(MAX(day), :offset) FROM kpi_daily)"
+        " GROUP BY day, event_name ORDER BY day, event_name"
+    )
+    return [
+        {"day": day, "event_name": name, "events": n, "users": users}
+        for day, name, n, users in c.execute(sql, {"offset": f"-{days - 1} days"})
+    ]
+
+def compute(c: sqlite3.Connection, since: Optional[str] = None, rollups: bool = False) -> Dict:
+    if rollups:
+        return _assemble(rollup_counts(c, since), rollup_usefulness(c, since))
+    return _assemble(event_counts(c, since), usefulness(c, since))
+
+def _assemble(counts: Dict[str, Dict[str, int]], use: Dict) -> Dict:
+    def users(name: str) -> int:
+        return counts.get(name, {}).get("users", 0)
+
+    funnel: List[Dict] = []
+    first = users(FUNNEL[0])
+    prev = first
+    for step in FUNNEL:
+        n = users(step)
+        funnel.append({
+            "step": step,
+            "users": n,
+            "from_start_percent": _rate(n, first),
+            "from_prev_percent": _rate(n, prev),
+        })
+        prev = n
+
+    return {
+        "events": counts,
+        "funnel": funnel,
+        "completion": {
+            "started": first,
+            "completed": users(COMPLETED),
+            "rate_percent": _rate(users(COMPLETED), first),
+        },
+        "usefulness": use,
+        "return": {
+            "completed": users(COMPLETED),
+            "returned": users(RETURNED),
+            "rate_percent": _rate(users(RETURNED), users(COMPLETED)),
+        },
+    }
+
+def connect_ro(path: str) -> sqlite3.Connection:
+    # только чтение: отчёты не должны мешать писателю бота
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+def print_report(k: Dict) -> None:
+    print("Events:")
+    for name, v in sorted(k["events"].items(), key=lambda x: -x[1]["events"]):
+        print(f"  {name:<24} {v['events']:>10} events {v['users']:>8} users")
+
+    print("\nFunnel:")
+    for s in k["funnel"]:
+        print(f"  {s['step']:<24} {s['users']:>8} users  "
+              f"{s['from_start_percent']}% от старта, {s['from_prev_percent']}% от пред. шага")
+
+    comp, ret, use = k["completion"], k["return"], k["usefulness"]
+    print(f"\nCompletion rate: {comp['completed']}/{comp['started']} = {comp['rate_percent']}%")
+    print(f"Usefulness: avg {use['avg']} (n={use['n']})")
+    print(f"Return rate: {ret['returned']}/{ret['completed']} = {ret['rate_percent']}%")
+
+def main():
+    ap = argparse.ArgumentParser(description="KPI пилота по таблице events")
+    ap.add_argument("--db", default=SNAPSHOT_PATH, help="снимок (snapshot.py) или data.db")
+    ap.add_argument("--live", default="data.db", help="живая БД бота (для --refresh)")
+    ap.add_argument("--since", help="ts_utc >= since, ISO (например 2026-01-01)")
+    ap.add_argument("--json", action="store_true", help="вывести JSON")
+    ap.add_argument("--rollups", action="store_true", help="читать дневные роллапы kpi_daily")
+    ap.add_argument("--refresh", action="store_true", help="перед отчётом дописать роллапы и обновить снимок")
+    ap.add_argument("--daily", type=int, metavar="DAYS", help="с --rollups: разбивка по дням")
+    ap.add_argument("--archive", metavar="DIR", help="сырые события вместе с архивами archive.py")
+    args = ap.parse_args()
+
+    if args.refresh:
+        from db import DB
+        db = DB(args.live, buffer_events=False)
+        print(f"rollups: +{db.refresh_rollups()} events", file=sys.stderr)
+        db.close()
+        if args.db != args.live:
+            snapshot.take_snapshot(args.live, args.db)
+    snapshot.ensure_exists(args.db)
+
+    if args.archive:
+        import archive  # archive импортирует kpi
+        conn = archive.connect_all(args.db, args.archive, since=args.since)
+    else:
+        conn = connect_ro(args.db)
+    with conn as c:
+        taken = snapshot.taken_at(c)
+        if taken:
+            print(f"snapshot {args.db}: {taken} UTC", file=sys.stderr)
+        k = compute(c, args.since, rollups=args.rollups)
+        if args.rollups and args.daily:
+            k["daily"] = daily(c, args.daily)
+
+    if args.json:
+        print(json.dumps(k, ensure_ascii=False, indent=2))
+        return
+    print_report(k)
+    for d in k.get("daily", []):
+        print(f"  {d['day']} {d['event_name']:<24} {d['events']:>8} events {d['users']:>6} users")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,37 @@
+import asyncio
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Optional
 
 from telegram import Update
 from telegram.ext import (
     Application, CallbackQueryHandler, CommandHandler, ConversationHandler,
     ContextTypes, MessageHandler, filters
 )
+from telegram.request import BaseRequest
 
 import texts
 import keyboards as kb
+import archive
+import backtest
+import bill_import
+import snapshot
 from analytics import make_analysis, savings_calc
-from config import get_token, APP_VERSION
-from db import DB
+from broadcast import Broadcaster, format_status
+from concurrency import PerUserUpdateProcessor
+from config import (
+    get_token, get_webhook_config, APP_VERSION, KPI_ROLLUP_INTERVAL_SEC, MAX_CONCURRENT_UPDATES,
+    SAVINGS_BACKTEST_HOUR_UTC, REMINDER_INTERVAL_DAYS, REMINDER_TICK_SEC, BROADCAST_RESUME_SEC,
+    EVENTS_RETENTION_DAYS, EVENTS_ARCHIVE_DIR, EVENTS_ARCHIVE_HOUR_UTC, get_operator_ids, get_metrics_port,
+    get_sql_profile_ms, get_bot_api_url,
+    PERSISTENCE_INTERVAL_SEC, SNAPSHOT_PATH, SNAPSHOT_INTERVAL_SEC
+)
+from db import DB, AsyncDB
+from metrics import Metrics, TimedRequest, instrument_app, instrument_db, serve
+from outbound import OutboundRateLimiter
+from persistence import SQLitePersistence
+from sqlprofile import QueryProfiler
+from reminders import ReminderScheduler
 from utils import (
     Period, clamp_reasonable_kwh, clamp_reasonable_money,
     parse_custom_period, parse_one_or_two_numbers,
@@ -19,7 +39,14 @@ from utils import (
 )
 
 # ---------- DB ----------
-db = DB("data.db")
+_sql_profile_ms = get_sql_profile_ms()
+db = AsyncDB(DB(  # хендлеры ждут БД через await, не блокируя polling
+    "data.db", profiler=QueryProfiler(slow_ms=_sql_profile_ms) if _sql_profile_ms is not None else None
+))
+metrics = Metrics()  # /stats и /metrics; хендлеры оборачиваются в build_app
+instrument_db(db, metrics)
+broadcaster = Broadcaster(db)
+reminder_scheduler = ReminderScheduler(db, interval=timedelta(days=REMINDER_INTERVAL_DAYS))
 
 # ---------- FSM states ----------
 (
@@ -32,6 +59,7 @@ db = DB("data.db")
     S_SAVINGS_PERIOD, S_SAVINGS_PERIOD_CUSTOM, S_SAVINGS_VALMODE, S_SAVINGS_VALUES, S_SAVINGS_TARIFF,
     S_FEEDBACK_COMMENT
 ) = range(27)
+STATE_NAMES = {v: k for k, v in list(globals().items()) if k.startswith("S_") and isinstance(v, int)}
 
 def _session_id(context: ContextTypes.DEFAULT_TYPE) -> str:
     sid = context.user_data.get("session_id")
@@ -45,7 +73,7 @@ def _state_name(state: int) -> str:
 
 async def log_evt(update: Update, context: ContextTypes.DEFAULT_TYPE, event: str, payload=None, command=None, is_demo=0):
     user_id = update.effective_user.id
-    db.log_event(
+    await db.log_event(
         user_id=user_id,
         session_id=_session_id(context),
         state=_state_name(context.user_data.get("state", S_IDLE)),
@@ -56,8 +84,8 @@ async def log_evt(update: Update, context: ContextTypes.DEFAULT_TYPE, event: str
         app_version=APP_VERSION
     )
 
-def user_profile(user_id: int) -> dict:
-    return db.get_user(user_id) or {}
+async def user_profile(user_id: int) -> dict:
+    return await db.get_user(user_id) or {}
 
 def is_onboarded(profile: dict) -> bool:
     return bool(profile.get("city") and profile.get("home_type") and profile.get("heating") and profile.get("people") is not None)
@@ -80,11 +108,103 @@ async def cmd_privacy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(texts.PRIVACY_TEXT, reply_markup=kb.kb_privacy_actions())
     await log_evt(update, context, "command_used", command="/privacy")
 
+async def cmd_saved(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    s = await db.get_savings_summary(update.effective_user.id)
+    if not s:
+        await update.message.reply_text(
+            "Пока нечего суммировать: сделайте /analyze, а после мер — расчёт экономии.",
+            reply_markup=kb.kb_menu()
+        )
+    else:
+        lines = [f"Расчётов экономии: {s['n']}", f"Всего ≈ {s['delta_kwh']:.0f} кВт*ч"]
+        if s["delta_money"] is not None:
+            lines.append(f"≈ {s['delta_money']:.0f} ₸ (по вашему тарифу)")
+        lines.append(
+            f"Последний: {s['last_before_per_day']:.1f} → {s['last_after_per_day']:.1f} кВт*ч/день "
+            f"({-s['last_pct']:+.0f}%)"
+        )
+        await update.message.reply_text("\n".join(lines), reply_markup=kb.kb_menu())
+    await log_evt(update, context, "command_used", command="/saved")
+
+# ---------- Импорт истории счетов (CSV/XLSX документом) ----------
+MAX_IMPORT_BYTES = 2 * 1024 * 1024
+
+async def doc_import(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    await db.upsert_user(user_id, update.effective_chat.id)
+    doc = update.message.document
+    if doc.file_size and doc.file_size > MAX_IMPORT_BYTES:
+        await update.message.reply_text("Файл слишком большой (до 2 МБ).")
+        return
+    f = await doc.get_file()
+    data = bytes(await f.download_as_bytearray())
+    try:
+        res = await asyncio.to_thread(bill_import.parse_file, doc.file_name, data)
+    except ValueError as e:
+        await update.message.reply_text(f"Не удалось прочитать файл: {e}")
+        return
+    inserted, baseline = await db.import_bills(user_id, res.bills)
+    await update.message.reply_text(bill_import.summary_text(res, inserted, baseline), reply_markup=kb.kb_menu())
+    await log_evt(update, context, "bills_imported",
+                  payload={"rows": res.rows, "inserted": inserted, "errors": len(res.errors)})
+
+# ---------- Операторы (доступ ограничен filters.User в build_app) ----------
+async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    parts = (update.message.text or "").split(maxsplit=1)
+    if len(parts) < 2:
+        await update.message.reply_text("Формат: /broadcast текст рассылки")
+        return
+    broadcast_id, total = await broadcaster.create(parts[1], created_by=update.effective_user.id)
+    await update.message.reply_text(f"Рассылка #{broadcast_id}: {total} получателей, отправляю.")
+    broadcaster.spawn(context.bot, broadcast_id)
+
+async def cmd_broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    jobs = await db.list_broadcasts(limit=5)
+    await update.message.reply_text("\n".join(map(format_status, jobs)) or "Рассылок ещё не было.")
+
+async def cmd_broadcast_pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /broadcast_pause ID — остановить после текущей пачки; /broadcast_resume ID — продолжить
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Формат: /broadcast_pause ID")
+        return
+    broadcast_id = int(context.args[0])
+    resume = update.message.text.startswith("/broadcast_resume")
+    ok = await db.set_broadcast_status(broadcast_id, "running" if resume else "paused")
+    if ok and resume:
+        broadcaster.spawn(context.bot, broadcast_id)
+    await update.message.reply_text("Готово." if ok else "Нет такой активной рассылки.")
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(metrics.summary())
+
+async def cmd_sqlprof(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /sqlprof — отчёт; /sqlprof on [мс] — включить; /sqlprof off — выключить; /sqlprof reset — обнулить
+    arg = context.args[0] if context.args else ""
+    if arg == "on":
+        try:
+            slow_ms = float(context.args[1]) if len(context.args) > 1 else 50.0
+        except ValueError:
+            await update.message.reply_text("Формат: /sqlprof on 50")
+            return
+        db.db.set_profiler(QueryProfiler(slow_ms=slow_ms))
+        await update.message.reply_text(f"Профайлер SQL включён, медленные запросы — от {slow_ms:g} мс.")
+        return
+    profiler = db.db.profiler
+    if profiler is None:
+        await update.message.reply_text("Профайлер SQL выключен: /sqlprof on [мс]")
+        return
+    if arg == "off":
+        db.db.set_profiler(None)
+    report = profiler.report(n=10)
+    if arg == "reset":
+        profiler.reset()
+    await update.message.reply_text(report[:4000])
+
 async def cb_privacy_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
     user_id = update.effective_user.id
-    db.reset_user_data(user_id)
+    await db.reset_user_data(user_id)
     await q.edit_message_text("Готово: данные сброшены.", reply_markup=kb.kb_menu())
     await log_evt(update, context, "privacy_reset")
 
@@ -93,7 +213,7 @@ async def start_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     print(f"START: uid={user_id} chat={chat_id} username={update.effective_user.username}")
-    db.upsert_user(user_id, chat_id)
+    await db.upsert_user(user_id, chat_id)
 
     context.user_data["state"] = S_ONB_CITY
     await update.message.reply_text(texts.START_TEXT)
@@ -104,9 +224,9 @@ async def start_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def analyze_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
-    db.upsert_user(user_id, chat_id)
+    await db.upsert_user(user_id, chat_id)
 
-    profile = user_profile(user_id)
+    profile = await user_profile(user_id)
     if not is_onboarded(profile):
         # мягко уходим в онбординг
         context.user_data["state"] = S_ONB_CITY
@@ -124,9 +244,9 @@ async def analyze_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def savings_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
-    db.upsert_user(user_id, chat_id)
+    await db.upsert_user(user_id, chat_id)
 
-    profile = user_profile(user_id)
+    profile = await user_profile(user_id)
     if not is_onboarded(profile):
         context.user_data["state"] = S_ONB_CITY
         await update.message.reply_text("Сначала короткий онбординг (до 1 минуты).")
@@ -151,9 +271,8 @@ async def demo_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Контекст: холоднее = да, бойлер = да",
         "Результат: рост ~+36% по кВт*ч, причины: отопление/бойлер, Top-3: таймер, бойлер 55–60°C, уплотнение окон."
     ]
-    for m in msgs:
-        await update.message.reply_text(m)
-    await update.message.reply_text(texts.MENU_TEXT, reply_markup=kb.kb_menu())
+    # одним сообщением: шесть reply_text подряд — шесть вызовов API и лимит чата
+    await update.message.reply_text("\n\n".join(msgs + [texts.MENU_TEXT]), reply_markup=kb.kb_menu())
     return ConversationHandler.END
 
 async def feedback_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -234,42 +353,44 @@ async def cb_onb(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data["state"] = S_ONB_CITY_TEXT
             await q.edit_message_text("Введите город текстом (2–40 символов).", reply_markup=kb.kb_back_menu())
             return S_ONB_CITY_TEXT
-        db.set_user_profile(user_id, city=city)
+        await db.set_user_profile(user_id, city=city)
         context.user_data["state"] = S_ONB_HOME
         await q.edit_message_text(texts.ASK_HOME, reply_markup=kb.kb_home())
         return S_ONB_HOME
 
     if data.startswith("onb:home:"):
         home = data.split(":")[-1]
-        db.set_user_profile(user_id, home_type=home)
+        await db.set_user_profile(user_id, home_type=home)
         context.user_data["state"] = S_ONB_HEAT
         await q.edit_message_text(texts.ASK_HEATING, reply_markup=kb.kb_heating())
         return S_ONB_HEAT
 
     if data.startswith("onb:heat:"):
         heat = data.split(":")[-1]
-        db.set_user_profile(user_id, heating=heat)
+        await db.set_user_profile(user_id, heating=heat)
         context.user_data["state"] = S_ONB_PEOPLE
         await q.edit_message_text(texts.ASK_PEOPLE, reply_markup=kb.kb_people())
         return S_ONB_PEOPLE
 
     if data.startswith("onb:people:"):
         ppl = data.split(":")[-1]
-        db.set_user_profile(user_id, people=ppl)
+        await db.set_user_profile(user_id, people=ppl)
         context.user_data["state"] = S_ONB_TARIFF
         await q.edit_message_text(texts.ASK_KNOWS_TARIFF, reply_markup=kb.kb_yes_no("onb:tariff"))
         return S_ONB_TARIFF
 
     if data.startswith("onb:tariff:"):
         ans = data.split(":")[-1]
-        db.set_user_profile(user_id, knows_tariff=1 if ans == "yes" else 0)
+        await db.set_user_profile(user_id, knows_tariff=1 if ans == "yes" else 0)
         context.user_data["state"] = S_ONB_REMIND
         await q.edit_message_text(texts.ASK_REMINDERS, reply_markup=kb.kb_yes_no("onb:remind"))
         return S_ONB_REMIND
 
     if data.startswith("onb:remind:"):
         ans = data.split(":")[-1]
-        db.set_user_profile(user_id, reminders=1 if ans == "yes" else 0)
+        on = ans == "yes"
+        await db.set_user_profile(user_id, reminders=1 if on else 0,
+                                  next_due_at=reminder_scheduler.first_due() if on else None)
         context.user_data["state"] = S_IDLE
         await q.edit_message_text("Готово ✅", reply_markup=kb.kb_menu())
         await log_evt(update, context, "onboarding_done")
@@ -283,7 +404,7 @@ async def onb_city_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(txt) < 2 or len(txt) > 40:
         await update.message.reply_text("Похоже на некорректный ввод. Напишите город (2–40 символов).")
         return S_ONB_CITY_TEXT
-    db.set_user_profile(user_id, city=txt)
+    await db.set_user_profile(user_id, city=txt)
     context.user_data["state"] = S_ONB_HOME
     await update.message.reply_text(texts.ASK_HOME, reply_markup=kb.kb_home())
     return S_ONB_HOME
@@ -450,7 +571,7 @@ async def values_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if state == S_SAVINGS_VALUES:
         context.user_data["second_values"] = {"kwh": kwh, "money": money}
         # если есть kWh и пользователь знает тариф — спросим тариф для денег
-        prof = user_profile(update.effective_user.id)
+        prof = await user_profile(update.effective_user.id)
         if prof.get("knows_tariff") == 1 and kwh is not None:
             context.user_data["state"] = S_SAVINGS_TARIFF
             await update.message.reply_text("Введите тариф ₸ за кВт*ч (например: 25). Или напишите 0, чтобы пропустить.")
@@ -515,7 +636,7 @@ async def cb_ctx(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def do_analysis_from_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     user_id = update.effective_user.id
-    prof = user_profile(user_id)
+    prof = await user_profile(user_id)
 
     cur_p = context.user_data.get("cur_period")
     cur_v = context.user_data.get("cur_values", {})
@@ -525,13 +646,13 @@ async def do_analysis_from_context(update: Update, context: ContextTypes.DEFAULT
 
     # Сохраним в БД (для MVP — фиксируем как current/prev)
     if cur_p:
-        db.save_bill(
+        await db.save_bill(
             user_id, "current",
             cur_p["start"], cur_p["end"], cur_p["days"],
             cur_v.get("kwh"), cur_v.get("money"), None
         )
     if prev_p and prev_v and (prev_v.get("kwh") is not None or prev_v.get("money") is not None):
-        db.save_bill(
+        await db.save_bill(
             user_id, "prev",
             prev_p["start"], prev_p["end"], prev_p["days"],
             prev_v.get("kwh"), prev_v.get("money"), None
@@ -576,7 +697,7 @@ async def cb_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
         top3 = context.user_data.get("last_top3") or []
         if 0 <= idx < len(top3):
             title = top3[idx][0]
-            db.add_action_done(user_id, f"top3_{idx+1}:{title}")
+            await db.add_action_done(user_id, f"top3_{idx+1}:{title}")
             await q.edit_message_text(f"Отмечено ✅: {title}\n\n{texts.MENU_TEXT}", reply_markup=kb.kb_menu())
             await log_evt(update, context, "action_marked_done", payload={"idx": idx+1, "title": title})
             return S_IDLE
@@ -599,9 +720,9 @@ async def savings_tariff_text(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def do_savings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    prof = user_profile(user_id)
+    prof = await user_profile(user_id)
 
-    current = db.get_latest_bill(user_id, "current")
+    current = await db.get_latest_bill(user_id, "current")
     if not current or current.get("kwh") is None:
         await update.message.reply_text(
             "Для savings нужен базовый период с кВт*ч. Сначала сделайте /analyze и введите кВт*ч.",
@@ -617,7 +738,7 @@ async def do_savings(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     tariff = context.user_data.get("tariff")
     # сохраним second
-    db.save_bill(
+    second_id = await db.save_bill(
         user_id, "second",
         second_p["start"], second_p["end"], second_p["days"],
         second_v.get("kwh"), second_v.get("money"), tariff
@@ -633,6 +754,7 @@ async def do_savings(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(out["msg"], reply_markup=kb.kb_menu())
         return S_IDLE
 
+    await db.save_savings_result(second_id, user_id, current["id"], out)
     pct = out["pct"]
     delta_kwh = out["delta_kwh"]
     msg_lines = []
@@ -673,9 +795,76 @@ async def feedback_comment_text(update: Update, context: ContextTypes.DEFAULT_TY
     await log_evt(update, context, "feedback_submitted", payload={"star": star, "comment": comment[:400]})
     return S_IDLE
 
+# Хендлеры бота реагируют только на сообщения и нажатия inline-кнопок
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# ---------- Jobs ----------
+@metrics.timed("bot_job_seconds")
+async def job_kpi_rollup(context: ContextTypes.DEFAULT_TYPE):
+    # дописываем дневные KPI-роллапы только по новым событиям (см. DB.refresh_rollups)
+    await db.refresh_rollups()
+
+@metrics.timed("bot_job_seconds")
+async def job_broadcasts(context: ContextTypes.DEFAULT_TYPE):
+    # подхватываем рассылки из CLI и прерванные рестартом
+    await broadcaster.resume_all(context.bot)
+
+@metrics.timed("bot_job_seconds")
+async def job_savings_backtest(context: ContextTypes.DEFAULT_TYPE):
+    # полный пересчёт savings_results в отдельном потоке со своим соединением
+    await asyncio.to_thread(backtest.run, db.db)
+
+@metrics.timed("bot_job_seconds")
+async def job_archive_events(context: ContextTypes.DEFAULT_TYPE):
+    # старые события -> помесячные архивы, короткими пачками между записями бота;
+    # роллапы — через общий писатель AsyncDB, архив переносит только учтённое в них
+    await db.refresh_rollups()
+    await asyncio.to_thread(archive.archive_events, db.db, EVENTS_RETENTION_DAYS, EVENTS_ARCHIVE_DIR)
+
+@metrics.timed("bot_job_seconds")
+async def job_snapshot(context: ContextTypes.DEFAULT_TYPE):
+    # копия для KPI и выгрузок (snapshot.py): бэкап мелкими шагами в потоке, писатель не ждёт
+    await asyncio.to_thread(snapshot.take_snapshot, db.db.path, SNAPSHOT_PATH)
+
 # ---------- Build app ----------
-def build_app() -> Application:
-    app = Application.builder().token(get_token()).build()
+async def on_init(app: Application):
+    port = get_metrics_port()
+    if port is not None:
+        app.bot_data["metrics_server"] = await serve(metrics, port=port)
+
+async def on_stop(app: Application):
+    # бот ещё инициализирован: прерываем рассылки, они продолжатся с чекпоинта
+    await broadcaster.stop()
+
+async def on_shutdown(app: Application):
+    server = app.bot_data.pop("metrics_server", None)
+    if server is not None:
+        server.close()
+    # дописываем буфер событий и закрываем соединения
+    await db.close()
+
+def build_app(request: Optional[BaseRequest] = None) -> Application:
+    # request — транспорт Bot API (по умолчанию HTTPX); бенчмарки подставляют офлайн-фейк
+    limiter = OutboundRateLimiter()
+    builder = Application.builder()
+    api_url = get_bot_api_url()
+    if api_url is not None:
+        builder.base_url(api_url)
+    app = (
+        builder
+        .token(get_token())
+        .persistence(SQLitePersistence(db, update_interval=PERSISTENCE_INTERVAL_SEC))
+        # разные пользователи параллельно, апдейты одного пользователя — строго по очереди
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        # все исходящие — через лимиты Telegram (30/с, по чатам), ответы впереди рассылок
+        .rate_limiter(limiter)
+        # время каждого вызова Bot API — в metrics (bot_api_seconds)
+        .request(TimedRequest(metrics, request))
+        .post_init(on_init)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     conv = ConversationHandler(
         entry_points=[
@@ -740,25 +929,68 @@ def build_app() -> Application:
         fallbacks=[
             CommandHandler("help", cmd_help),
             CommandHandler("privacy", cmd_privacy),
+            CommandHandler("saved", cmd_saved),
             CallbackQueryHandler(cb_nav, pattern=r"^nav:"),
             CallbackQueryHandler(cb_privacy_reset, pattern=r"^privacy:reset$"),
         ],
         allow_reentry=True,
+        name="main",
+        persistent=True,  # состояние диалога переживает рестарт (SQLitePersistence)
         per_message=False,  # важно для callback-кнопок в ConversationHandler, чтобы не ловить warning
     )
 
     app.add_handler(CommandHandler("help", cmd_help))
     app.add_handler(CommandHandler("privacy", cmd_privacy))
+    app.add_handler(CommandHandler("saved", cmd_saved))
+    app.add_handler(MessageHandler(
+        filters.Document.FileExtension("csv") | filters.Document.FileExtension("xlsx"), doc_import
+    ))
+    operators = filters.User(user_id=get_operator_ids())
+    app.add_handler(CommandHandler("broadcast", cmd_broadcast, filters=operators))
+    app.add_handler(CommandHandler("broadcast_status", cmd_broadcast_status, filters=operators))
+    app.add_handler(CommandHandler(["broadcast_pause", "broadcast_resume"], cmd_broadcast_pause, filters=operators))
+    app.add_handler(CommandHandler("stats", cmd_stats, filters=operators))
+    app.add_handler(CommandHandler("sqlprof", cmd_sqlprof, filters=operators))
     app.add_handler(conv)
 
     app.add_handler(CallbackQueryHandler(cb_privacy_reset, pattern=r"^privacy:reset$"))
 
+    app.job_queue.run_repeating(job_kpi_rollup, interval=KPI_ROLLUP_INTERVAL_SEC, first=30)
+    app.job_queue.run_repeating(metrics.timed("bot_job_seconds", fn="reminders")(reminder_scheduler.job), interval=REMINDER_TICK_SEC, first=REMINDER_TICK_SEC,
+                               name="reminders")
+    app.job_queue.run_repeating(job_broadcasts, interval=BROADCAST_RESUME_SEC, first=5)
+    app.job_queue.run_daily(job_savings_backtest, time=dtime(SAVINGS_BACKTEST_HOUR_UTC, tzinfo=timezone.utc))
+    app.job_queue.run_daily(job_archive_events, time=dtime(EVENTS_ARCHIVE_HOUR_UTC, tzinfo=timezone.utc))
+    app.job_queue.run_repeating(job_snapshot, interval=SNAPSHOT_INTERVAL_SEC, first=60)
+
+    instrument_app(app, metrics, STATE_NAMES)
+    metrics.gauge("bot_outbound_queued", lambda: limiter.stats()["queued"], "Исходящие, ждущие глобального слота")
+    # рост памяти диалогов на длинных прогонах (benchmarks/soak.py)
+    metrics.gauge("bot_user_data_users", lambda: len(app.user_data), "Пользователей в context.user_data")
+    metrics.gauge("bot_user_data_keys", lambda: sum(len(d) for d in app.user_data.values()),
+                  "Ключей во всех context.user_data")
+
     return app
 
 def main():
     app = build_app()
-    print("Bot started.")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    webhook = get_webhook_config()
+    if webhook is None:
+        print("Bot started (polling).")
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
+        return
+
+    # Telegram сам доставляет апдейты; PTB проверяет secret token и кладёт их в update_queue.
+    # По SIGINT/SIGTERM сервер перестаёт принимать запросы, а очередь дорабатывается до конца.
+    print(f"Bot started (webhook {webhook.webhook_url}, listen {webhook.listen}:{webhook.port}).")
+    app.run_webhook(
+        listen=webhook.listen,
+        port=webhook.port,
+        url_path=webhook.path,
+        webhook_url=webhook.webhook_url,
+        secret_token=webhook.secret,
+        allowed_updates=ALLOWED_UPDATES,
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,369 @@
+"""
+Метрики бота в памяти процесса: гистограммы задержек хендлеров (по хендлеру и состоянию
+диалога), время в БД и в Bot API, счётчики апдейтов и ошибок, глубина очередей, кэш users.
+
+    metrics = Metrics()
+    app = Application.builder()...request(TimedRequest(metrics)).build()
+    instrument_app(app, metrics, state_names={0: "S_IDLE", ...})   # после add_handler
+    instrument_db(db, metrics)                                      # AsyncDB
+
+    @metrics.timed("bot_job_seconds")
+    async def job_x(context): ...
+
+Снаружи: metrics.render() — текстовый формат Prometheus (serve() отдаёт его по HTTP на
+локальном порту), metrics.summary() — короткий текст для /stats.
+
+Горячий путь — два perf_counter и bisect по ~15 границам; объекты гистограмм создаются
+при инструментировании, а не на каждый апдейт. Всё, кроме времени выполнения в БД
+(поток-писатель AsyncDB — единственный, кто пишет эту гистограмму), меняется в event loop,
+поэтому блокировок нет.
+"""
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ConversationHandler
+from telegram.request import BaseRequest, HTTPXRequest
+
+# границы корзин, секунды (+Inf добавляется сама)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CACHE_PREFIX = "bot_user_cache_"  # gauge кэша users: в /stats отдельной строкой, не в «Очереди»
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # оценка по корзинам (линейно внутри корзины), как histogram_quantile в Prometheus
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lo = self.buckets[i - 1] if i else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+class Metrics:
+    def __init__(self) -> None:
+        # имя -> (тип, help, {labels: Histogram | Counter | функция-gauge})
+        self._families: Dict[str, Tuple[str, str, Dict[Labels, object]]] = {}
+        self.started = time.time()
+
+    def _get(self, kind: str, name: str, help_: str, labels: Dict[str, str], make):
+        fam = self._families.get(name)
+        if fam is None:
+            fam = self._families[name] = (kind, help_, {})
+        key = tuple(sorted(labels.items()))
+        obj = fam[2].get(key)
+        if obj is None:
+            obj = fam[2][key] = make()
+        return obj
+
+    def histogram(self, name: str, help_: str = "", **labels) -> Histogram:
+        return self._get("histogram", name, help_, labels, Histogram)
+
+    def counter(self, name: str, help_: str = "", **labels) -> Counter:
+        return self._get("counter", name, help_, labels, Counter)
+
+    def gauge(self, name: str, fn: Callable[[], float], help_: str = "", **labels) -> None:
+        # значение считается при чтении (размер очереди и т.п.)
+        self._get("gauge", name, help_, labels, lambda: fn)
+
+    def timed(self, name: str, **labels):
+        """
+        Декоратор для корутин: время выполнения в гистограмму name, исключения — в
+        счётчик <name без _seconds>_errors_total. Без labels подписывается именем функции.
+        """
+        def deco(fn):
+            lb = labels or {"fn": fn.__name__}
+            hist = self.histogram(name, **lb)
+            errors_name = name[:-len("_seconds")] if name.endswith("_seconds") else name
+            errors: Dict[str, Counter] = {}
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    err = type(e).__name__
+                    c = errors.get(err)
+                    if c is None:
+                        c = errors[err] = self.counter(f"{errors_name}_errors_total", error=err, **lb)
+                    c.inc()
+                    raise
+                finally:
+                    hist.observe(time.perf_counter() - t0)
+            return wrapper
+        return deco
+
+    # ---------- вывод ----------
+    def render(self) -> str:
+        """Текстовый формат Prometheus 0.0.4."""
+        out: List[str] = []
+        for name, (kind, help_, series) in sorted(self._families.items()):
+            if help_:
+                out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, obj in series.items():
+                if kind == "histogram":
+                    acc = 0
+                    for le, n in zip(obj.buckets + ("+Inf",), obj.counts):
+                        acc += n
+                        out.append(f"{name}_bucket{_fmt(labels + (('le', str(le)),))} {acc}")
+                    out.append(f"{name}_sum{_fmt(labels)} {obj.sum:.6f}")
+                    out.append(f"{name}_count{_fmt(labels)} {obj.count}")
+                elif kind == "counter":
+                    out.append(f"{name}{_fmt(labels)} {obj.value}")
+                else:
+                    out.append(f"{name}{_fmt(labels)} {obj()}")
+        return "\n".join(out) + "\n"
+
+    def series(self, name: str) -> Dict[Labels, object]:
+        fam = self._families.get(name)
+        return fam[2] if fam else {}
+
+    def summary(self, top: int = 8) -> str:
+        """Короткая сводка для /stats."""
+        up = int(time.time() - self.started)
+        lines = [f"⏱ Аптайм {up // 3600} ч {up % 3600 // 60} мин"]
+
+        updates = {dict(k).get("type"): c.value for k, c in self.series("bot_updates_total").items()}
+        if updates:
+            lines.append("Апдейты: " + ", ".join(f"{k} {v}" for k, v in sorted(updates.items())))
+        lines.append(_top("Хендлеры", _merge(self.series("bot_handler_seconds"), "handler"), top))
+        lines.append(_top("Состояния", _merge(self.series("bot_handler_seconds"), "state"), top))
+        for title, name in (("Апдейт целиком", "bot_update_seconds"), ("БД (выполнение)", "bot_db_seconds"),
+                            ("БД (ожидание потока)", "bot_db_queue_seconds"), ("Bot API", "bot_api_seconds")):
+            h = _merge(self.series(name), None).get(None)
+            if h is not None and h.count:
+                lines.append(f"{title}: n={h.count} avg {h.sum / h.count * 1000:.1f} мс "
+                             f"p95 {h.quantile(0.95) * 1000:.1f} мс")
+        errors = sum(c.value for n, (kind, _, s) in self._families.items()
+                     if n.endswith("errors_total") for c in s.values())
+        lines.append(f"Ошибок: {errors}")
+        cache = {n[len(CACHE_PREFIX):]: fn() for n, (kind, _, s) in self._families.items()
+                 if n.startswith(CACHE_PREFIX) for fn in s.values()}
+        if cache:
+            looked = cache.get("hits", 0) + cache.get("misses", 0)
+            rate = f"{cache.get('hits', 0) / looked * 100:.0f}%" if looked else "—"
+            lines.append(f"Кэш users: hit-rate {rate} ({cache.get('hits', 0):g}/{looked:g}), "
+                         f"строк {cache.get('size', 0):g}")
+        gauges = [f"{n} {fn():g}" for n, (kind, _, s) in sorted(self._families.items())
+                  if kind == "gauge" and not n.startswith(CACHE_PREFIX) for fn in s.values()]
+        if gauges:
+            lines.append("Очереди: " + ", ".join(gauges))
+        return "\n".join(line for line in lines if line)
+
+def _fmt(labels: Labels) -> str:
+    if not labels:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, esc)) + "}"
+
+def _merge(series: Dict[Labels, Histogram], by: Optional[str]) -> Dict[Optional[str], Histogram]:
+    # сложить гистограммы серий по одной метке (by=None — всё в одну)
+    out: Dict[Optional[str], Histogram] = {}
+    for labels, h in series.items():
+        key = dict(labels).get(by) if by else None
+        m = out.get(key)
+        if m is None:
+            m = out[key] = Histogram(h.buckets)
+        m.counts = [a + b for a, b in zip(m.counts, h.counts)]
+        m.sum += h.sum
+        m.count += h.count
+    return out
+
+def _top(title: str, hists: Dict[Optional[str], Histogram], top: int) -> str:
+    rows = sorted(((k, h) for k, h in hists.items() if h.count), key=lambda kh: -kh[1].quantile(0.95))
+    if not rows:
+        return ""
+    lines = [f"{title} (p95 / n):"]
+    for k, h in rows[:top]:
+        lines.append(f"  {k}: {h.quantile(0.95) * 1000:.1f} мс / {h.count}")
+    return "\n".join(lines)
+
+# ---------- инструментирование ----------
+def _wrap_handlers(metrics: Metrics, handlers, state: str) -> None:
+    for h in handlers:
+        if isinstance(h, ConversationHandler):
+            continue
+        name = getattr(h.callback, "__name__", type(h).__name__)
+        h.callback = metrics.timed("bot_handler_seconds", handler=name, state=state)(h.callback)
+
+def instrument_app(app: Application, metrics: Metrics, state_names: Optional[Dict[object, str]] = None) -> None:
+    """
+    Вызывать после всех add_handler. Оборачивает колбэки хендлеров (в т.ч. внутри
+    ConversationHandler — с меткой состояния), считает апдейты и время апдейта целиком
+    (с ожиданием своей очереди) в update processor.
+    """
+    state_names = state_names or {}
+    for group in list(app.handlers.values()):
+        for h in group:
+            if isinstance(h, ConversationHandler):
+                _wrap_handlers(metrics, h.entry_points, "entry")
+                for st, hs in h.states.items():
+                    _wrap_handlers(metrics, hs, state_names.get(st, str(st)))
+                _wrap_handlers(metrics, h.fallbacks, "fallback")
+            else:
+                _wrap_handlers(metrics, [h], "-")
+
+    proc = app.update_processor
+    process = proc.do_process_update
+    total = metrics.histogram("bot_update_seconds", "Апдейт от очереди до конца обработки")
+    counters: Dict[str, Counter] = {}
+    in_progress = [0]
+
+    # апдейты считаются здесь, а не TypeHandler'ом в группе -1: лишняя группа — это ещё один
+    # CallbackContext на каждый апдейт, ~12% CPU обработки (benchmarks/bench_metrics.py)
+    async def timed_process(update, coroutine):
+        kind = ("callback_query" if update.callback_query else "message" if update.message else "other") \
+            if isinstance(update, Update) else type(update).__name__
+        c = counters.get(kind)
+        if c is None:
+            c = counters[kind] = metrics.counter("bot_updates_total", "Входящие апдейты", type=kind)
+        c.inc()
+        t0 = time.perf_counter()
+        in_progress[0] += 1
+        try:
+            await process(update, coroutine)
+        finally:
+            in_progress[0] -= 1
+            total.observe(time.perf_counter() - t0)
+
+    proc.do_process_update = timed_process
+    metrics.gauge("bot_updates_in_progress", lambda: in_progress[0], "Апдейты в обработке и в очереди пользователя")
+    metrics.gauge("bot_update_queue", app.update_queue.qsize, "Апдейты, ещё не взятые в обработку")
+
+def instrument_db(adb, metrics: Metrics) -> None:
+    """
+    AsyncDB: время выполнения каждого метода в потоке-писателе и ожидание этого потока.
+    """
+    run = adb.run
+    execs: Dict[str, Histogram] = {}
+    queue = metrics.histogram("bot_db_queue_seconds", "Ожидание потока-писателя БД")
+    inflight = [0]
+
+    async def timed_run(fn, *args, **kwargs):
+        name = getattr(fn, "__name__", "call")
+        h = execs.get(name)
+        if h is None:
+            h = execs[name] = metrics.histogram("bot_db_seconds", "Выполнение метода DB", method=name)
+        t_submit = time.perf_counter()
+        started = []
+
+        def call():
+            t0 = time.perf_counter()
+            started.append(t0)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                h.observe(time.perf_counter() - t0)
+
+        inflight[0] += 1
+        try:
+            return await run(call)
+        finally:
+            inflight[0] -= 1
+            if started:
+                queue.observe(started[0] - t_submit)
+
+    adb.run = timed_run
+    metrics.gauge("bot_db_inflight", lambda: inflight[0], "Вызовы БД в работе и в очереди")
+    # кэш строк users (DB.users): читается из любого потока, у UserCache свой lock
+    for key, help_ in (("hits", "Попадания в кэш users"), ("misses", "Промахи кэша users"),
+                       ("size", "Строк в кэше users")):
+        metrics.gauge(CACHE_PREFIX + key, lambda key=key: adb.db.cache_stats()[key], help_)
+
+class TimedRequest(BaseRequest):
+    """
+    Обёртка над транспортом бота (по умолчанию HTTPXRequest, как у ApplicationBuilder):
+    время каждого вызова Bot API без ожидания rate limiter'а — в bot_api_seconds{method=...},
+    ответы не 2xx и сетевые ошибки — в bot_api_errors_total.
+    """
+    def __init__(self, metrics: Metrics, inner: Optional[BaseRequest] = None) -> None:
+        self.inner = inner or HTTPXRequest(connection_pool_size=256)
+        self._metrics = metrics
+        self._hists: Dict[str, Histogram] = {}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.inner.read_timeout
+
+    async def initialize(self) -> None:
+        await self.inner.initialize()
+
+    async def shutdown(self) -> None:
+        await self.inner.shutdown()
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        # .../bot<token>/sendMessage -> sendMessage; скачивание файлов — одной меткой
+        endpoint = "file" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+        h = self._hists.get(endpoint)
+        if h is None:
+            h = self._hists[endpoint] = self._metrics.histogram("bot_api_seconds", "Вызов Bot API", method=endpoint)
+        t0 = time.perf_counter()
+        try:
+            code, payload = await self.inner.do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            self._metrics.counter("bot_api_errors_total", method=endpoint, error=type(e).__name__).inc()
+            raise
+        finally:
+            h.observe(time.perf_counter() - t0)
+        if code >= 300:
+            self._metrics.counter("bot_api_errors_total", method=endpoint, error=str(code)).inc()
+        return code, payload
+
+# ---------- HTTP ----------
+async def serve(metrics: Metrics, host: str = "127.0.0.1", port: int = 9108) -> asyncio.AbstractServer:
+    """
+    Минимальный HTTP-сервер в том же event loop: GET /metrics -> metrics.render().
+    Слушает только локальный адрес по умолчанию; закрывать через server.close().
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+            if path.split(b"?")[0] == b"/metrics":
+                body, status = metrics.render().encode(), "200 OK"
+            else:
+                body, status = b"not found\n", "404 Not Found"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,259 @@
+"""
+Исходящие запросы к Bot API через общий конвейер (telegram.ext.BaseRateLimiter):
+
+- глобальный token bucket (30 сообщений/с) и свой bucket на каждый чат
+  (личка ~1/с с небольшим запасом, группы 20/мин);
+- две полосы приоритета: INTERACTIVE (ответы на апдейты, по умолчанию) и BULK
+  (напоминания, рассылки) — bulk получает глобальный слот, только когда нет interactive;
+- RetryAfter: весь конвейер ставится на паузу на retry_after, запрос повторяется;
+- склейка: sendMessage, ещё ждущий слота своего чата, поглощает следующие sendMessage
+  в тот же чат (тексты через пустую строку) — один вызов API вместо нескольких.
+
+Запросы без chat_id (answerCallbackQuery, getMe, ...) идут без ограничений.
+
+    app = Application.builder().token(...).rate_limiter(OutboundRateLimiter()).build()
+    await bot.send_message(chat_id, text, rate_limit_args=BULK)
+"""
+import asyncio
+import itertools
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from telegram.error import NetworkError, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+MAX_TEXT = 4096  # лимит длины сообщения Telegram
+JOIN = "\n\n"
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        # сколько ждать до свободного токена (0 — есть прямо сейчас)
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def reserve(self) -> float:
+        # занять токен в долг (FIFO): вернёт, сколько ждать своей очереди
+        wait = self.delay()
+        self.tokens -= 1
+        return wait
+
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+class _Redispatch(Exception):
+    # лидер склейки отменён до отправки: склеенные отправляют свои тексты сами
+    pass
+
+class _Pending:
+    # sendMessage, который ещё не ушёл и может поглотить следующие сообщения в тот же чат
+    __slots__ = ("data", "lane", "result", "merged", "sending")
+
+    def __init__(self, data: Dict, lane: int) -> None:
+        self.data = data
+        self.lane = lane
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.merged = 0
+        self.sending = False
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        # будит склеенных: результат общего вызова или его ошибка (без склеенных ждать некому).
+        # Отмена лидера не отменяет склеенных: до запроса они переотправляются,
+        # во время запроса доставка неизвестна — получают NetworkError
+        if not self.merged or self.result.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            if self.sending:
+                self.result.set_exception(NetworkError("merged message: sender cancelled during request"))
+            else:
+                self.result.set_exception(_Redispatch())
+        elif error is not None:
+            self.result.set_exception(error)
+        else:
+            self.result.set_result(result)
+
+class _Chat:
+    __slots__ = ("bucket", "open")
+
+    def __init__(self, bucket: TokenBucket) -> None:
+        self.bucket = bucket
+        self.open: Optional[_Pending] = None
+
+def _rest(data: Dict) -> Dict:
+    # параметры, которые у склеиваемых сообщений должны совпадать
+    return {k: v for k, v in data.items() if k not in ("text", "reply_markup")}
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    def __init__(self, global_rate: float = 30.0, global_burst: float = 1.0,
+                 private_rate: float = 1.0, private_burst: float = 3.0,
+                 group_rate: float = 20 / 60, group_burst: float = 3.0, max_retries: int = 3,
+                 max_chats: int = 10_000) -> None:
+        # глобально без запаса: иначе в первую секунду уходит burst + rate сообщений
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.private = (private_rate, private_burst)
+        self.group = (group_rate, group_burst)
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats: Dict[Any, _Chat] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        if self._dispatcher is None:
+            self._queue = asyncio.PriorityQueue()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="outbound-dispatcher")
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "coalesced": self.coalesced, "retries": self.retries,
+                "queued": self._queue.qsize() if self._queue else 0}
+
+    # ---------- глобальная очередь ----------
+    async def _dispatch(self) -> None:
+        # выдаёт глобальные слоты по одному: сначала interactive, потом bulk
+        while True:
+            _, _, slot = await self._queue.get()
+            if slot.done():
+                continue
+            while True:
+                wait = max(self._paused_until - time.monotonic(), self.global_bucket.delay())
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.global_bucket.take()
+            if not slot.done():
+                slot.set_result(None)
+
+    async def _global_slot(self, lane: int) -> None:
+        if self._dispatcher is None:
+            await self.initialize()
+        slot = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((lane, next(self._seq), slot))
+        await slot
+
+    # ---------- чаты ----------
+    def _chat(self, chat_id) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= self.max_chats:
+                self._chats = {k: v for k, v in self._chats.items() if v.open or not v.bucket.idle()}
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            rate, burst = self.group if is_group else self.private
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, burst))
+        return chat
+
+    @staticmethod
+    def _can_merge(p: _Pending, data: Dict, lane: int) -> bool:
+        if p.lane != lane or p.data.get("reply_markup") is not None:
+            return False
+        if p.data.get("entities") or data.get("entities"):
+            return False
+        if len(p.data.get("text", "")) + len(JOIN) + len(data.get("text", "")) > MAX_TEXT:
+            return False
+        return _rest(p.data) == _rest(data)
+
+    # ---------- BaseRateLimiter ----------
+    async def process_request(self, callback, args, kwargs, endpoint: str, data: Dict[str, Any],
+                              rate_limit_args: Optional[int]):
+        lane = BULK if rate_limit_args == BULK else INTERACTIVE
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._call(callback, args, kwargs, lane, limited=False)
+
+        chat = self._chat(chat_id)
+        pending = None
+        if endpoint == "sendMessage":
+            p = chat.open
+            if p is not None and self._can_merge(p, data, lane):
+                p.data["text"] = p.data["text"] + JOIN + data["text"]
+                if data.get("reply_markup") is not None:
+                    p.data["reply_markup"] = data["reply_markup"]
+                p.merged += 1
+                self.coalesced += 1
+                try:
+                    return await asyncio.shield(p.result)
+                except _Redispatch:
+                    self.coalesced -= 1
+                    return await self.process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+            pending = chat.open = _Pending(data, lane)
+
+        result = error = None
+        try:
+            try:
+                wait = chat.bucket.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._global_slot(lane)
+            finally:
+                # начали отправку (или не отправим вовсе) — склеивать в это сообщение больше нельзя
+                if pending is not None and chat.open is pending:
+                    chat.open = None
+            if pending is not None:
+                pending.sending = True
+            result = await self._call(callback, args, kwargs, lane, limited=True)
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # склеенные ждут pending.result: отвечаем им на любом выходе, в т.ч. при отмене до отправки
+            if pending is not None:
+                pending.finish(result, error)
+
+    async def _call(self, callback, args, kwargs, lane: int, limited: bool):
+        attempt = 0
+        while True:
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = _seconds(e.retry_after)
+                # flood control у Telegram общий для бота — тормозим весь конвейер
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                log.warning("outbound: RetryAfter %.1fs (attempt %d)", delay, attempt)
+                await asyncio.sleep(delay)
+                if limited:
+                    await self._global_slot(lane)
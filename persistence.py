@@ -0,0 +1,115 @@
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db import AsyncDB
+from utils import json_dumps
+
+class SQLitePersistence(BasePersistence):
+    """
+    Хранит context.user_data и состояния ConversationHandler в той же data.db.
+    Write-behind: update_* только складывают изменения в память (одинаковые данные
+    пропускаются), а все изменения одного прохода Application пишутся одной транзакцией.
+    """
+    def __init__(self, db: AsyncDB, update_interval: float = 10) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = db
+        self._written: Dict[int, str] = {}  # последний записанный JSON по user_id
+        self._pending_users: Dict[int, Optional[str]] = {}
+        self._pending_states: Dict[Tuple[str, str], Optional[int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ---------- загрузка при старте ----------
+    async def get_user_data(self) -> Dict[int, dict]:
+        rows = await self.db.load_user_data()
+        self._written = dict(rows)
+        return {uid: json.loads(data) for uid, data in rows.items()}
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        rows = await self.db.load_conv_states(name)
+        return {tuple(json.loads(key)): state for key, state in rows.items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # ---------- изменения ----------
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        data_json = json_dumps(data)
+        if self._written.get(user_id) == data_json:
+            return
+        self._pending_users[user_id] = data_json
+        await self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = None
+        await self._schedule_flush()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._pending_states[(name, json_dumps(list(key)))] = new_state
+        await self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # ---------- запись ----------
+    async def _schedule_flush(self) -> None:
+        # Application вызывает update_* параллельно (asyncio.gather) — собираем их в одну запись
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+        await asyncio.shield(self._flush_task)
+
+    async def _flush_soon(self) -> None:
+        await asyncio.sleep(0)
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending_users and not self._pending_states:
+            return
+        users: List[Tuple[int, Optional[str]]] = list(self._pending_users.items())
+        states = [(name, key, state) for (name, key), state in self._pending_states.items()]
+        self._pending_users = {}
+        self._pending_states = {}
+
+        try:
+            await self.db.save_conv_data(users, states)
+        except Exception:
+            # вернём в очередь, не затирая более свежие изменения
+            for uid, data in users:
+                self._pending_users.setdefault(uid, data)
+            for name, key, state in states:
+                self._pending_states.setdefault((name, key), state)
+            raise
+        for uid, data in users:
+            if data is None:
+                self._written.pop(uid, None)
+            else:
+                self._written[uid] = data
@@ -0,0 +1,98 @@
+"""
+Напоминания подписанным пользователям (users.reminders, включается в онбординге).
+
+У каждого подписчика есть users.next_due_at (частичный индекс idx_users_next_due).
+Задача JobQueue раз в тик читает из индекса только наступившие напоминания пачками
+по keyset-курсору (next_due_at, user_id), отправляет их и переносит next_due_at вперёд —
+стоимость тика зависит от числа наступивших напоминаний, а не от размера users.
+
+Время и бот передаются снаружи, поэтому тик можно гонять с фейковыми часами и ботом:
+
+    sched = ReminderScheduler(db, clock=lambda: fake_now)
+    sent = await sched.tick(fake_bot)
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+import texts
+import keyboards as kb
+from outbound import BULK
+
+log = logging.getLogger(__name__)
+
+def utcnow() -> datetime:
+    # тот же формат, что DB._now: naive UTC
+    return datetime.utcnow()
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+class ReminderScheduler:
+    def __init__(self, db, interval: timedelta = timedelta(days=7),
+                 clock: Callable[[], datetime] = utcnow,
+                 batch_size: int = 500, max_per_tick: int = 1500) -> None:
+        self.db = db                      # AsyncDB
+        self.interval = interval
+        self.clock = clock
+        self.batch_size = batch_size
+        self.max_per_tick = max_per_tick  # ~50 с при 30 сообщ./с; остаток уйдёт в следующий тик
+
+    def first_due(self) -> str:
+        # next_due_at для только что подписавшегося пользователя
+        return _iso(self.clock() + self.interval)
+
+    async def tick(self, bot) -> int:
+        """
+        Отправляет наступившие напоминания, возвращает число отправленных.
+        При RetryAfter тик прерывается: неотправленные остаются в очереди до следующего тика.
+        """
+        now = self.clock()
+        now_s = _iso(now)
+        next_due = _iso(now + self.interval)
+        cursor: Tuple[str, int] = ("", 0)
+        sent = 0
+        seen = 0
+        while seen < self.max_per_tick:
+            rows = await self.db.due_reminders(now_s, cursor, min(self.batch_size, self.max_per_tick - seen))
+            if not rows:
+                break
+            seen += len(rows)
+            cursor = (rows[-1][0], rows[-1][1])
+            # пачка уходит разом, темп держит OutboundRateLimiter (полоса BULK)
+            results = await asyncio.gather(*(
+                bot.send_message(chat_id or user_id, texts.REMINDER_TEXT, reply_markup=kb.kb_menu(),
+                                 rate_limit_args=BULK)
+                for _, user_id, chat_id in rows
+            ), return_exceptions=True)
+            done: List[Tuple[Optional[str], int]] = []
+            stop = False
+            for (_, user_id, _), res in zip(rows, results):
+                if isinstance(res, RetryAfter):
+                    # остаётся в очереди до следующего тика
+                    stop = True
+                elif isinstance(res, Forbidden):
+                    # пользователь заблокировал бота — отписываем
+                    done.append((None, user_id))
+                elif isinstance(res, TelegramError):
+                    # разовая ошибка: не ретраим в этом тике, напомним через интервал
+                    log.warning("reminders: send to %s failed: %s", user_id, res)
+                    done.append((next_due, user_id))
+                elif isinstance(res, BaseException):
+                    await self.db.reschedule_reminders(done)
+                    raise res
+                else:
+                    sent += 1
+                    done.append((next_due, user_id))
+            await self.db.reschedule_reminders(done)
+            if stop:
+                log.warning("reminders: flood control, rest of the queue waits for the next tick")
+                break
+        return sent
+
+    async def job(self, context) -> None:
+        # callback для app.job_queue.run_repeating
+        await self.tick(context.bot)
@@ -0,0 +1,175 @@
+"""
+Снимок data.db для аналитики: консистентная read-only копия через online backup API SQLite
+(sqlite3.Connection.backup) маленькими шагами по страницам.
+
+    python snapshot.py [--db data.db] [--out analytics.db] [--pages 256] [--pause 0.002]
+    python snapshot.py --every 900      # по расписанию сам (бот делает то же, SNAPSHOT_INTERVAL_SEC)
+
+KPI, выгрузки и отчёты (kpi.py, export.py, sql/kpi_queries.sql в DB Browser) читают копию —
+живую БД бота никто, кроме бота, не держит открытой.
+
+Писателя бэкап не блокирует: источник в WAL, читатель писателю не мешает. Всё копирование
+идёт внутри одной читающей транзакции (один снимок WAL): иначе каждая запись бота
+перезапускает бэкап с начала, и под нагрузкой он не заканчивается. Шаг — pages страниц
+(256 × 4 КБ ≈ 1 МБ, около миллисекунды), между шагами pause. Пока снимок открыт, checkpoint
+не переносит WAL дальше него, поэтому копия пишется быстро (без журнала копии).
+
+Копия собирается во временном файле с уникальным именем (<out>.XXXX.tmp, параллельные запуски
+друг другу не мешают) и атомарно заменяет <out> (os.replace): уже открытые читатели дочитывают
+старый снимок, новые видят свежий. На Windows файл, открытый читателем (DB Browser), заменить
+нельзя — тогда копия переписывается в <out> через backup API под блокировками SQLite; если
+читатель держит транзакцию, снимок пропускается до следующего запуска. Когда снят снимок
+(начало чтения) — в таблице snapshot_meta.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import SNAPSHOT_PATH
+
+log = logging.getLogger(__name__)
+
+PUBLISH_TIMEOUT = 5.0  # с: сколько ждать читателя, если копия пишется внутрь открытого out
+
+def take_snapshot(db_path: str = "data.db", out: str = SNAPSHOT_PATH, pages: int = 256,
+                  pause: float = 0.002) -> Optional[Dict]:
+    """
+    Снимает копию db_path в out. Возвращает сводку: страницы, шаги, время, самый долгий шаг;
+    None, если out занят читателем и снимок пропущен.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=Path(out).name + ".", suffix=".tmp", dir=Path(out).parent)
+    os.close(fd)
+    try:
+        summary = _backup(db_path, tmp, pages, pause)
+        summary["path"] = out
+        if not _publish(tmp, out):
+            return None
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+    return summary
+
+def _backup(db_path: str, tmp: str, pages: int, pause: float) -> Dict:
+    src = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    dst = sqlite3.connect(tmp, isolation_level=None)
+    steps = 0
+    worst = 0.0
+    last = time.perf_counter()
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal steps, worst, last
+        steps += 1
+        worst = max(worst, time.perf_counter() - last)
+        if pause:
+            time.sleep(pause)
+        last = time.perf_counter()
+
+    try:
+        # копия одноразовая: без журнала и без fsync. fsync всей копии разом (сотни МБ) тормозит
+        # коммиты писателя на той же ФС; после сбоя питания копию перезапишет следующий снимок
+        dst.execute("PRAGMA journal_mode=OFF")
+        dst.execute("PRAGMA synchronous=OFF")
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        # время — до начала чтения: всё, что закоммичено раньше, в копии есть (см. export.py, users)
+        stamp = datetime.utcnow().isoformat(timespec="seconds")
+        if wal:
+            # один снимок WAL на весь бэкап: записи бота не перезапускают копирование
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        t0 = time.perf_counter()
+        last = t0
+        src.backup(dst, pages=pages, progress=progress)
+        seconds = time.perf_counter() - t0
+        if wal:
+            src.execute("COMMIT")
+
+        # копию читают read-only соединения: журнал обычный, не WAL (для WAL нужен -shm рядом)
+        dst.execute("PRAGMA journal_mode=DELETE")
+        n_pages = dst.execute("PRAGMA page_count").fetchone()[0]
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+        dst.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        dst.executemany(
+            "INSERT OR REPLACE INTO snapshot_meta(key, value) VALUES(?, ?)",
+            [("taken_at", stamp), ("source", os.path.abspath(db_path)), ("pages", str(n_pages)),
+             ("seconds", f"{seconds:.3f}")],
+        )
+    finally:
+        src.close()
+        dst.close()
+
+    return {
+        "taken_at": stamp,
+        "pages": n_pages,
+        "bytes": n_pages * page_size,
+        "steps": steps,
+        "seconds": round(seconds, 3),
+        "max_step_ms": round(worst * 1000, 2),
+    }
+
+def _publish(tmp: str, out: str) -> bool:
+    try:
+        os.replace(tmp, out)
+        return True
+    except PermissionError:
+        # Windows: out открыт читателем — переписываем содержимое, а не файл
+        log.warning("snapshot: %s is open in another process, copying into it instead of replacing", out)
+    deadline = time.monotonic() + PUBLISH_TIMEOUT
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        # backup сам повторяет шаг, пока out занят, — без срока ждал бы читателя вечно
+        if status in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) and time.monotonic() > deadline:
+            raise sqlite3.OperationalError("database is locked")
+
+    src = sqlite3.connect(tmp)
+    dst = sqlite3.connect(out, timeout=PUBLISH_TIMEOUT)
+    try:
+        src.backup(dst, progress=progress)
+        return True
+    except sqlite3.OperationalError as e:
+        log.error("snapshot: %s is locked by a reader (%s), skipped; close it in DB Browser", out, e)
+        return False
+    finally:
+        src.close()
+        dst.close()
+
+def taken_at(c: sqlite3.Connection) -> Optional[str]:
+    # время снимка (UTC) или None, если c открыт не на снимке
+    try:
+        r = c.execute("SELECT value FROM snapshot_meta WHERE key='taken_at'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return r[0] if r else None
+
+def ensure_exists(path: str) -> None:
+    # отчёты по умолчанию читают снимок: без него — понятная ошибка вместо "unable to open database file"
+    if not Path(path).exists():
+        sys.exit(f"нет {path}: снимите снимок (python snapshot.py) или укажите --db data.db")
+
+def main():
+    ap = argparse.ArgumentParser(description="Консистентная копия data.db для аналитики")
+    ap.add_argument("--db", default="data.db")
+    ap.add_argument("--out", default=SNAPSHOT_PATH)
+    ap.add_argument("--pages", type=int, default=256, help="страниц за шаг бэкапа")
+    ap.add_argument("--pause", type=float, default=0.002, help="пауза между шагами, с")
+    ap.add_argument("--every", type=float, metavar="SEC", help="снимать по расписанию, раз в SEC секунд")
+    args = ap.parse_args()
+
+    while True:
+        s = take_snapshot(args.db, args.out, args.pages, args.pause)
+        if s is None:
+            print(f"snapshot skipped: {args.out} is locked by a reader", file=sys.stderr)
+        else:
+            print(f"snapshot {s['path']}: {s['bytes'] / 2**20:.1f} MB, {s['steps']} steps in {s['seconds']:.2f}s, "
+                  f"max step {s['max_step_ms']:.1f} ms", file=sys.stderr)
+        if not args.every:
+            return
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
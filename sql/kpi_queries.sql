@@ -1,57 +1,64 @@
 -- =========================
 -- TwinEnergyAIHome KPI SQL
 -- File: kpi_queries.sql
+-- Схема: таблица events из db.py (user_hash, event_name, ts_utc, payload_json)
+-- С схемы 8 events — view над компактной events_packed: запросы те же, но на больших объёмах
+-- kpi.py быстрее (считает прямо по events_packed и целым id)
+-- Индексы создаются ботом при старте (db.MIGRATIONS). То же самое из консоли: python kpi.py
+-- Запускать на снимке analytics.db (snapshot.py), а не на живой data.db
 -- =========================
 
--- (A) One-time setup: create events table + indexes (run once)
-CREATE TABLE IF NOT EXISTS events (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  user_id INTEGER NOT NULL,
-  event_type TEXT NOT NULL,
-  ts TEXT NOT NULL DEFAULT (datetime('now')),
-  meta TEXT
-);
-
-CREATE INDEX IF NOT EXISTS idx_events_user_ts ON events(user_id, ts);
-CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events(event_type, ts);
-
--- (B) Sanity check: events distribution
-SELECT event_type, COUNT(*) AS n
+-- (A) Sanity check: events distribution
+SELECT event_name, COUNT(*) AS n, COUNT(DISTINCT user_hash) AS users
 FROM events
-GROUP BY event_type
+GROUP BY event_name
 ORDER BY n DESC;
 
--- (C) Alpha KPI: Completion rate (started -> diagnosis_shown)
+-- (B) Funnel conversion (bot_start -> onboarding_done -> analysis_generated)
+SELECT
+  s.started,
+  o.onboarded,
+  a.analyzed,
+  ROUND(100.0 * o.onboarded / NULLIF(s.started, 0), 2) AS onboarding_percent,
+  ROUND(100.0 * a.analyzed / NULLIF(s.started, 0), 2) AS analysis_percent
+FROM
+  (SELECT COUNT(DISTINCT user_hash) AS started FROM events WHERE event_name = 'bot_start') s,
+  (SELECT COUNT(DISTINCT user_hash) AS onboarded FROM events WHERE event_name = 'onboarding_done') o,
+  (SELECT COUNT(DISTINCT user_hash) AS analyzed FROM events WHERE event_name = 'analysis_generated') a;
+
+-- (C) Alpha KPI: Completion rate (bot_start -> analysis_generated)
 SELECT
   s.started,
   c.completed,
   ROUND(100.0 * c.completed / NULLIF(s.started, 0), 2) AS completion_rate_percent
 FROM
-  (SELECT COUNT(DISTINCT user_id) AS started
+  (SELECT COUNT(DISTINCT user_hash) AS started
    FROM events
-   WHERE event_type = 'start') s,
-  (SELECT COUNT(DISTINCT user_id) AS completed
+   WHERE event_name = 'bot_start') s,
+  (SELECT COUNT(DISTINCT user_hash) AS completed
    FROM events
-   WHERE event_type = 'diagnosis_shown') c;
+   WHERE event_name = 'analysis_generated') c;
 
--- (D) Alpha KPI: Usefulness (1–5)
+-- (D) Alpha KPI: Usefulness (1–5), оценка лежит в payload_json.star
 SELECT
-  ROUND(AVG(CAST(meta AS REAL)), 2) AS avg_usefulness,
+  ROUND(AVG(star), 2) AS avg_usefulness,
   COUNT(*) AS n_feedback
-FROM events
-WHERE event_type='feedback_submitted'
-  AND meta IS NOT NULL
-  AND CAST(meta AS REAL) BETWEEN 1 AND 5;
+FROM (
+  SELECT CAST(json_extract(payload_json, '$.star') AS REAL) AS star
+  FROM events
+  WHERE event_name = 'feedback_submitted'
+)
+WHERE star BETWEEN 1 AND 5;
 
--- (E) Beta KPI: Return to verified savings
+-- (E) Beta KPI: Return to verified savings (analysis_generated -> savings_calculated)
 SELECT
   c.completed,
   r.returned,
   ROUND(100.0 * r.returned / NULLIF(c.completed, 0), 2) AS return_rate_percent
 FROM
-  (SELECT COUNT(DISTINCT user_id) AS completed
+  (SELECT COUNT(DISTINCT user_hash) AS completed
    FROM events
-   WHERE event_type='diagnosis_shown') c,
-  (SELECT COUNT(DISTINCT user_id) AS returned
+   WHERE event_name = 'analysis_generated') c,
+  (SELECT COUNT(DISTINCT user_hash) AS returned
    FROM events
-   WHERE event_type='savings_report_generated') r;
+   WHERE event_name = 'savings_calculated') r;
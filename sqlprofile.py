@@ -0,0 +1,208 @@
+"""
+Профилирование SQL внутри db.DB (включается явно, по умолчанию выключено):
+
+    db = DB("data.db", profiler=QueryProfiler(slow_ms=50))
+    db.set_profiler(QueryProfiler())   # или на живом экземпляре; None — выключить
+    print(db.profiler.report())        # топ запросов по суммарному времени
+
+По каждому тексту запроса: число вызовов, суммарное и максимальное время (execute + все
+fetch, т.е. сколько соединение реально работало над запросом), строки (вернул SELECT /
+изменил DML) и шаги VM SQLite — их считает progress handler: много шагов при паре строк
+= полный скан. Запросы дольше slow_ms пишутся в лог вместе с EXPLAIN QUERY PLAN
+(план — один раз на текст запроса).
+
+Таймингом занимается подкласс sqlite3.Connection: sqlite3_trace_v2(SQLITE_TRACE_PROFILE)
+из Python недоступен, а trace callback сообщает только начало запроса. Выключенный
+профайлер ничего не стоит: DB тогда открывает обычные соединения.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+_PLANNABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+class QueryStats:
+    __slots__ = ("calls", "total", "max", "rows", "steps")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.steps = 0
+
+class QueryProfiler:
+    def __init__(self, slow_ms: float = 50.0, progress_every: int = 1000, explain: bool = True) -> None:
+        self.slow = slow_ms / 1000
+        self.progress_every = progress_every
+        self.explain = explain
+        self.stats: Dict[str, QueryStats] = {}
+        self.plans: Dict[str, str] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _stats(self, sql: str) -> QueryStats:
+        st = self.stats.get(sql)
+        if st is None:
+            with self._lock:
+                st = self.stats.setdefault(sql, QueryStats())
+        return st
+
+    def add(self, st: QueryStats, seconds: float, rows: int, steps: int, call: bool) -> None:
+        with self._lock:
+            st.calls += call
+            st.total += seconds
+            st.rows += rows
+            st.steps += steps
+
+    def slow_query(self, conn: sqlite3.Connection, sql: str, params, seconds: float) -> None:
+        plan = self.plans.get(sql)
+        if plan is None and self.explain and params is not None and sql.lstrip()[:7].upper().startswith(_PLANNABLE):
+            try:
+                rows = sqlite3.Cursor.execute(conn.cursor(), "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                plan = "\n".join(f"    {r[3]}" for r in rows)
+            except sqlite3.Error as e:
+                plan = f"    (нет плана: {e})"
+            self.plans[sql] = plan
+        log.warning("slow SQL %.1f ms: %s%s", seconds * 1000, _short(sql, 300),
+                    "\n" + plan if plan else "")
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = {}
+            self.plans = {}
+            self.started = time.time()
+
+    def top(self, n: int = 15, by: str = "total") -> List[tuple]:
+        with self._lock:
+            items = [(sql, st.calls, st.total, st.max, st.rows, st.steps) for sql, st in self.stats.items()]
+        key = {"total": 2, "max": 3, "calls": 1, "rows": 4, "steps": 5}[by]
+        return sorted(items, key=lambda r: -r[key])[:n]
+
+    def report(self, n: int = 15, by: str = "total") -> str:
+        rows = self.top(n, by)
+        total = sum(st.total for st in self.stats.values()) or 1e-9
+        lines = [f"SQL profile за {time.time() - self.started:.0f} с, по {by}:",
+                 f"{'calls':>8} {'total ms':>10} {'%':>5} {'avg ms':>8} {'max ms':>8} {'rows':>9} {'vm steps':>10}  sql"]
+        for sql, calls, tot, mx, nrows, steps in rows:
+            lines.append(f"{calls:>8} {tot * 1000:>10.1f} {tot / total * 100:>5.1f} "
+                         f"{tot / max(calls, 1) * 1000:>8.2f} {mx * 1000:>8.1f} {nrows:>9} {steps:>10}  {_short(sql, 90)}")
+        return "\n".join(lines)
+
+def _short(sql: str, limit: int) -> str:
+    s = " ".join(sql.split())
+    return s if len(s) <= limit else s[:limit - 1] + "…"
+
+class ProfiledCursor(sqlite3.Cursor):
+    # _st is None — курсор не наш (служебный EXPLAIN и т.п.), ничего не считаем
+    _st: Optional[QueryStats] = None
+
+    def _begin(self, st: QueryStats, sql: str, params, seconds: float, steps: int) -> None:
+        self._st, self._sql, self._params = st, sql, params
+        self._elapsed = 0.0
+        self._logged = False
+        rows = self.rowcount if self.rowcount > 0 else 0  # DML: изменённые строки
+        self._add(seconds, rows, steps, call=True)
+
+    def _add(self, seconds: float, rows: int, steps: int, call: bool = False) -> None:
+        conn = self.connection
+        conn.profiler.add(self._st, seconds, rows, steps, call)
+        self._elapsed += seconds
+        if self._elapsed > self._st.max:
+            self._st.max = self._elapsed
+        if self._elapsed >= conn.profiler.slow and not self._logged:
+            self._logged = True
+            conn.profiler.slow_query(conn, self._sql, self._params, self._elapsed)
+
+    def _timed(self, fn, *args):
+        if self._st is None:
+            return fn(self, *args)
+        conn = self.connection
+        steps0 = conn.steps
+        t0 = time.perf_counter()
+        out = fn(self, *args)
+        n = 0 if out is None else len(out) if isinstance(out, list) else 1
+        self._add(time.perf_counter() - t0, n, (conn.steps - steps0) * conn.profiler.progress_every)
+        return out
+
+    def fetchone(self):
+        return self._timed(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        row = self._timed(sqlite3.Cursor.fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Соединение с замером каждого execute/executemany/executescript/commit. profiler
+    задаётся после открытия (DB._connect), progress handler считает шаги VM.
+    """
+    profiler: QueryProfiler
+
+    def attach_profiler(self, profiler: QueryProfiler) -> None:
+        self.profiler = profiler
+        self.steps = 0
+        self.set_progress_handler(self._tick, profiler.progress_every)
+
+    def _tick(self) -> int:
+        self.steps += 1
+        return 0  # не прерывать запрос
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def _run(self, method, sql: str, params, plan_params):
+        # Connection.execute в C не зовёт переопределённый cursor() — создаём курсор сами
+        st = self.profiler._stats(sql)
+        cur = self.cursor()
+        steps0 = self.steps
+        t0 = time.perf_counter()
+        method(cur, sql, params)
+        cur._begin(st, sql, plan_params, time.perf_counter() - t0,
+                   (self.steps - steps0) * self.profiler.progress_every)
+        return cur
+
+    def execute(self, sql: str, params=()):
+        return self._run(sqlite3.Cursor.execute, sql, params, params)
+
+    def executemany(self, sql: str, seq_of_params):
+        # параметры executemany — одноразовый итератор: медленный executemany логируется без плана
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_params, None)
+
+    def executescript(self, script: str):
+        return self._timed_call("script: " + _short(script, 120), super().executescript, script)
+
+    def commit(self) -> None:
+        self._timed_call("COMMIT", super().commit)
+
+    def __exit__(self, exc_type, exc, tb):
+        # with conn: — commit/rollback внутри C-реализации, замеряем целиком
+        if not self.in_transaction:
+            return super().__exit__(exc_type, exc, tb)
+        return self._timed_call("COMMIT" if exc_type is None else "ROLLBACK",
+                                super().__exit__, exc_type, exc, tb)
+
+    def _timed_call(self, name: str, fn, *args):
+        st = self.profiler._stats(name)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            dt = time.perf_counter() - t0
+            self.profiler.add(st, dt, 0, 0, True)
+            if dt > st.max:
+                st.max = dt
+            if dt >= self.profiler.slow:
+                log.warning("slow SQL %.1f ms: %s", dt * 1000, name)
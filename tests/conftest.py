@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# модули бота лежат в корне репозитория: python -m pytest из корня или из tests/
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db import DB  # noqa: E402
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "data.db")
+
+@pytest.fixture
+def db(db_path):
+    d = DB(db_path, buffer_events=False)
+    yield d
+    d.close()
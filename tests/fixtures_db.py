@@ -0,0 +1,81 @@
+"""
+Синтетическая БД заданного размера: тесты планов запросов и бенчмарки (benchmarks/ берут её отсюда).
+
+N — строк в events и bills; users, результатов экономии, состояний диалогов и получателей
+рассылки — N/10 (по ~10 счетов на пользователя). Данные — рекурсивным CTE, индексы строятся
+миграциями после вставки.
+"""
+import sqlite3
+
+from db import DB, SCHEMA
+
+def populate(path: str, n: int) -> None:
+    users = max(n // 10, 1)
+    with sqlite3.connect(path) as c:
+        c.executescript(SCHEMA)  # индексы строим после вставки — так в разы быстрее
+        c.execute(
+            """
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < :n)
+            INSERT INTO users(user_id, user_hash, chat_id, city, home_type, heating, people,
+                              knows_tariff, reminders, created_at, updated_at)
+            SELECT i, printf('%016x', i), i, 'almaty', 'flat', 'electric', '2', 1, 0, '2026-01-01', '2026-01-01'
+            FROM seq
+            """,
+            {"n": users},
+        )
+        c.execute(
+            """
+            WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i + 1 < :n)
+            INSERT INTO bills(user_id, kind, start_ts, end_ts, days, kwh, money, tariff, created_at)
+            SELECT 1 + i / 10, CASE i % 10 WHEN 0 THEN 'current' WHEN 9 THEN 'second' ELSE 'prev' END,
+                   date('2025-01-01', '+' || (i % 10 * 30) || ' days'),
+                   date('2025-01-31', '+' || (i % 10 * 30) || ' days'),
+                   30, 300 + i % 500, 15000 + i % 20000, 25, '2026-01-01'
+            FROM seq
+            """,
+            {"n": users * 10},
+        )
+        c.execute(
+            """
+            WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i + 1 < :n)
+            INSERT INTO events(ts_utc, user_hash, session_id, state, event_name, payload_json, app_version)
+            SELECT datetime('2026-01-01', '+' || (i / 100) || ' minutes'),
+                   printf('%016x', 1 + (i * 7919) % :users), 's', '0',
+                   CASE i % 4 WHEN 0 THEN 'bot_start' WHEN 1 THEN 'command_used'
+                        WHEN 2 THEN 'analysis_generated' ELSE 'onboarding_done' END,
+                   NULL, 'mvp-0.1.0'
+            FROM seq
+            """,
+            {"n": n, "users": users},
+        )
+    DB(path, buffer_events=False).close()  # миграции: индексы и остальные таблицы
+    with sqlite3.connect(path) as c:
+        c.execute(
+            "UPDATE users SET reminders=1,"
+            " next_due_at=strftime('%Y-%m-%dT%H:%M:%S', '2026-01-01', '+' || (user_id % 10080) || ' minutes')"
+        )
+        c.execute(
+            """
+            INSERT INTO savings_results(second_bill_id, user_id, current_bill_id, before_per_day,
+                                        after_per_day, delta_kwh, pct, delta_money, computed_at)
+            SELECT id, user_id, id - 9, 10, 9, 30, 10, 750, '2026-01-01' FROM bills WHERE kind='second'
+            """
+        )
+        c.execute(
+            "INSERT INTO conv_user_data(user_id, data_json, updated_at)"
+            " SELECT user_id, '{\"cur_kwh\": 900, \"cur_money\": 45000, \"ctx\": {\"cold\": true}}', updated_at"
+            " FROM users"
+        )
+        c.execute(
+            "INSERT INTO conv_states(name, key_json, state)"
+            " SELECT 'main_conv', '[' || user_id || ', ' || user_id || ']', user_id % 27 FROM users"
+        )
+        c.execute(
+            "INSERT INTO broadcasts(id, text, status, total, created_at, updated_at)"
+            " VALUES(1, 'old', 'done', :n, '2026-01-01', '2026-01-01')", {"n": users}
+        )
+        c.execute(
+            "INSERT INTO broadcast_recipients(broadcast_id, user_id, chat_id, status)"
+            " SELECT 1, user_id, chat_id, 'sent' FROM users"
+        )
+        c.execute("INSERT INTO kpi_state(key, value) SELECT 'events_hw', MAX(id) FROM events")
@@ -0,0 +1,76 @@
+"""
+analyze_batch и savings_batch против скалярных detect_spike / rule_key / savings_calc
+построчно: сетка граничных значений счетов × все 64 комбинации флагов профиля/контекста
+плюс случайная выборка (как в benchmarks/bench_batch.py).
+"""
+import itertools
+import math
+
+import numpy as np
+
+from analytics import detect_spike, rule_key, savings_calc
+from analytics_batch import BASIS_NAMES, analyze_batch, encode_flags, savings_batch
+
+# ---------- пространство входов ----------
+# рост ровно на 15% и на 50 кВт*ч при базе < 300, база 0 и отрицательная, нет данных
+NOW_KWH = (None, 0.0, 115.0, 280.0, 300.0, 320.0, 580.0)
+PREV_KWH = (None, -5.0, 0.0, 100.0, 250.0, 299.0, 500.0)
+MONEY = [(None, None), (None, 10000.0), (12000.0, None), (11500.0, 10000.0), (12000.0, 10000.0),
+         (9000.0, 10000.0), (10000.0, 0.0)]
+BILLS = [k + m for k, m in itertools.product(itertools.product(NOW_KWH, PREV_KWH), MONEY)]
+FLAGS = list(itertools.product((False, True), repeat=6))  # electric, cold, boiler, many_people, more_home, new_appliance
+
+def _nan(x):
+    return np.nan if x is None else x
+
+def _none(x):
+    return None if math.isnan(x) else float(x)
+
+def _scalar_key(flags, basis):
+    electric, cold, boiler, many_people, more_home, new_appliance = flags
+    profile = {"heating": "electric" if electric else "gas", "people": "3-4" if many_people else "1"}
+    ctx = {"cold": cold, "boiler": boiler, "more_time_home": more_home, "new_appliance": new_appliance}
+    return rule_key(profile, ctx, basis)
+
+def _check(bills, flags):
+    cols = [np.array([_nan(b[i]) for b in bills], dtype=np.float64) for i in range(4)]
+    fcols = [np.array([f[i] for f in flags]) for i in range(6)]
+    out = analyze_batch(*cols, flags=encode_flags(*fcols))
+    for i, (b, f) in enumerate(zip(bills, flags)):
+        spike, pct, basis = detect_spike(*b)
+        got = (bool(out["spike"][i]), _none(out["pct"][i]), BASIS_NAMES[out["basis"][i]], int(out["rule_key"][i]))
+        assert got == (spike, pct, basis, _scalar_key(f, basis)), (b, f)
+
+def test_analyze_batch_matches_scalar_grid():
+    rows = list(itertools.product(BILLS, FLAGS))
+    assert len(rows) == 21_952
+    _check([b for b, _ in rows], [f for _, f in rows])
+
+def test_analyze_batch_matches_scalar_random():
+    rng = np.random.default_rng(1)
+    n = 20_000
+
+    def col(lo, hi, missing):
+        v = rng.uniform(lo, hi, n).round(1)
+        v[rng.random(n) < missing] = np.nan
+        return v
+
+    prev_kwh = col(0, 1500, 0.3)
+    prev_kwh[rng.random(n) < 0.02] = 0.0
+    cols = [col(50, 1500, 0.2), prev_kwh, col(1000, 80000, 0.2), col(1000, 80000, 0.3)]
+    bills = [tuple(_none(c[i]) for c in cols) for i in range(n)]
+    flags = [tuple(bool(x) for x in row) for row in rng.random((n, 6)) < 0.4]
+    _check(bills, flags)
+
+def test_savings_batch_matches_savings_calc():
+    grid = list(itertools.product((None, 0.0, 150.0, 300.0), (0, 30, 31), (None, 0.0, 120.0, 310.0),
+                                  (-1, 0, 28, 30), (None, 25.5)))
+    cols = list(zip(*grid))
+    out = savings_batch(*[[_nan(x) for x in c] for c in cols])
+    for i, args in enumerate(grid):
+        want = savings_calc(*args)
+        assert bool(out["ok"][i]) == want["ok"], args
+        if not want["ok"]:
+            continue
+        for k in ("before_per_day", "after_per_day", "delta_kwh", "pct", "delta_money"):
+            assert _none(out[k][i]) == want[k], (args, k)
@@ -0,0 +1,128 @@
+"""
+Табличные pick_reasons / pick_top3_actions (REASONS_TABLE / ACTIONS_TABLE) и detect_spike
+против замороженной копии прежних if-цепочек (analytics.py до перехода на таблицы правил)
+на всём пространстве входов: 5 heating × 6 people × 3^4 значения ctx × 48 пар счетов = 116 640.
+Значения ctx: True, 1 (правдиво, но не True — правила сравнивают через is True) и отсутствие ключа.
+"""
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+import analytics
+from analytics import ACTIONS, _pct
+
+# ---------- прежняя логика, как была до таблиц правил (не менять) ----------
+def old_detect_spike(now_kwh: Optional[float], prev_kwh: Optional[float],
+                     now_money: Optional[float], prev_money: Optional[float]) -> Tuple[bool, Optional[float], str]:
+    if now_kwh is not None and prev_kwh is not None and prev_kwh > 0:
+        pct = _pct(now_kwh, prev_kwh)
+        spike = (now_kwh > prev_kwh * 1.15) or ((prev_kwh < 300) and (now_kwh - prev_kwh > 50))
+        return spike, pct, "kwh"
+
+    if now_money is not None and prev_money is not None and prev_money > 0:
+        pct = _pct(now_money, prev_money)
+        spike = now_money > prev_money * 1.15
+        return spike, pct, "money"
+
+    return False, None, "none"
+
+def old_pick_reasons(profile: Dict, ctx: Dict, basis: str) -> List[str]:
+    heating = (profile.get("heating") or "")
+    people = (profile.get("people") or "")
+
+    cold = ctx.get("cold")
+    boiler = ctx.get("boiler")
+    new_appliance = ctx.get("new_appliance")
+
+    reasons: List[str] = []
+
+    if heating == "electric" or cold is True:
+        reasons.append("Электроотопление/обогрев работали дольше (холоднее).")
+
+    if boiler is True:
+        reasons.append("Нагрев воды (бойлер/тэн) даёт заметную базовую нагрузку.")
+
+    if people in ("3-4", "5+") or ctx.get("more_time_home") is True:
+        reasons.append("Больше времени дома/людей → чаще свет, готовка, техника.")
+
+    if new_appliance is True:
+        reasons.append("Новый прибор или чаще используете энергоёмкие режимы (стирка/сушка/готовка).")
+
+    reasons.append("Часть расхода может уходить в «standby» и мелкие потребители (TV/приставка/зарядки).")
+
+    if basis == "money":
+        reasons.append("Если рост только в ₸ — возможно, сыграл тариф/перерасчёт, без изменения кВт*ч.")
+
+    return reasons[:3]
+
+def old_pick_top3_actions(profile: Dict, ctx: Dict) -> List[Tuple[str, str, str]]:
+    heating = profile.get("heating")
+    boiler = ctx.get("boiler") is True
+    cold = ctx.get("cold") is True
+
+    scores: Dict[str, int] = {}
+
+    def add(action_id: str, pts: int):
+        scores[action_id] = scores.get(action_id, 0) + pts
+
+    if heating == "electric" or cold:
+        add("timer_heater", 6)
+        add("lower_temp", 4)
+        add("seal_windows", 4)
+
+    if boiler:
+        add("boiler_5560", 6)
+
+    add("standby_strip", 3)
+    add("night_test", 3)
+    add("wash_30_full", 2)
+    add("fridge_settings", 2)
+    add("kettle_volume", 1)
+
+    if not scores:
+        scores = {"standby_strip": 3, "night_test": 3, "wash_30_full": 2}
+
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    chosen_ids = [aid for aid, _ in ranked[:3]]
+
+    catalog = {a[0]: a for a in ACTIONS}
+    out: List[Tuple[str, str, str]] = []
+    for aid in chosen_ids:
+        a = catalog.get(aid)
+        if a:
+            out.append((a[1], a[2], a[3]))
+    return out
+
+# ---------- пространство входов ----------
+HEATING = ("electric", "gas", "central", None, "")
+PEOPLE = ("1", "2", "3-4", "5+", None, "")
+CTX_KEYS = ("cold", "boiler", "more_time_home", "new_appliance")
+CTX_VALUES = (True, 1, None)  # None — ключа нет
+# (now_kwh, prev_kwh): рост >15%, рост >50 кВт*ч при малой базе, без роста, нулевая база, нет данных
+KWH = list(itertools.product((None, 280.0, 320.0, 580.0), (None, 0.0, 250.0, 500.0)))
+MONEY = [(None, None), (12000.0, 10000.0), (10000.0, 0.0)]
+BILLS = [k + m for k, m in itertools.product(KWH, MONEY)]
+
+def inputs():
+    for heating, people, values in itertools.product(HEATING, PEOPLE, itertools.product(CTX_VALUES, repeat=4)):
+        profile = {"heating": heating, "people": people}
+        ctx = {k: v for k, v in zip(CTX_KEYS, values) if v is not None}
+        for bills in BILLS:
+            yield profile, ctx, bills
+
+def test_input_space_size():
+    assert sum(1 for _ in inputs()) == 116_640
+
+def test_tables_match_old_if_chains():
+    spikes = {bills: old_detect_spike(*bills) for bills in BILLS}
+    for bills, want in spikes.items():
+        assert analytics.detect_spike(*bills) == want, bills
+    n = 0
+    for profile, ctx, bills in inputs():
+        basis = spikes[bills][2]
+        assert analytics.pick_reasons(profile, ctx, basis) == old_pick_reasons(profile, ctx, basis), (profile, ctx, basis)
+        assert analytics.pick_top3_actions(profile, ctx) == old_pick_top3_actions(profile, ctx), (profile, ctx)
+        r = analytics.make_analysis(profile, ctx, *bills)
+        assert (r.reasons, r.actions, r.meta["basis"]) == (old_pick_reasons(profile, ctx, basis),
+                                                         old_pick_top3_actions(profile, ctx), basis)
+        n += 1
+    assert n == 116_640
@@ -0,0 +1,25 @@
+import sqlite3
+
+import archive
+
+def test_archive_moves_only_old_rolled_up_events(db, tmp_path):
+    rows = [(f"2025-0{m}-15T12:00:00", f"{i:016x}", "0123456789ab", "0", "bot_start", "/start", None, 0, "1.0")
+            for m in (1, 2) for i in range(30)]
+    rows.append(("2099-01-01T00:00:00", "f" * 16, "s", "0", "bot_start", None, None, 0, "1.0"))
+    db.insert_events(rows)
+    db.refresh_rollups()
+    db.insert_events(rows[:5])  # не учтены в роллапах — остаются в горячей таблице
+    before = db._conn().execute("SELECT SUM(events) FROM kpi_daily").fetchone()[0]
+
+    moved = archive.archive_events(db, days=30, archive_dir=tmp_path, chunk=7, pause=0)
+
+    assert moved == 60
+    c = db._conn()
+    assert c.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 6
+    assert c.execute("SELECT SUM(events) FROM kpi_daily").fetchone()[0] == before
+    assert "arch" not in [r[1] for r in c.execute("PRAGMA database_list")]  # архив отключён
+    files = archive.archive_files(tmp_path)
+    assert [f.name for f in files] == ["events_2025_01.db", "events_2025_02.db"]
+    for f in files:
+        with sqlite3.connect(f) as a:
+            assert a.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 30
@@ -0,0 +1,40 @@
+import backtest
+
+def _bills(db, user_id):
+    db.upsert_user(user_id, user_id)
+    db.save_bill(user_id, "current", "2025-01-01", "2025-01-31", 30, 300.0, 15000.0, None)
+    db.save_bill(user_id, "second", "2025-02-01", "2025-03-03", 30, 270.0, 13500.0, 50.0)
+
+def test_backtest_writes_results(db):
+    for uid in (1, 2):
+        _bills(db, uid)
+    assert backtest.run(db) == 2
+    assert db.get_savings_summary(1)["n"] == 1
+
+def test_reset_between_read_and_write_is_not_resurrected(db):
+    for uid in (1, 2):
+        _bills(db, uid)
+    rows = db.bill_history(0, 10)
+    results = backtest._chunk_results(rows)
+    assert len(results) == 2
+
+    db.reset_user_data(2)  # /privacy между чтением истории и записью результатов
+    assert db.replace_savings_results(0, rows[-1][1], results) == 1
+    assert db.get_savings_summary(1) is not None
+    assert db.get_savings_summary(2) is None
+
+def test_block_of_prev_only_users_does_not_stop_the_run(db):
+    # импорт только в ₸: одни prev-счета, пары current -> second нет
+    for uid in (1, 2):
+        db.upsert_user(uid, uid)
+        db.save_bill(uid, "prev", "2024-12-01", "2024-12-31", 30, None, 15000.0, None)
+    _bills(db, 3)
+    assert backtest.run(db, chunk_users=2) == 1
+    assert db.get_savings_summary(3)["n"] == 1
+
+def test_stale_results_after_last_window_are_removed(db):
+    _bills(db, 1)
+    db.save_savings_result(10**6, 5, 10**6 - 1, {"before_per_day": 1.0, "after_per_day": 1.0,
+                                                 "delta_kwh": 0.0, "pct": 0.0, "delta_money": None})
+    assert backtest.run(db) == 1
+    assert db.get_savings_summary(5) is None
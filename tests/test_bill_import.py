@@ -0,0 +1,24 @@
+from bill_import import parse_file, parse_rows
+
+def test_header_is_skipped():
+    res = parse_file("bills.csv", "начало;конец;кВт*ч;₸\n01.01.2025;31.01.2025;310;15 500\n".encode())
+    assert res.rows == 1 and len(res.bills) == 1 and not res.errors
+
+def test_header_without_known_names_is_skipped():
+    res = parse_rows([("from", "to", "usage"), ("01.01.2025", "31.01.2025", "310")])
+    assert res.rows == 1 and len(res.bills) == 1 and not res.errors
+
+def test_broken_first_row_is_an_error():
+    # нет заголовка, первая строка с опечаткой в дате — не молча пропускается, а в ошибках
+    res = parse_rows([("01.01.2025", "31.13.2025", "310"), ("01.02.2025", "28.02.2025", "295")])
+    assert res.rows == 2
+    assert len(res.bills) == 1
+    assert [lineno for lineno, _ in res.errors] == [1]
+
+def test_broken_first_row_from_xlsx_numbers_is_an_error():
+    res = parse_rows([("01.01.2025", "31.01.2025", 10**9)])
+    assert res.rows == 1 and not res.bills and len(res.errors) == 1
+
+def test_broken_first_row_with_currency_sign_is_an_error():
+    res = parse_rows([("01.01.2025", "31.01.2025", "abc", "15 500 ₸")])
+    assert res.rows == 1 and len(res.errors) == 1
@@ -0,0 +1,61 @@
+import asyncio
+
+from broadcast import Broadcaster
+from db import AsyncDB
+
+def _expire_lease(db, broadcast_id):
+    with db._conn() as c:
+        c.execute("UPDATE broadcasts SET lease_until='2000-01-01T00:00:00' WHERE id=?", (broadcast_id,))
+
+def _statuses(db, broadcast_id):
+    return [r[0] for r in db._conn().execute(
+        "SELECT status FROM broadcast_recipients WHERE broadcast_id=? ORDER BY user_id", (broadcast_id,)
+    )]
+
+def test_checkpoint_after_lease_takeover_writes_nothing(db):
+    for uid in (1, 2, 3):
+        db.upsert_user(uid, uid)
+    bid = db.create_broadcast("hi")
+    db.snapshot_broadcast(bid)
+    assert db.claim_broadcast(bid, "a", 60)
+    _expire_lease(db, bid)
+    assert db.claim_broadcast(bid, "b", 60)
+
+    assert db.checkpoint_broadcast(bid, "a", 60, [("sent", None, 1), ("sent", None, 2)], 2) == "lost"
+    job = db.get_broadcast(bid)
+    assert (job["sent"], job["cursor"], job["lease_owner"]) == (0, 0, "b")
+    assert _statuses(db, bid) == ["pending"] * 3
+
+    assert db.checkpoint_broadcast(bid, "b", 60, [("sent", None, 1)], 1) == "running"
+    assert _statuses(db, bid) == ["sent", "pending", "pending"]
+
+class _TakeoverBot:
+    """Во время первой пачки аренду забирает другой процесс."""
+    def __init__(self, db, broadcast_id):
+        self.db, self.broadcast_id, self.sent = db, broadcast_id, []
+
+    async def send_message(self, chat_id, text, rate_limit_args=None):
+        if not self.sent:
+            _expire_lease(self.db, self.broadcast_id)
+            assert self.db.claim_broadcast(self.broadcast_id, "other", 60)
+        self.sent.append(chat_id)
+
+def test_run_stops_after_lease_lost(db):
+    for uid in range(1, 6):
+        db.upsert_user(uid, uid)
+    bid = db.create_broadcast("hi")
+    db.snapshot_broadcast(bid)
+    bot = _TakeoverBot(db, bid)
+
+    async def go():
+        adb = AsyncDB(db)
+        try:
+            return await Broadcaster(adb, batch_size=2, owner="me").run(bot, bid)
+        finally:
+            adb._executor.shutdown(wait=True)
+
+    job = asyncio.run(asyncio.wait_for(go(), 5))
+    # ушла только пачка, отправленная до потери аренды; новый владелец её не теряет
+    assert bot.sent == [1, 2]
+    assert (job["lease_owner"], job["sent"]) == ("other", 0)
+    assert _statuses(db, bid) == ["pending"] * 5
@@ -0,0 +1,72 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+from concurrency import PerUserUpdateProcessor
+
+def make_update(update_id: int, user_id: int) -> Update:
+    return Update(update_id, message=Message(
+        update_id, datetime.now(timezone.utc), Chat(user_id, Chat.PRIVATE),
+        from_user=User(user_id, "u", False), text=str(update_id),
+    ))
+
+def run_feed(proc, feed, delay):
+    # как Application: задача на каждый апдейт в порядке прихода, хендлер спит случайное время
+    log = []  # (событие, user_id, номер апдейта у пользователя)
+    running = {"now": 0, "max": 0}
+
+    async def handler(user_id, seq, pause):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        log.append(("start", user_id, seq))
+        await asyncio.sleep(pause)
+        log.append(("end", user_id, seq))
+        running["now"] -= 1
+
+    async def main():
+        seen = {}
+        tasks = []
+        for i, user_id in enumerate(feed):
+            seq = seen[user_id] = seen.get(user_id, -1) + 1
+            tasks.append(asyncio.create_task(
+                proc.process_update(make_update(i, user_id), handler(user_id, seq, delay()))
+            ))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return log, running["max"]
+
+def test_per_user_order_and_cross_user_overlap():
+    rnd = random.Random(7)
+    users = [101, 202, 303, 404, 505]
+    feed = [rnd.choice(users) for _ in range(200)]
+    proc = PerUserUpdateProcessor(max_concurrent_updates=8)
+    log, max_running = run_feed(proc, feed, lambda: rnd.uniform(0, 0.003))
+
+    # у каждого пользователя апдейты по порядку и строго по одному: start n, end n, start n+1, ...
+    for user_id in users:
+        mine = [(ev, seq) for ev, uid, seq in log if uid == user_id]
+        n = feed.count(user_id)
+        assert mine == [(ev, seq) for seq in range(n) for ev in ("start", "end")]
+
+    # разные пользователи выполняются одновременно, но не больше max_concurrent_updates
+    active, overlapped = set(), False
+    for ev, uid, _ in log:
+        if ev == "start":
+            overlapped |= bool(active - {uid})
+            active.add(uid)
+        else:
+            active.discard(uid)
+    assert overlapped
+    assert 1 < max_running <= 8
+    assert not proc._locks and not proc._queued  # блокировки пользователей не копятся
+
+def test_slow_user_does_not_take_all_slots():
+    # 50 апдейтов одного пользователя в очереди не мешают другому: его апдейт не ждёт их всех
+    feed = [1] * 50 + [2]
+    proc = PerUserUpdateProcessor(max_concurrent_updates=2)
+    log, _ = run_feed(proc, feed, lambda: 0.002)
+    done_2 = log.index(("end", 2, 0))
+    assert done_2 < log.index(("end", 1, 5))
@@ -0,0 +1,52 @@
+import time
+
+from db import DB, EventBuffer
+
+def row(i, ts="2026-02-01T00:00:00"):
+    return (ts, f"{i % 7:016x}", "0123456789ab", "0", "command_used", "/start", None, 0, "1.0")
+
+def count(db):
+    return db._conn().execute("SELECT COUNT(*) FROM events_packed").fetchone()[0]
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+def test_poison_row_is_dropped_and_flusher_survives(db):
+    buf = EventBuffer(db, batch_size=10, flush_interval=0.01, max_pending=20)
+    try:
+        for i in range(9):
+            buf.add(row(i))
+        buf.add(row(9, ts="not a date"))  # ts -> NULL, NOT NULL constraint failed
+        assert wait_for(lambda: buf.dropped == 1)
+        assert count(db) == 9
+
+        # поток жив: add() не встаёт на max_pending, новые строки доходят до БД
+        for i in range(100):
+            buf.add(row(i))
+        assert wait_for(lambda: count(db) == 109)
+        assert buf._thread.is_alive()
+    finally:
+        buf.close()
+
+def test_unexpected_error_does_not_kill_flusher(db_path, monkeypatch):
+    d = DB(db_path)
+    try:
+        calls = []
+
+        def broken(rows):
+            calls.append(len(rows))
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(d, "insert_events", broken)
+        d.log_event(1, "s", "0", "bot_start")
+        assert wait_for(lambda: d.events.dropped == 1)
+        monkeypatch.undo()
+        d.log_event(1, "s", "0", "bot_start")
+        d.flush_events()
+        assert count(d) == 1
+        assert d.events._thread.is_alive()
+    finally:
+        d.close()
@@ -0,0 +1,52 @@
+import json
+
+import export
+
+def _age_users(db, ts):
+    # профили «давние»: выгрузка не ждёт SETTLE_SEC
+    with db._conn() as c:
+        c.execute("UPDATE users SET updated_at=?", (ts,))
+
+def _read(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_users_export_has_no_user_id_and_reexports_changes(db, db_path, tmp_path):
+    for uid in (111111111, 222222222, 333333333):
+        db.upsert_user(uid, uid)
+    _age_users(db, "2026-01-01T00:00:00")
+    out = tmp_path / "export"
+
+    done = export.run(db_path, out, ["users"])
+    n, path = done["users"]
+    assert n == 3
+    first = _read(path)
+    state = (out / export.STATE_FILE).read_text(encoding="utf-8")
+    for uid in ("111111111", "222222222", "333333333"):
+        assert uid not in path.name and uid not in state
+        assert all(uid not in json.dumps(r) for r in first)
+
+    # нечего выгружать — файла нет
+    assert export.run(db_path, out, ["users"])["users"] == (0, None)
+
+    # изменённый профиль выгружается ещё раз, остальные — нет
+    db.set_user_profile(222222222, city="astana")
+    with db._conn() as c:
+        c.execute("UPDATE users SET updated_at='2026-02-01T00:00:00' WHERE user_id=222222222")
+    n, path = export.run(db_path, out, ["users"])["users"]
+    assert n == 1
+    [row] = _read(path)
+    assert row["city"] == "astana" and row["user_hash"] == db.get_user(222222222)["user_hash"]
+    assert "222222222" not in path.name
+
+def test_users_changed_recently_wait_for_next_run(db, db_path, tmp_path):
+    db.upsert_user(1, 1)  # updated_at = сейчас: могли ещё не закоммитить соседей по секунде
+    assert export.run(db_path, tmp_path, ["users"])["users"] == (0, None)
+    _age_users(db, "2026-01-01T00:00:00")
+    assert export.run(db_path, tmp_path, ["users"])["users"][0] == 1
+
+def test_old_user_id_cursor_restarts_users(db, db_path, tmp_path):
+    db.upsert_user(5, 5)
+    _age_users(db, "2026-01-01T00:00:00")
+    (tmp_path / export.STATE_FILE).write_text(json.dumps({"users": 5}), encoding="utf-8")
+    assert export.run(db_path, tmp_path, ["users"])["users"][0] == 1
+    assert json.loads((tmp_path / export.STATE_FILE).read_text())["users"][0] == "2026-01-01T00:00:00"
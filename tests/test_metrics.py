@@ -0,0 +1,25 @@
+from db import AsyncDB
+from metrics import Metrics, instrument_db
+
+def test_user_cache_stats_exported(db):
+    metrics = Metrics()
+    adb = AsyncDB(db)
+    try:
+        instrument_db(adb, metrics)
+        db.upsert_user(1, 10)
+        db.get_user(1)
+        db.get_user(1)
+        db.get_user(2)
+        stats = db.cache_stats()
+        assert stats["hits"] and stats["misses"]
+
+        text = metrics.render()
+        for key in ("hits", "misses", "size"):
+            assert f"bot_user_cache_{key} {stats[key]}\n" in text
+        summary = metrics.summary()
+        looked = stats["hits"] + stats["misses"]
+        assert f"Кэш users: hit-rate {stats['hits'] / looked * 100:.0f}% ({stats['hits']}/{looked}), " \
+               f"строк {stats['size']}" in summary
+        assert "bot_user_cache" not in summary
+    finally:
+        adb._executor.shutdown(wait=True)
@@ -0,0 +1,109 @@
+import asyncio
+
+from telegram.error import NetworkError
+
+from outbound import OutboundRateLimiter
+
+def _limiter():
+    # личка: 1 сообщение в секунду без запаса — второе сообщение в чат ждёт слота ~1 с
+    return OutboundRateLimiter(global_rate=1000, private_rate=1.0, private_burst=1.0)
+
+async def _send(limiter, callback, text, chat_id=42):
+    data = {"chat_id": chat_id, "text": text}
+    return await limiter.process_request(lambda: callback(data), (), {}, "sendMessage", data, None)
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=5))
+
+def test_merged_messages_share_one_call():
+    sent = []
+
+    async def callback(data):
+        sent.append(data["text"])
+        return len(sent)
+
+    async def main():
+        lim = _limiter()
+        await _send(lim, callback, "first")
+        a = asyncio.create_task(_send(lim, callback, "a"))
+        await asyncio.sleep(0)
+        b = asyncio.create_task(_send(lim, callback, "b"))
+        res = await asyncio.gather(a, b)
+        await lim.shutdown()
+        return res
+
+    assert _run(main()) == [2, 2]
+    assert sent == ["first", "a\n\nb"]
+
+def test_cancelled_sender_redispatches_merged_texts():
+    sent = []
+
+    async def callback(data):
+        sent.append(data["text"])
+        return data["text"]
+
+    async def main():
+        lim = _limiter()
+        await _send(lim, callback, "first")
+        a = asyncio.create_task(_send(lim, callback, "a"))
+        await asyncio.sleep(0.01)  # a ждёт слота чата, b и c склеиваются в него
+        b = asyncio.create_task(_send(lim, callback, "b"))
+        c = asyncio.create_task(_send(lim, callback, "c"))
+        await asyncio.sleep(0.01)
+        a.cancel()
+        res = await asyncio.gather(b, c)
+        await lim.shutdown()
+        return res
+
+    # текст отменённого лидера не уходит, склеенные тексты доставлены (снова одним вызовом)
+    assert _run(main()) == ["b\n\nc", "b\n\nc"]
+    assert sent == ["first", "b\n\nc"]
+
+def test_sender_cancelled_during_request_fails_merged_callers():
+    started = None
+
+    async def callback(data):
+        if data["text"] != "first":
+            started.set()
+            await asyncio.sleep(10)
+        return "ok"
+
+    async def main():
+        nonlocal started
+        started = asyncio.Event()
+        lim = _limiter()
+        await _send(lim, callback, "first")
+        a = asyncio.create_task(_send(lim, callback, "a"))
+        await asyncio.sleep(0.01)
+        b = asyncio.create_task(_send(lim, callback, "b"))
+        await started.wait()
+        a.cancel()
+        res = await asyncio.gather(b, return_exceptions=True)
+        await lim.shutdown()
+        return res
+
+    # запрос мог дойти до Telegram: переотправка дала бы дубль, поэтому честная ошибка
+    assert [type(r) for r in _run(main())] == [NetworkError]
+
+def test_failed_sender_propagates_to_merged_callers():
+    calls = 0
+
+    async def callback(data):
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            raise ValueError("bad request")
+        return "ok"
+
+    async def main():
+        lim = _limiter()
+        await _send(lim, callback, "first")
+        a = asyncio.create_task(_send(lim, callback, "a"))
+        await asyncio.sleep(0)
+        b = asyncio.create_task(_send(lim, callback, "b"))
+        res = await asyncio.gather(a, b, return_exceptions=True)
+        await lim.shutdown()
+        return res
+
+    res = _run(main())
+    assert [type(r) for r in res] == [ValueError, ValueError]
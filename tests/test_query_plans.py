@@ -0,0 +1,109 @@
+"""
+EXPLAIN QUERY PLAN для запросов каждого метода db.DB: ни один не читает таблицу целиком.
+Запросы перехватываются trace callback'ом соединения (с подставленными параметрами) и
+разбираются на том же соединении после вызова. Полный проход разрешён только методам из
+SCAN_ALLOWED — они и должны читать всё (список рассылок для /bstatus, загрузка диалогов при старте).
+"""
+import re
+
+import pytest
+
+from archive import ARCHIVE_SCHEMA, EVENT_COLUMNS
+from db import DB
+from fixtures_db import populate
+from utils import user_hash
+
+SCAN_ALLOWED = {"list_broadcasts", "load_user_data"}
+# только INSERT без поиска: плана нет, проверять нечего
+INSERT_ONLY = {"save_bill", "add_action_done", "save_savings_result", "create_broadcast", "insert_events"}
+
+# временные таблицы refresh_rollups (одна пачка; b, n — их псевдонимы) и подзапросы читаются целиком по определению
+_OK_SCAN = re.compile(r"^SCAN (CONSTANT ROW|kpi_batch|kpi_new|[bn]\b|\(subquery)")
+_READS = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b", re.I)
+_CREATE_AS = re.compile(r"^\s*CREATE TEMP TABLE \w+ AS\s+", re.I)
+
+EVENT = ("2026-02-01T00:00:00", user_hash(1), "s", "0", "command_used", "/start", None, 0, "mvp-0.1.0")
+BILL = ("2025-01-01", "2025-01-31", 30, 300.0, 15000.0)
+OUT = {"ok": True, "before_per_day": 10.0, "after_per_day": 9.0, "delta_kwh": 30.0, "pct": 10.0,
+       "delta_money": 750.0}
+
+# (метод, вызов) — те же методы и аргументы, что в benchmarks/bench_db_methods.py
+METHODS = [
+    ("upsert_user", lambda db: db.upsert_user(10**6, 10**6)),
+    ("set_user_profile", lambda db: db.set_user_profile(7, city="astana", people="3-4")),
+    ("get_user", lambda db: db.get_user(7)),
+    ("save_bill", lambda db: db.save_bill(7, "prev", "2025-01-01", "2025-01-31", 30, 300.0, 1.0, None)),
+    ("import_bills", lambda db: db.import_bills(10**6 + 1, [BILL])),
+    ("get_latest_bill", lambda db: db.get_latest_bill(7, "current")),
+    ("add_action_done", lambda db: db.add_action_done(7, "led")),
+    ("reset_user_data", lambda db: db.reset_user_data(8)),
+    ("due_reminders", lambda db: db.due_reminders("2026-01-04T00:00:00", ("2026-01-01T00:00:00", 0), 50)),
+    ("reschedule_reminders", lambda db: db.reschedule_reminders([("2026-01-08T00:00:00", 9)])),
+    ("bill_history", lambda db: db.bill_history(5, 10)),
+    ("replace_savings_results",
+     lambda db: db.replace_savings_results(5, 6, [(10**12, 6, 1, 10.0, 9.0, 30.0, 10.0, 750.0)])),
+    ("save_savings_result", lambda db: db.save_savings_result(2 * 10**12, 7, 1, OUT)),
+    ("get_savings_summary", lambda db: db.get_savings_summary(7)),
+    ("create_broadcast", lambda db: db.create_broadcast("test")),
+    ("snapshot_broadcast", lambda db: db.snapshot_broadcast(2)),
+    ("claim_broadcast", lambda db: db.claim_broadcast(2, "test", 60)),
+    ("broadcast_pending", lambda db: db.broadcast_pending(2, 10, 50)),
+    ("checkpoint_broadcast", lambda db: db.checkpoint_broadcast(2, "test", 60, [("sent", None, 11)], 11)),
+    ("set_broadcast_status", lambda db: db.set_broadcast_status(2, "paused")),
+    ("finish_broadcast", lambda db: db.finish_broadcast(2, "test")),
+    ("release_broadcast", lambda db: db.release_broadcast(2, "test")),
+    ("get_broadcast", lambda db: db.get_broadcast(2)),
+    ("list_broadcasts", lambda db: db.list_broadcasts(10, active_only=True)),
+    ("log_event", lambda db: db.log_event(7, "s", "0", "command_used", "/start", {"i": 1})),
+    ("insert_events", lambda db: db.insert_events([EVENT] * 10)),
+    ("refresh_rollups", lambda db: db.refresh_rollups()),
+    ("events_hw", lambda db: db.events_hw()),
+    ("oldest_events", lambda db: db.oldest_events(100, 50)),
+    ("move_events", lambda db: _move_events(db)),
+    ("load_user_data", lambda db: db.load_user_data()),
+    ("load_conv_states", lambda db: db.load_conv_states("main_conv")),
+    ("save_conv_data", lambda db: db.save_conv_data([(7, '{"x": 1}'), (8, None)], [("main_conv", "[7, 7]", 3)])),
+]
+
+def _move_events(db):
+    # архив остаётся подключённым: план разбирается после вызова
+    db.attach_archive(db.path + ".arch", ARCHIVE_SCHEMA)
+    db.move_events(EVENT_COLUMNS, 1, 10)
+
+@pytest.fixture(scope="module")
+def plan_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("plans") / "data.db")
+    populate(path, 2000)
+    db = DB(path, buffer_events=False)
+    db.insert_events([EVENT] * 10)  # новые события для refresh_rollups (в populate всё уже учтено)
+    yield db
+    db.close()
+
+def plans(db: DB, call):
+    c = db._conn()
+    sqls = []
+    c.set_trace_callback(sqls.append)
+    try:
+        call(db)
+    finally:
+        c.set_trace_callback(None)
+    out = []
+    for sql in sqls:
+        sql = _CREATE_AS.sub("", sql)
+        if _READS.match(sql):
+            out.append((sql, [r[3] for r in c.execute(f"EXPLAIN QUERY PLAN {sql}")]))
+    return out
+
+@pytest.mark.parametrize("name,call", METHODS, ids=[m[0] for m in METHODS])
+def test_hot_path_uses_index(plan_db, name, call):
+    got = plans(plan_db, call)
+    lines = [line for _, p in got for line in p]
+    scans = [(sql, line) for sql, p in got for line in p if line.startswith("SCAN ") and not _OK_SCAN.match(line)]
+    if name in SCAN_ALLOWED:
+        return
+    assert not scans, f"{name}: full scan\n" + "\n".join(f"{line}  <-  {sql}" for sql, line in scans)
+    if name in INSERT_ONLY:
+        assert not lines, f"{name}: {lines}"
+    else:
+        assert any(re.match(r"SEARCH \S+ USING (COVERING INDEX|INDEX|PRIMARY KEY|INTEGER PRIMARY KEY)", line)
+                   for line in lines), f"{name}: no index search: {lines}"
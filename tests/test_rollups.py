@@ -0,0 +1,38 @@
+import threading
+
+from db import DB
+
+def test_concurrent_refresh_counts_each_event_once(db, db_path):
+    rows = [
+        (f"2026-01-{1 + i % 5:02d}T12:00:00", f"{i % 37:016x}", "0123456789ab", "0",
+         ("bot_start", "command_used")[i % 2], None, None, 0, "1.0")
+        for i in range(3000)
+    ]
+    db.insert_events(rows)
+
+    # несколько процессов-писателей: у каждого свой DB (свои соединения)
+    others = [DB(db_path, buffer_events=False) for _ in range(4)]
+    done, errors = [], []
+    start = threading.Barrier(len(others))
+
+    def run(d):
+        try:
+            start.wait()
+            done.append(d.refresh_rollups(batch_size=97))
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(d,)) for d in others]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for d in others:
+        d.close()
+
+    assert not errors
+    assert sum(done) == len(rows)
+    c = db._conn()
+    assert c.execute("SELECT SUM(events) FROM kpi_daily").fetchone()[0] == len(rows)
+    assert c.execute("SELECT SUM(new_users) FROM kpi_daily").fetchone()[0] == \
+        c.execute("SELECT COUNT(*) FROM kpi_first_seen").fetchone()[0] == 2 * 37
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import snapshot
+
+def _events(path):
+    c = sqlite3.connect(path)
+    try:
+        return c.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    finally:
+        c.close()
+
+def _deny_replace(monkeypatch):
+    # как на Windows: файл, открытый читателем, заменить нельзя
+    def replace(src, dst):
+        raise PermissionError(13, "The process cannot access the file", dst)
+    monkeypatch.setattr(snapshot.os, "replace", replace)
+
+def _add_event(db):
+    db.insert_events([("2026-01-01T12:00:00", "0" * 16, "0123456789ab", "0", "bot_start", None, None, 0, "1.0")])
+
+def test_snapshot_uses_unique_temp_file(db, db_path, tmp_path):
+    out = tmp_path / "analytics.db"
+    other = tmp_path / "analytics.db.tmp"
+    other.write_bytes(b"copy in progress")  # временный файл другого запуска не трогаем
+    _add_event(db)
+
+    s = snapshot.take_snapshot(db_path, str(out), pause=0)
+    assert s["path"] == str(out)
+    assert _events(out) == 1
+    assert other.read_bytes() == b"copy in progress"
+    assert sorted(p.name for p in tmp_path.glob("analytics.db*")) == ["analytics.db", "analytics.db.tmp"]
+
+def test_open_snapshot_is_updated_in_place(db, db_path, tmp_path, monkeypatch):
+    out = str(tmp_path / "analytics.db")
+    _add_event(db)
+    snapshot.take_snapshot(db_path, out, pause=0)
+    reader = sqlite3.connect(out)  # DB Browser держит снимок открытым
+    try:
+        assert reader.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 1
+        _deny_replace(monkeypatch)
+        _add_event(db)
+        assert snapshot.take_snapshot(db_path, out, pause=0) is not None
+        assert reader.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
+    finally:
+        reader.close()
+    assert [p.name for p in tmp_path.glob("analytics.db*")] == ["analytics.db"]
+
+def test_locked_snapshot_is_skipped(db, db_path, tmp_path, monkeypatch, caplog):
+    out = str(tmp_path / "analytics.db")
+    _add_event(db)
+    snapshot.take_snapshot(db_path, out, pause=0)
+    _deny_replace(monkeypatch)
+    monkeypatch.setattr(snapshot, "PUBLISH_TIMEOUT", 0.1)
+    reader = sqlite3.connect(out, isolation_level=None)
+    try:
+        reader.execute("BEGIN")
+        reader.execute("SELECT 1 FROM sqlite_master").fetchone()  # читатель держит транзакцию
+        assert snapshot.take_snapshot(db_path, out, pause=0) is None
+    finally:
+        reader.close()
+    assert "locked by a reader" in caplog.text
+    assert [p.name for p in tmp_path.glob("analytics.db*")] == ["analytics.db"]
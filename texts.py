@@ -12,7 +12,9 @@ HELP_TEXT = (
     "• сумма: 12000\n"
     "• оба сразу: 900:45000\n"
     "Поддерживаю «12к» = 12000.\n\n"
-    "Если есть кВт*ч — анализ точнее (деньги могут меняться из-за тарифа/перерасчёта)."
+    "Если есть кВт*ч — анализ точнее (деньги могут меняться из-за тарифа/перерасчёта).\n\n"
+    "/saved — сколько сэкономлено по всем расчётам.\n"
+    "История счетов: пришлите CSV с колонками начало;конец;кВт*ч;₸ (даты ДД.ММ.ГГГГ)."
 )
 
 START_TEXT = (
@@ -48,3 +50,8 @@ ANALYSIS_DISCLAIMER = (
 
 FEEDBACK_ASK = "Оцените полезность (1–5) и при желании напишите короткий комментарий."
 THANKS = "Спасибо! Принято."
+
+REMINDER_TEXT = (
+    "🔔 Напоминание: пора проверить счёт за свет.\n"
+    "Введите новые показания — посчитаю, сработали ли действия (экономия «до/после»)."
+)
@@ -1,3 +1,4 @@
+import functools
 import hashlib
 import json
 import re
@@ -10,6 +11,7 @@ DATE_RANGE_RE = re.compile(
     re.IGNORECASE
 )
 
+@functools.lru_cache(maxsize=100_000)  # log_event зовёт на каждое событие, пользователей — тысячи
 def user_hash(user_id: int) -> str:
     return hashlib.sha256(str(user_id).encode("utf-8")).hexdigest()[:16]
 